@@ -0,0 +1,9 @@
+# -*- coding: utf-8 -*-
+"""
+Performance Benchmarks
+
+Standalone benchmark scripts for the relay server and hardware layers.
+Run from the repository root, e.g.::
+
+    python -m benchmarks.server_concurrency
+"""
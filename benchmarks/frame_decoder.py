@@ -0,0 +1,224 @@
+# -*- coding: utf-8 -*-
+"""
+Frame Decoder Benchmark
+
+Fuzzes the incremental response decoder and measures its throughput.
+
+The fuzz pass builds a random stream of acknowledgements, error
+responses and port state frames, mixes in line noise and corrupted
+frames, and feeds it to the decoder in random fragment sizes. It checks
+that every valid frame comes out exactly once and in order, and that a
+corrupted frame never does.
+
+The throughput pass decodes the same responses delivered as one
+concatenated buffer and as small fragments, next to the previous
+receive path (hex string of the read buffer, split on spaces).
+
+Usage:
+    python -m benchmarks.frame_decoder --rounds 2000 --number 20000
+"""
+
+import argparse
+import random
+import time
+
+from relay.hardware.protocol import (
+    ProtocolFrameBuilder,
+    FrameDecoder,
+    Ack,
+    ErrorResponse,
+    PortStates,
+)
+
+
+P = ProtocolFrameBuilder
+
+
+def response_frame(param, payload):
+    """Build a valid response frame around a payload."""
+    body = [P.FRAME_HEAD, P.FRAME_RESPONSE, len(payload) + 6, param] + list(payload)
+    return bytes(body + [P.calculate_xor(body), P.FRAME_END])
+
+
+def random_frame(rng):
+    """Random acknowledgement, error or port state response."""
+    kind = rng.random()
+    if kind < 0.5:
+        return response_frame(rng.randrange(1, 6), [P.FRAME_SUCCESS])
+    if kind < 0.6:
+        return response_frame(rng.randrange(1, 6), [rng.randrange(1, 256)])
+    return response_frame(0, [rng.randrange(256) for _ in range(rng.randrange(2, 9))])
+
+
+def corrupt(rng, frame):
+    """Flip one byte of a frame after its head so it fails validation."""
+    frame = bytearray(frame)
+    position = rng.randrange(1, len(frame))
+    frame[position] ^= rng.randrange(1, 256)
+    return bytes(frame)
+
+
+def noise(rng, allow_head):
+    """A few random bytes of line noise."""
+    data = bytes(rng.randrange(256) for _ in range(rng.randrange(0, 6)))
+    return data if allow_head else data.replace(bytes([P.FRAME_HEAD]), b'')
+
+
+def fragments(rng, data):
+    """Split data into chunks of random size."""
+    position = 0
+    while position < len(data):
+        size = rng.randrange(1, 16)
+        yield data[position:position + size]
+        position += size
+
+
+def is_subsequence(found, expected):
+    """Check found appears in expected in the same order."""
+    remaining = iter(expected)
+    return all(frame in remaining for frame in found)
+
+
+def fuzz(rounds, seed):
+    """
+    Run the fuzz pass.
+    
+    Without a frame head in the noise the decoder must return exactly the
+    valid frames. With arbitrary noise, noise can pose as a frame head and
+    swallow the start of a frame, so only order and the absence of
+    corrupted frames are checked.
+    
+    Returns:
+        Number of failed rounds
+    """
+    rng = random.Random(seed)
+    failures = 0
+    
+    for round_no in range(rounds):
+        allow_head = round_no % 2 == 1
+        stream, expected, corrupted = [], [], set()
+        
+        for _ in range(rng.randrange(1, 40)):
+            stream.append(noise(rng, allow_head))
+            frame = random_frame(rng)
+            if not allow_head and rng.random() < 0.1:
+                bad = corrupt(rng, frame)
+                if not P.is_valid_response(bad):
+                    corrupted.add(bad)
+                    stream.append(bad)
+                    continue
+            stream.append(frame)
+            expected.append(frame)
+        
+        decoder = FrameDecoder()
+        found = []
+        for chunk in fragments(rng, b''.join(stream)):
+            found.extend(response.frame for response in decoder.decode(chunk))
+        
+        valid = all(P.is_valid_response(frame) for frame in found)
+        if allow_head:
+            ok = valid and is_subsequence(found, expected)
+        else:
+            ok = valid and found == expected and not corrupted.intersection(found)
+        
+        if not ok:
+            failures += 1
+            print(f'round {round_no}: expected {len(expected)} frames, decoded {len(found)}')
+    
+    return failures
+
+
+def fuzz_corruption(rounds, seed):
+    """
+    Feed corrupted frames with their head intact, followed by a valid frame.
+    
+    The decoder must drop the corrupted frame and still return the valid
+    one behind it, however the input is fragmented.
+    
+    Returns:
+        Number of failed rounds
+    """
+    rng = random.Random(seed)
+    failures = 0
+    
+    for round_no in range(rounds):
+        bad = corrupt(rng, random_frame(rng))
+        if P.is_valid_response(bad):
+            continue
+        good = random_frame(rng)
+        
+        decoder = FrameDecoder()
+        found = []
+        for chunk in fragments(rng, bad + good):
+            found.extend(response.frame for response in decoder.decode(chunk))
+        
+        if found[-1:] != [good] or bad in found:
+            failures += 1
+            print(f'round {round_no}: {bad.hex()} + {good.hex()} -> {[f.hex() for f in found]}')
+    
+    return failures
+
+
+def legacy_decode(buffer):
+    """Receive path before the decoder: hex string of the buffer, then split."""
+    response = ' '.join('%02x' % b for b in buffer)
+    parts = response.split(' ')
+    return parts[4:-2] if len(parts) > 7 else parts[4]
+
+
+def measure(func, number):
+    """Responses per second for number calls of func, one response each."""
+    start = time.perf_counter()
+    for _ in range(number):
+        func()
+    return number / (time.perf_counter() - start)
+
+
+def main():
+    """Main entry point."""
+    parser = argparse.ArgumentParser(description='Relay frame decoder fuzz and benchmark')
+    parser.add_argument('--rounds', type=int, default=2000, help='Fuzz rounds')
+    parser.add_argument('--number', type=int, default=20000, help='Responses per measurement')
+    parser.add_argument('--seed', type=int, default=1, help='Random seed')
+    args = parser.parse_args()
+    
+    failures = fuzz(args.rounds, args.seed) + fuzz_corruption(args.rounds, args.seed)
+    print(f'fuzz: {2 * args.rounds} rounds, {failures} failures')
+    
+    ack = response_frame(3, [P.FRAME_SUCCESS])
+    states = response_frame(0, [0x21, 0x00, 0x35, 0x00, 0x00])
+    stream = (ack + states) * (args.number // 2)
+    
+    decoder = FrameDecoder()
+    for frame in (ack, states):
+        response = decoder.decode(frame)[0]
+        assert isinstance(response, (Ack, ErrorResponse, PortStates))
+    
+    def concatenated():
+        return decoder.decode(stream)
+    
+    def fragmented():
+        found = []
+        for position in range(0, len(stream), 5):
+            found.extend(decoder.decode(stream[position:position + 5]))
+        return found
+    
+    cases = [
+        ('hex split (before)', lambda: legacy_decode(states), args.number),
+        ('decoder, one frame', lambda: decoder.decode(states), args.number),
+        ('decoder, concatenated', concatenated, 1),
+        ('decoder, 5-byte reads', fragmented, 1),
+    ]
+    
+    print(f'{"case":<24}{"responses/s":>14}')
+    for name, func, calls in cases:
+        responses = args.number if calls == 1 else 1
+        rate = measure(func, calls) * responses
+        print(f'{name:<24}{rate:>14,.0f}')
+    
+    if failures:
+        raise SystemExit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,87 @@
+# -*- coding: utf-8 -*-
+"""
+Frame Table Benchmark
+
+Measures how many relay command frames per second can be built and
+handed to the serial port. The previous list-based builder (list, XOR
+via reduce, array.array copy, unconditional hex dump for the debug log)
+is reproduced here for comparison with the precomputed frame table and
+the zero-copy send path. The serial port is a null device, so only the
+CPU cost on the host is measured.
+
+Usage:
+    python -m benchmarks.frame_table --number 200000
+"""
+
+import argparse
+import array
+import timeit
+from functools import reduce
+
+from relay.hardware.protocol import ProtocolFrameBuilder
+from relay.hardware.serial_comm import SerialCommunicator
+
+
+class NullSerial:
+    """Serial port stand-in that discards everything written."""
+    
+    port = 'null'
+    
+    def isOpen(self) -> bool:
+        return True
+    
+    def write(self, data) -> int:
+        return len(data)
+    
+    def flush(self) -> None:
+        pass
+    
+    def close(self) -> None:
+        pass
+
+
+def legacy_build_usb_on_by_index(port_index):
+    """Frame builder as it was before the frame table."""
+    P = ProtocolFrameBuilder
+    frame = [P.FRAME_HEAD, P.FRAME_LENGTH, port_index, P.CMD_ALL, P.CMD_ON]
+    frame.append(reduce(lambda x, y: x ^ y, frame, 0))
+    frame.append(P.FRAME_END)
+    return frame
+
+
+def legacy_send(serial_port, protocol, frame_data):
+    """send_data as it was before the zero-copy path."""
+    hex_string = protocol.bytes_to_hex_string(frame_data)
+    serial_port.write(array.array('B', frame_data))
+    serial_port.flush()
+    return hex_string
+
+
+def main():
+    """Main entry point."""
+    parser = argparse.ArgumentParser(description='Relay frame table benchmark')
+    parser.add_argument('--number', type=int, default=200000, help='Frames per measurement')
+    args = parser.parse_args()
+    
+    protocol = ProtocolFrameBuilder()
+    communicator = SerialCommunicator('bench', auto_connect=False)
+    communicator._serial = NullSerial()
+    null = NullSerial()
+    
+    cases = [
+        ('build (list + reduce)', lambda: legacy_build_usb_on_by_index(3)),
+        ('build (frame table)', lambda: protocol.build_usb_on_by_index(3)),
+        ('build + send (before)',
+         lambda: legacy_send(null, protocol, legacy_build_usb_on_by_index(3))),
+        ('build + send (after)',
+         lambda: communicator.send_data(protocol.build_usb_on_by_index(3))),
+    ]
+    
+    print(f'{"case":<26}{"frames/s":>14}{"us/frame":>10}')
+    for name, func in cases:
+        elapsed = timeit.timeit(func, number=args.number)
+        print(f'{name:<26}{args.number / elapsed:>14,.0f}{elapsed / args.number * 1e6:>10.2f}')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,87 @@
+# -*- coding: utf-8 -*-
+"""
+Local Transport Benchmark
+
+Compares TCP loopback with the server's Unix domain socket for clients
+on the same host. For each transport it measures one-shot requests (a
+new connection per request, as the CLI tools send them), sequential
+requests over one persistent connection, and requests pipelined over
+it. The last rows run the same requests in process on the relay engine
+(RelayEngine.send_request, as embedded controllers do), without any
+socket. The serial link is simulated with a fixed per-command latency,
+0 by default so the numbers show the transport alone.
+
+Usage:
+    python -m benchmarks.local_transport --number 2000
+"""
+
+import argparse
+import logging
+import threading
+import time
+
+from benchmarks.serial_latency import measure, measure_pipelined
+from benchmarks.server_concurrency import free_port, SimulatedSerial
+from relay.client import RelayClient
+from relay.core.config import ConfigManager
+from relay.server.task_manager import RelayTaskManager
+from relay.utils.relay_utils import Device, Task
+from relay.constants import RELAY_CONNECT_MSG
+
+
+def main():
+    """Main entry point."""
+    parser = argparse.ArgumentParser(description='Relay local transport benchmark')
+    parser.add_argument('--number', type=int, default=2000, help='Requests per measurement')
+    parser.add_argument('--serial-latency', type=float, default=0.0,
+                        help='Simulated serial command time in seconds')
+    parser.add_argument('--async-server', action='store_true', help='Run the asyncio server mode')
+    args = parser.parse_args()
+    
+    ConfigManager().config.serial.pacing_file = ''
+    port = free_port()
+    manager = RelayTaskManager(port=port, backlog=64, serial=SimulatedSerial(args.serial_latency))
+    manager.logger.setLevel(logging.WARNING)
+    if manager.unix_socket is None:
+        raise SystemExit('Unix domain sockets are not available (ServerConfig.unix_socket)')
+    
+    threading.Thread(
+        target=manager.start_async if args.async_server else manager.start,
+        daemon=True
+    ).start()
+    time.sleep(0.2)
+    
+    task = Task(Device('BENCH', index=1), RELAY_CONNECT_MSG)
+    transports = [('tcp', ''), ('unix', manager.unix_socket_path)]
+    
+    print(f'{args.number} requests, serial latency {args.serial_latency * 1000:.1f} ms')
+    print(f'{"transport":<10}{"mode":<12}{"p50 ms":>9}{"p99 ms":>9}{"req/s":>10}')
+    
+    for name, unix_socket in transports:
+        one_shot = RelayClient('localhost', port, unix_socket=unix_socket)
+        persistent = RelayClient('localhost', port, persistent=True, unix_socket=unix_socket)
+        persistent.send_request(task)
+        
+        for mode, stats in (
+            ('one-shot', measure(lambda: one_shot.send_request(task), args.number)),
+            ('persistent', measure(lambda: persistent.send_request(task), args.number)),
+        ):
+            print(f'{name:<10}{mode:<12}{stats["p50_ms"]:>9.3f}{stats["p99_ms"]:>9.3f}'
+                  f'{stats["per_second"]:>10.0f}')
+        
+        rate = measure_pipelined(lambda: persistent.submit(task), args.number)
+        print(f'{name:<10}{"pipelined":<12}{"-":>9}{"-":>9}{rate:>10.0f}')
+        persistent.close()
+    
+    # The server is a RelayEngine; call it directly as an embedded engine
+    stats = measure(lambda: manager.send_request(task), args.number)
+    print(f'{"engine":<10}{"in-process":<12}{stats["p50_ms"]:>9.3f}{stats["p99_ms"]:>9.3f}'
+          f'{stats["per_second"]:>10.0f}')
+    rate = measure_pipelined(lambda: manager.submit(task), args.number)
+    print(f'{"engine":<10}{"pipelined":<12}{"-":>9}{"-":>9}{rate:>10.0f}')
+    
+    manager.stop()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,83 @@
+# -*- coding: utf-8 -*-
+"""
+Scheduler Priority Benchmark
+
+Floods the server with low priority RELAY_GET_STATE_MSG polls while a
+few high priority recovery toggles arrive, then reports the scheduler's
+queue depth and per-priority wait times as returned by
+RELAY_GET_STATS_MSG.
+
+Usage:
+    python -m benchmarks.scheduler_priority --polls 200 --toggles 10
+"""
+
+import argparse
+import logging
+import threading
+import time
+
+from benchmarks.server_concurrency import SimulatedSerial, free_port
+from relay.client import RelayClient
+from relay.server.task_manager import RelayTaskManager
+from relay.utils.relay_utils import Device, Task
+from relay.constants import (
+    RELAY_CONNECT_MSG,
+    RELAY_GET_STATE_MSG,
+    TASK_PRIORITY_HIGH,
+    TASK_PRIORITY_LOW,
+)
+
+
+def main():
+    """Main entry point."""
+    parser = argparse.ArgumentParser(description='Relay scheduler priority benchmark')
+    parser.add_argument('--polls', type=int, default=200, help='Concurrent state polls')
+    parser.add_argument('--toggles', type=int, default=10, help='Recovery toggles')
+    parser.add_argument('--serial-latency', type=float, default=0.01)
+    args = parser.parse_args()
+    
+    port = free_port()
+    manager = RelayTaskManager(
+        port=port,
+        backlog=args.polls + args.toggles,
+        serial=SimulatedSerial(args.serial_latency)
+    )
+    manager.logger.setLevel(logging.WARNING)
+    threading.Thread(target=manager.start_async, daemon=True).start()
+    time.sleep(0.2)
+    
+    client = RelayClient(port=port)
+    poll = Task(Device('POLL'), RELAY_GET_STATE_MSG, TASK_PRIORITY_LOW)
+    toggle = Task(Device('RECOVER', index=1), RELAY_CONNECT_MSG, TASK_PRIORITY_HIGH)
+    
+    threads = [
+        threading.Thread(target=client.send_request, args=(poll, 60))
+        for _ in range(args.polls)
+    ]
+    for thread in threads:
+        thread.start()
+    
+    time.sleep(args.serial_latency * 5)
+    print(f'Queue while flooded: {client.get_stats()["depth"]} tasks waiting')
+    
+    toggles = [
+        threading.Thread(target=client.send_request, args=(toggle, 60))
+        for _ in range(args.toggles)
+    ]
+    for thread in toggles:
+        thread.start()
+    for thread in threads + toggles:
+        thread.join()
+    
+    stats = client.get_stats()
+    manager.stop()
+    
+    print(f'Max queue depth: {stats["max_depth"]}')
+    print(f'{"priority":<10}{"count":>8}{"avg ms":>10}{"max ms":>10}')
+    for priority, wait in stats['wait_times'].items():
+        print(f'{priority:<10}{wait["count"]:>8}{wait["avg_wait"] * 1000:>10.1f}'
+              f'{wait["max_wait"] * 1000:>10.1f}')
+
+
+if __name__ == '__main__':
+    main()
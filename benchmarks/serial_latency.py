@@ -0,0 +1,253 @@
+# -*- coding: utf-8 -*-
+"""
+Serial Round-Trip Latency Benchmark
+
+Measures the latency of every relay command type the server executes,
+at three layers:
+
+    serial  - SerialCommunicator methods, straight to the board
+    server  - RelayTaskManager.submit(), through scheduler and board worker
+    client  - RelayClient requests over TCP to a running server
+
+For each layer and command it reports p50/p95/p99 latency and the
+sustained rate of back-to-back commands; for the server and client
+layers also the rate with all commands submitted at once. Results are
+written as JSON so runs can be compared between releases.
+
+The board is a VirtualRelayBoard on a pseudo-terminal unless a real
+board's serial port is given. The server's port state cache is disabled
+so state queries reach the board (enable with --state-cache). The
+server layers are measured after command pacing has learned the board's
+latency.
+
+Usage:
+    python -m benchmarks.serial_latency --number 200 --output latency.json
+    python -m benchmarks.serial_latency --serial-port /dev/ttyUSB0 --baudrate 9600
+"""
+
+import argparse
+import datetime
+import json
+import logging
+import platform
+import statistics
+import threading
+import time
+from concurrent.futures import wait
+from typing import Any, Callable, Dict, List
+
+from benchmarks.server_concurrency import free_port
+from relay.client import RelayClient
+from relay.core.config import ConfigManager
+from relay.hardware.emulator import VirtualRelayBoard
+from relay.hardware.protocol import ErrorResponse
+from relay.hardware.serial_comm import SerialCommunicator
+from relay.server.task_manager import RelayTaskManager
+from relay.utils.relay_utils import Device, Task
+from relay.constants import (
+    RELAY_DISCONNECT_MSG,
+    RELAY_CONNECT_MSG,
+    RELAY_DISCONNECT_MSG_SEC,
+    RELAY_CONNECT_MSG_SEC,
+    RELAY_GET_STATE_MSG,
+    RELAY_SET_STATE_MSG,
+)
+
+
+MESSAGES = [
+    ('connect', RELAY_CONNECT_MSG),
+    ('disconnect', RELAY_DISCONNECT_MSG),
+    ('set_state', RELAY_SET_STATE_MSG),
+    ('get_state', RELAY_GET_STATE_MSG),
+    ('connect_sec', RELAY_CONNECT_MSG_SEC),
+    ('disconnect_sec', RELAY_DISCONNECT_MSG_SEC),
+]
+
+
+def serial_command(serial: SerialCommunicator, message: int, index: int, value: int) -> Callable:
+    """SerialCommunicator call the board worker makes for a message."""
+    return {
+        RELAY_CONNECT_MSG: lambda: serial.usb_on(index),
+        RELAY_DISCONNECT_MSG: lambda: serial.usb_off(index),
+        RELAY_SET_STATE_MSG: lambda: serial.set_port_state(index, value),
+        RELAY_GET_STATE_MSG: serial.get_all_port_states,
+        RELAY_CONNECT_MSG_SEC: lambda: serial.usb_on_by_value(value),
+        RELAY_DISCONNECT_MSG_SEC: lambda: serial.usb_off_by_value(value),
+    }[message]
+
+
+def failed(response: Any) -> bool:
+    """Check whether a response from any layer is a failure."""
+    return response in (None, 'KO', []) or isinstance(response, ErrorResponse)
+
+
+def summarize(latencies: List[float], errors: int, elapsed: float) -> Dict[str, Any]:
+    """Latency percentiles (ms) and rate of a run."""
+    if len(latencies) > 1:
+        cuts = statistics.quantiles(latencies, n=100, method='inclusive')
+        p50, p95, p99 = cuts[49], cuts[94], cuts[98]
+    else:
+        p50 = p95 = p99 = latencies[0] if latencies else 0.0
+    
+    return {
+        'count': len(latencies),
+        'errors': errors,
+        'mean_ms': statistics.mean(latencies) * 1000 if latencies else 0.0,
+        'p50_ms': p50 * 1000,
+        'p95_ms': p95 * 1000,
+        'p99_ms': p99 * 1000,
+        'max_ms': max(latencies) * 1000 if latencies else 0.0,
+        'per_second': len(latencies) / elapsed if elapsed > 0 else 0.0,
+    }
+
+
+def measure(call: Callable[[], Any], number: int) -> Dict[str, Any]:
+    """Run call back to back and summarize its latency."""
+    latencies = []
+    errors = 0
+    
+    start = time.perf_counter()
+    for _ in range(number):
+        began = time.perf_counter()
+        response = call()
+        latencies.append(time.perf_counter() - began)
+        errors += failed(response)
+    
+    return summarize(latencies, errors, time.perf_counter() - start)
+
+
+def measure_pipelined(submit: Callable[[], Any], number: int) -> float:
+    """Submit number requests at once; returns completed requests per second."""
+    start = time.perf_counter()
+    futures = [submit() for _ in range(number)]
+    wait(futures)
+    return number / (time.perf_counter() - start)
+
+
+def run(args: argparse.Namespace) -> Dict[str, Any]:
+    """Run the benchmark and collect the results."""
+    board = None
+    if args.serial_port:
+        port_name = args.serial_port
+    else:
+        board = VirtualRelayBoard(
+            ports=5,
+            latency=args.board_latency,
+            baudrate=args.baudrate or None
+        ).start()
+        port_name = board.port
+    
+    serial = SerialCommunicator('bench', port=port_name, baudrate=args.baudrate or 9600)
+    logging.getLogger('relay.serial').setLevel(logging.WARNING)
+    
+    device = Device('BENCH', index=args.port_index, value=args.hub_value)
+    results = []
+    
+    def record(layer: str, name: str, stats: Dict[str, Any]) -> None:
+        stats = dict(layer=layer, message=name, **stats)
+        results.append(stats)
+        piped = stats.get('pipelined_per_second')
+        piped_text = f'{piped:.1f}' if piped is not None else '-'
+        print(f'{layer:<8}{name:<16}{stats["p50_ms"]:>9.2f}{stats["p95_ms"]:>9.2f}'
+              f'{stats["p99_ms"]:>9.2f}{stats["per_second"]:>10.1f}'
+              f'{piped_text:>11}{stats["errors"]:>7}')
+    
+    print(f'{"layer":<8}{"message":<16}{"p50 ms":>9}{"p95 ms":>9}{"p99 ms":>9}'
+          f'{"cmd/s":>10}{"piped/s":>11}{"errors":>7}')
+    
+    # The hub value commands need the value bound to a port first
+    serial.set_port_state(args.port_index, args.hub_value)
+    
+    if 'serial' in args.layers:
+        for name, message in MESSAGES:
+            call = serial_command(serial, message, args.port_index, args.hub_value)
+            record('serial', name, measure(call, args.number))
+    
+    manager = None
+    if 'server' in args.layers or 'client' in args.layers:
+        server_port = free_port()
+        # Learn command pacing from scratch and do not persist it
+        ConfigManager().config.serial.pacing_file = ''
+        manager = RelayTaskManager(port=server_port, backlog=args.number, serial=serial)
+        manager.logger.setLevel(logging.WARNING)
+        if not args.state_cache:
+            manager.config.server.state_cache_max_age = 0
+        threading.Thread(target=manager.start, daemon=True).start()
+        time.sleep(0.2)
+        
+        # Warm up until the pacing has learned the board's latency
+        warm_up = Task(device, RELAY_CONNECT_MSG)
+        for _ in range(manager.config.serial.pacing_min_samples):
+            manager.submit(warm_up).result()
+    
+    if 'server' in args.layers:
+        for name, message in MESSAGES:
+            task = Task(device, message)
+            stats = measure(lambda: manager.submit(task).result(), args.number)
+            stats['pipelined_per_second'] = measure_pipelined(
+                lambda: manager.submit(task), args.number
+            )
+            record('server', name, stats)
+    
+    if 'client' in args.layers:
+        client = RelayClient('localhost', server_port, persistent=True)
+        for name, message in MESSAGES:
+            task = Task(device, message)
+            stats = measure(lambda: client.send_request(task), args.number)
+            stats['pipelined_per_second'] = measure_pipelined(
+                lambda: client.submit(task), args.number
+            )
+            record('client', name, stats)
+        client.close()
+    
+    if manager:
+        manager.stop()
+    else:
+        serial.close()
+    if board:
+        board.stop()
+    
+    return {
+        'meta': {
+            'timestamp': datetime.datetime.now().isoformat(timespec='seconds'),
+            'target': port_name if args.serial_port else 'emulator',
+            'baudrate': args.baudrate,
+            'board_latency': None if args.serial_port else args.board_latency,
+            'number': args.number,
+            'state_cache': args.state_cache,
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+        },
+        'results': results,
+    }
+
+
+def main():
+    """Main entry point."""
+    parser = argparse.ArgumentParser(description='Relay serial round-trip latency benchmark')
+    parser.add_argument('--number', type=int, default=200, help='Commands per message type and layer')
+    parser.add_argument('--layers', type=lambda s: s.split(','), default=['serial', 'server', 'client'],
+                        help='Comma separated layers (default: serial,server,client)')
+    parser.add_argument('--serial-port', type=str, default=None,
+                        help='Real relay board to use instead of the emulator')
+    parser.add_argument('--baudrate', type=int, default=9600,
+                        help='Baud rate (emulator paces replies at it; 0: no pacing)')
+    parser.add_argument('--board-latency', type=float, default=0.0,
+                        help='Emulated processing time per command (s)')
+    parser.add_argument('--port-index', type=int, default=1, help='Relay port to switch')
+    parser.add_argument('--hub-value', type=int, default=0x21, help='Hub value to bind and switch')
+    parser.add_argument('--state-cache', action='store_true',
+                        help='Serve state queries from the server cache')
+    parser.add_argument('--output', type=str, default='serial_latency.json',
+                        help='JSON results file (default: serial_latency.json)')
+    args = parser.parse_args()
+    
+    report = run(args)
+    
+    with open(args.output, 'w') as f:
+        json.dump(report, f, indent=2)
+    print(f'Results written to {args.output}')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,159 @@
+# -*- coding: utf-8 -*-
+"""
+Server Concurrency Benchmark
+
+Compares the blocking socket server of RelayTaskManager with the asyncio
+server mode. Many concurrent clients each open a connection and send a
+task; a fraction of the requests come from stalled clients that pause
+after connecting before they send anything. The serial link is simulated
+with a fixed per-command latency.
+
+Usage:
+    python -m benchmarks.server_concurrency --clients 50 --requests 4
+"""
+
+import argparse
+import logging
+import pickle
+import socket
+import statistics
+import threading
+import time
+from typing import List, Dict
+
+from relay.core.config import ConfigManager
+from relay.server.task_manager import RelayTaskManager
+from relay.utils.relay_utils import Device, Task
+from relay.constants import RELAY_CONNECT_MSG
+
+
+class SimulatedSerial:
+    """Stand-in for SerialCommunicator with a fixed command latency."""
+    
+    port = 'simulated'
+    identity = None
+    pacing = None
+    
+    def __init__(self, latency: float):
+        self.latency = latency
+        self.is_open = True
+    
+    def _command(self, *args) -> str:
+        time.sleep(self.latency)
+        return ''
+    
+    usb_on = usb_off = usb_on_by_value = usb_off_by_value = _command
+    set_port_state = _command
+    
+    def get_all_port_states(self) -> List[str]:
+        time.sleep(self.latency)
+        return ['00'] * 5
+    
+    def close(self) -> None:
+        self.is_open = False
+
+
+def free_port() -> int:
+    """Return an unused local TCP port."""
+    with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as s:
+        s.bind(('localhost', 0))
+        return s.getsockname()[1]
+
+
+def client_request(port: int, client_delay: float) -> float:
+    """
+    Send one task like RelayClient does, after an optional pause.
+    
+    Returns:
+        Request latency in seconds
+    """
+    task = Task(Device('BENCH', index=1), RELAY_CONNECT_MSG)
+    start = time.perf_counter()
+    
+    with socket.create_connection(('localhost', port), timeout=60) as conn:
+        time.sleep(client_delay)
+        conn.sendall(pickle.dumps(task))
+        response = pickle.loads(conn.recv(4096))
+    
+    if response != 'OK':
+        raise RuntimeError(f'Unexpected response: {response}')
+    
+    return time.perf_counter() - start
+
+
+def run_mode(mode: str, args: argparse.Namespace) -> Dict[str, float]:
+    """Run the benchmark against one server mode."""
+    # The clients send bare pickles like legacy RelayClient versions
+    ConfigManager().config.server.allow_pickle = True
+    
+    port = free_port()
+    manager = RelayTaskManager(
+        port=port,
+        backlog=args.clients,
+        serial=SimulatedSerial(args.serial_latency)
+    )
+    manager.logger.setLevel(logging.WARNING)
+    
+    target = manager.start_async if mode == 'asyncio' else manager.start
+    server_thread = threading.Thread(target=target, daemon=True)
+    server_thread.start()
+    time.sleep(0.2)
+    
+    latencies: List[float] = []
+    lock = threading.Lock()
+    
+    def worker(client_id: int):
+        for request in range(args.requests):
+            stalled = (client_id * args.requests + request) % args.stall_every == 0
+            latency = client_request(port, args.stall_time if stalled else 0)
+            with lock:
+                latencies.append(latency)
+    
+    start = time.perf_counter()
+    clients = [threading.Thread(target=worker, args=(i,)) for i in range(args.clients)]
+    for thread in clients:
+        thread.start()
+    for thread in clients:
+        thread.join()
+    elapsed = time.perf_counter() - start
+    
+    manager.stop()
+    server_thread.join(timeout=5)
+    
+    latencies.sort()
+    return {
+        'requests': len(latencies),
+        'elapsed_s': elapsed,
+        'throughput_rps': len(latencies) / elapsed,
+        'p50_ms': statistics.median(latencies) * 1000,
+        'p95_ms': latencies[int(len(latencies) * 0.95) - 1] * 1000,
+        'max_ms': latencies[-1] * 1000,
+    }
+
+
+def main():
+    """Main entry point."""
+    parser = argparse.ArgumentParser(description='Relay server concurrency benchmark')
+    parser.add_argument('--clients', type=int, default=50)
+    parser.add_argument('--requests', type=int, default=4, help='Requests per client')
+    parser.add_argument('--serial-latency', type=float, default=0.005,
+                        help='Simulated serial command time in seconds')
+    parser.add_argument('--stall-every', type=int, default=10,
+                        help='Every Nth request comes from a stalled client')
+    parser.add_argument('--stall-time', type=float, default=0.2,
+                        help='Pause between connect and send for stalled clients')
+    args = parser.parse_args()
+    
+    print(f'{args.clients} clients x {args.requests} requests, '
+          f'serial latency {args.serial_latency * 1000:.1f} ms, '
+          f'1 in {args.stall_every} clients stalls {args.stall_time * 1000:.0f} ms')
+    print(f'{"mode":<10}{"req/s":>10}{"p50 ms":>10}{"p95 ms":>10}{"max ms":>10}')
+    
+    for mode in ('blocking', 'asyncio'):
+        result = run_mode(mode, args)
+        print(f'{mode:<10}{result["throughput_rps"]:>10.1f}{result["p50_ms"]:>10.1f}'
+              f'{result["p95_ms"]:>10.1f}{result["max_ms"]:>10.1f}')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,67 @@
+# -*- coding: utf-8 -*-
+"""
+Wire Codec Benchmark
+
+Compares pickle with the binary codec for typical client/server
+messages: encode and decode time per message and payload size on the
+wire.
+
+Usage:
+    python -m benchmarks.wire_codec --number 20000
+"""
+
+import argparse
+import timeit
+
+from relay.utils.framing import (
+    CODEC_PICKLE,
+    CODEC_BINARY,
+    encode_payload,
+    decode_payload,
+)
+from relay.utils.relay_utils import Device, Task, TaskBatch
+from relay.constants import (
+    RELAY_CONNECT_MSG,
+    RELAY_SET_STATE_MSG,
+    TASK_PRIORITY_HIGH,
+)
+
+
+def sample_messages():
+    """Build representative requests and responses."""
+    task = Task(Device('0123456789ABCDEF', index=3, value=0x21), RELAY_CONNECT_MSG)
+    bind = Task(Device('0123456789ABCDEF', index=3, value=0x21), RELAY_SET_STATE_MSG,
+                TASK_PRIORITY_HIGH)
+    batch = TaskBatch([Task(Device('RIG', index=i), RELAY_CONNECT_MSG) for i in range(1, 6)])
+    
+    return [
+        ('task', task),
+        ('bind task', bind),
+        ('batch x5', batch),
+        ('response OK', 'OK'),
+        ('port states', str(['21', '00', '35', '00', '00'])),
+        ('batch reply', ['OK'] * 5),
+    ]
+
+
+def main():
+    """Main entry point."""
+    parser = argparse.ArgumentParser(description='Relay wire codec benchmark')
+    parser.add_argument('--number', type=int, default=20000, help='Iterations per measurement')
+    args = parser.parse_args()
+    
+    codecs = [('pickle', CODEC_PICKLE), ('binary', CODEC_BINARY)]
+    
+    print(f'{"message":<14}{"codec":<8}{"bytes":>7}{"encode us":>11}{"decode us":>11}')
+    for name, message in sample_messages():
+        for codec_name, codec in codecs:
+            payload = encode_payload(message, codec)
+            encode = timeit.timeit(lambda: encode_payload(message, codec), number=args.number)
+            decode = timeit.timeit(lambda: decode_payload(payload, codec), number=args.number)
+            
+            print(f'{name:<14}{codec_name:<8}{len(payload):>7}'
+                  f'{encode / args.number * 1e6:>11.2f}{decode / args.number * 1e6:>11.2f}')
+
+
+if __name__ == '__main__':
+    main()
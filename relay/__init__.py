@@ -17,6 +17,16 @@ from relay.constants import (
     RELAY_CONNECT_MSG_SEC,
     RELAY_GET_STATE_MSG,
     RELAY_SET_STATE_MSG,
+    RELAY_GET_STATS_MSG,
+    RELAY_POWER_CYCLE_MSG,
+    RELAY_POWER_CYCLE_MSG_SEC,
+    RELAY_BATCH_MSG,
+    RELAY_DISCONNECT_MASK_MSG,
+    RELAY_CONNECT_MASK_MSG,
+    RELAY_SUBSCRIBE_MSG,
+    TASK_PRIORITY_HIGH,
+    TASK_PRIORITY_NORMAL,
+    TASK_PRIORITY_LOW,
 )
 
 __all__ = [
@@ -26,6 +36,16 @@ __all__ = [
     'RELAY_CONNECT_MSG_SEC',
     'RELAY_GET_STATE_MSG',
     'RELAY_SET_STATE_MSG',
+    'RELAY_GET_STATS_MSG',
+    'RELAY_POWER_CYCLE_MSG',
+    'RELAY_POWER_CYCLE_MSG_SEC',
+    'RELAY_BATCH_MSG',
+    'RELAY_DISCONNECT_MASK_MSG',
+    'RELAY_CONNECT_MASK_MSG',
+    'RELAY_SUBSCRIBE_MSG',
+    'TASK_PRIORITY_HIGH',
+    'TASK_PRIORITY_NORMAL',
+    'TASK_PRIORITY_LOW',
     '__version__',
 ]
 
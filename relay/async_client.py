@@ -0,0 +1,369 @@
+# -*- coding: utf-8 -*-
+"""
+Asyncio Relay Client
+
+Awaitable client for sending relay control requests to the server.
+"""
+
+import asyncio
+import itertools
+import pickle
+import socket
+from typing import Optional, Any, AsyncIterator, Dict, Iterable, List, Tuple
+
+from relay.client import local_unix_socket
+from relay.utils.relay_utils import Device, Task, TaskBatch, task_off_time
+from relay.utils.codec import CodecError
+from relay.utils.framing import (
+    CODEC_PICKLE,
+    CODEC_BINARY,
+    FramingError,
+    encode_frame,
+    encode_payload,
+    decode_payload,
+    read_frame_async,
+)
+from relay.constants import RELAY_POWER_CYCLE_MSG, RELAY_POWER_CYCLE_MSG_SEC, RELAY_SUBSCRIBE_MSG
+from relay.core.config import ConfigManager
+
+
+class AsyncRelayClient:
+    """
+    Asyncio client for communicating with relay server.
+    
+    All requests share one framed connection, opened on first use: any
+    number of coroutines can have requests in flight at once, and
+    responses are matched to them by request id as they arrive. Every
+    call has its own deadline and can be cancelled; a request that times
+    out or is cancelled leaves nothing pending, and a late response to
+    it is dropped.
+    
+    Like RelayClient in persistent mode, the client needs a server that
+    speaks the framed protocol and uses the server's Unix domain socket
+    when it runs on the same host. It switches codec if the server
+    answers in another one, and a request that fails because a reused
+    connection was closed (the server restarted) is sent once more on a
+    new one.
+    """
+    
+    def __init__(
+        self,
+        host: Optional[str] = None,
+        port: Optional[int] = None,
+        codec: Optional[int] = None,
+        unix_socket: Optional[str] = None
+    ):
+        """
+        Initialize asyncio relay client.
+        
+        Args:
+            host: Server host address (default: from config)
+            port: Server port number (default: from config)
+            codec: Payload codec, CODEC_BINARY or CODEC_PICKLE
+                (default: from config)
+            unix_socket: Unix domain socket to try before TCP (default:
+                the server's, if it is local; '' to always use TCP)
+        """
+        config = ConfigManager().config
+        
+        self.host = host or config.server.host
+        self.port = port or config.server.port
+        self.timeout = 5.0
+        if codec is None:
+            codec = CODEC_BINARY if config.server.wire_codec == 'binary' else CODEC_PICKLE
+        self.codec = codec
+        if unix_socket is None:
+            unix_socket = local_unix_socket(self.host, self.port)
+        self.unix_socket = unix_socket or None
+        
+        self._writer: Optional[asyncio.StreamWriter] = None
+        self._read_task: Optional[asyncio.Task] = None
+        self._connect_lock: Optional[asyncio.Lock] = None
+        self._pending: Dict[int, Tuple[asyncio.Future, Task, int]] = {}
+        self._request_ids = itertools.count(1)
+    
+    @property
+    def connected(self) -> bool:
+        """Check if the connection to the server is open."""
+        return self._writer is not None
+    
+    @property
+    def in_flight(self) -> int:
+        """Number of requests waiting for a response."""
+        return len(self._pending)
+    
+    async def connect(self) -> 'AsyncRelayClient':
+        """
+        Open the connection to the server, if it is not open yet.
+        
+        Returns:
+            The client itself
+        
+        Raises:
+            OSError: If the server cannot be reached
+        """
+        if self._connect_lock is None:
+            self._connect_lock = asyncio.Lock()
+        
+        async with self._connect_lock:
+            if self._writer is not None:
+                return self
+            
+            reader, writer = await asyncio.wait_for(self._open_connection(), self.timeout)
+            self._writer = writer
+            self._read_task = asyncio.ensure_future(self._read_responses(reader, writer))
+        
+        return self
+    
+    async def _open_connection(self) -> Tuple[asyncio.StreamReader, asyncio.StreamWriter]:
+        """Connect over the Unix domain socket if the server has one, else TCP."""
+        if self.unix_socket:
+            try:
+                return await asyncio.open_unix_connection(self.unix_socket)
+            except OSError:
+                # Not listening there (older server, or TCP only)
+                pass
+        
+        reader, writer = await asyncio.open_connection(self.host, self.port)
+        connection = writer.get_extra_info('socket')
+        if connection is not None:
+            connection.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        return reader, writer
+    
+    async def close(self) -> None:
+        """Close the connection and fail the requests still in flight."""
+        writer, read_task = self._writer, self._read_task
+        if writer is None:
+            return
+        
+        self._disconnect(writer)
+        if read_task is not None:
+            read_task.cancel()
+            try:
+                await read_task
+            except asyncio.CancelledError:
+                pass
+        try:
+            await writer.wait_closed()
+        except OSError:
+            pass
+    
+    async def send(self, task: Task, timeout: Optional[float] = None) -> Optional[Any]:
+        """
+        Send relay control request to server and wait for its response.
+        
+        Args:
+            task: Task to send
+            timeout: Deadline in seconds (default: 5.0 seconds, plus the
+                off time of power cycles)
+        
+        Returns:
+            Response from server or None if failed or timed out
+        
+        Raises:
+            asyncio.CancelledError: If the call was cancelled
+        """
+        # The server answers power cycles only after power is back on
+        timeout = (timeout or self.timeout) + task_off_time(task)
+        
+        for attempt in range(2):
+            reused = self._writer is not None
+            future = asyncio.get_running_loop().create_future()
+            try:
+                await self.connect()
+                await self._send(task, future)
+                return await asyncio.wait_for(future, timeout)
+            except ConnectionError:
+                # A reused connection may have been closed by a server
+                # restart before the request reached it; retry once
+                if not reused or attempt:
+                    return None
+            except (asyncio.TimeoutError, OSError, FramingError, CodecError, pickle.PickleError):
+                return None
+            finally:
+                if not future.done() or future.cancelled():
+                    self._forget(future)
+    
+    async def send_batch(
+        self,
+        tasks: Iterable[Task],
+        stop_on_failure: bool = False,
+        atomic: bool = False,
+        timeout: Optional[float] = None
+    ) -> Optional[List[Any]]:
+        """
+        Send many tasks in one request (see RelayClient.send_batch).
+        
+        Args:
+            tasks: Tasks to run, in order
+            stop_on_failure: Skip remaining tasks after the first failure
+            atomic: Run all tasks without any other command in between
+            timeout: Deadline in seconds (default: 5.0 seconds)
+        
+        Returns:
+            List of per-task responses (None for skipped tasks), or None
+            if the request failed
+        """
+        batch = TaskBatch(tasks, stop_on_failure=stop_on_failure, atomic=atomic)
+        
+        # Every serial command takes a while; allow for it on long batches
+        timeout = (timeout or self.timeout) + 0.5 * len(batch)
+        response = await self.send(batch, timeout)
+        return response if isinstance(response, list) else None
+    
+    async def power_cycle(
+        self,
+        device: Device,
+        off_time: float = 1.0,
+        by_value: bool = False,
+        priority: int = 0,
+        timeout: Optional[float] = None
+    ) -> Optional[Any]:
+        """
+        Switch a port off and back on in one server-side operation.
+        
+        Args:
+            device: Target device (port index, or hub value if by_value)
+            off_time: Seconds to keep power off
+            by_value: Address the port by hub value instead of index
+            priority: Task priority
+            timeout: Deadline in seconds on top of off_time
+                (default: 5.0 seconds)
+        
+        Returns:
+            'OK' once power is back on, 'KO' or None if failed
+        """
+        message = RELAY_POWER_CYCLE_MSG_SEC if by_value else RELAY_POWER_CYCLE_MSG
+        return await self.send(Task(device, message, priority, off_time), timeout)
+    
+    async def subscribe(self) -> AsyncIterator[Dict[str, Any]]:
+        """
+        Stream port state events from the server (see RelayClient.subscribe).
+        
+        The events arrive on a connection of their own, starting with a
+        'snapshot' of every board; the stream ends when the server closes
+        the connection.
+        
+        Returns:
+            Async iterator of event dictionaries
+        
+        Raises:
+            OSError: If the server cannot be reached
+            ConnectionError: If the server refused the subscription
+        """
+        codec = self.codec
+        reader, writer = await asyncio.wait_for(self._open_connection(), self.timeout)
+        
+        try:
+            task = Task(Device(), RELAY_SUBSCRIBE_MSG)
+            writer.write(encode_frame(0, encode_payload(task, codec), codec))
+            await writer.drain()
+            
+            while True:
+                frame = await read_frame_async(reader)
+                if frame is None:
+                    return
+                
+                event = decode_payload(frame[2], frame[1])
+                if not isinstance(event, dict):
+                    raise ConnectionError(f'Relay server refused the subscription: {event}')
+                yield event
+        except FramingError:
+            return
+        finally:
+            writer.close()
+            try:
+                await writer.wait_closed()
+            except OSError:
+                pass
+    
+    async def _send(self, task: Task, future: asyncio.Future) -> None:
+        """Send a request frame whose response resolves future."""
+        writer = self._writer
+        if writer is None:
+            raise ConnectionError('Connection to relay server lost')
+        
+        self._write(writer, task, future)
+        try:
+            await writer.drain()
+        except OSError:
+            self._disconnect(writer)
+            raise
+    
+    def _write(self, writer: asyncio.StreamWriter, task: Task, future: asyncio.Future) -> None:
+        """Register a request and queue its frame on the connection."""
+        request_id = next(self._request_ids) & 0xFFFFFFFF
+        codec = self.codec
+        frame = encode_frame(request_id, encode_payload(task, codec), codec)
+        
+        self._pending[request_id] = (future, task, codec)
+        writer.write(frame)
+    
+    def _forget(self, future: asyncio.Future) -> None:
+        """Drop the pending entry of a request nobody waits for anymore."""
+        for request_id, entry in list(self._pending.items()):
+            if entry[0] is future:
+                del self._pending[request_id]
+    
+    async def _read_responses(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        """Dispatch response frames to their pending futures."""
+        try:
+            while True:
+                frame = await read_frame_async(reader)
+                if frame is None:
+                    break
+                
+                request_id, codec, payload = frame
+                entry = self._pending.pop(request_id, None)
+                if entry is None:
+                    continue
+                
+                future, task, sent_codec = entry
+                if future.done():
+                    continue
+                
+                if codec != sent_codec:
+                    # The server did not accept the request's codec and
+                    # answered in one it does; switch to it and resend
+                    self.codec = codec
+                    try:
+                        self._write(writer, task, future)
+                    except (FramingError, CodecError, pickle.PickleError) as e:
+                        future.set_exception(e)
+                    continue
+                
+                try:
+                    future.set_result(decode_payload(payload, codec))
+                except (CodecError, pickle.PickleError, EOFError) as e:
+                    future.set_exception(e)
+        except (OSError, FramingError):
+            pass
+        finally:
+            self._disconnect(writer)
+    
+    def _disconnect(self, writer: asyncio.StreamWriter) -> None:
+        """Drop the connection and fail its pending requests."""
+        if self._writer is not writer:
+            return
+        self._writer = None
+        self._read_task = None
+        pending, self._pending = self._pending, {}
+        
+        writer.close()
+        
+        for future, _, _ in pending.values():
+            if not future.done():
+                future.set_exception(ConnectionError('Connection to relay server lost'))
+    
+    async def __aenter__(self):
+        """Async context manager entry."""
+        return await self.connect()
+    
+    async def __aexit__(self, exc_type, exc_val, exc_tb):
+        """Async context manager exit."""
+        await self.close()
+        return False
+    
+    def __repr__(self):
+        """String representation."""
+        return f'AsyncRelayClient(host={self.host}, port={self.port}, in_flight={self.in_flight})'
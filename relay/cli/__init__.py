@@ -8,10 +8,12 @@ Provides CLI entry points for relay control commands.
 from relay.cli.server import run_server
 from relay.cli.recover import run_recovery
 from relay.cli.initialize import run_initialization
+from relay.cli.trace import run_trace
 
 __all__ = [
     'run_server',
     'run_recovery',
     'run_initialization',
+    'run_trace',
 ]
 
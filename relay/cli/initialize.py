@@ -10,7 +10,7 @@ import argparse
 from typing import Optional
 
 from relay.controllers.initializer import DeviceInitializer
-from relay.core.config import LoggerFactory
+from relay.core.config import ConfigManager, LoggerFactory
 
 
 def parse_arguments() -> argparse.Namespace:
@@ -62,6 +62,12 @@ For more information, visit: https://github.com/yourusername/UsbRelay
         help='Force binding even if port is occupied'
     )
     
+    parser.add_argument(
+        '--embedded',
+        action='store_true',
+        help='Drive the relay board in this process if no relay server holds it'
+    )
+    
     parser.add_argument(
         '--log-level',
         type=str,
@@ -101,6 +107,9 @@ def run_initialization(action: str, serial_number: Optional[str] = None, **kwarg
     logger.info(f'Device Initialization - {action.upper()}'.center(60))
     logger.info('=' * 60)
     
+    if kwargs.get('embedded'):
+        ConfigManager().config.server.embedded = True
+    
     try:
         if action == 'bind':
             with DeviceInitializer(serial_number) as initializer:
@@ -140,7 +149,8 @@ def main():
         action=args.action,
         serial_number=args.serial,
         port=args.port,
-        force=args.force
+        force=args.force,
+        embedded=args.embedded
     ))
 
 
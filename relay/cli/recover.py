@@ -29,6 +29,7 @@ Examples:
   %(prog)s --serial ABC123456         Recover device ABC123456
   %(prog)s -s ABC123456 --attempts 5  Try recovery up to 5 times
   %(prog)s -s ABC123456 --force       Force recovery even if ADB is connected
+  %(prog)s -s ABC123456 --embedded    Recover without a running relay server
 
 For more information, visit: https://github.com/yourusername/UsbRelay
         """
@@ -64,6 +65,12 @@ For more information, visit: https://github.com/yourusername/UsbRelay
         help='ADB connection timeout in seconds (default: 10)'
     )
     
+    parser.add_argument(
+        '--embedded',
+        action='store_true',
+        help='Drive the relay board in this process if no relay server holds it'
+    )
+    
     parser.add_argument(
         '--log-level',
         type=str,
@@ -85,7 +92,8 @@ def run_recovery(
     serial_number: str,
     max_attempts: int = 3,
     timeout: int = 10,
-    force: bool = False
+    force: bool = False,
+    embedded: bool = False
 ) -> int:
     """
     Run device recovery procedure.
@@ -95,6 +103,7 @@ def run_recovery(
         max_attempts: Maximum recovery attempts
         timeout: ADB connection timeout
         force: Force recovery even if connected
+        embedded: Run relay commands in process (ServerConfig.embedded)
     
     Returns:
         Exit code (0 for success, 1 for failure)
@@ -109,6 +118,8 @@ def run_recovery(
         with DeviceRecoveryController(serial_number) as controller:
             controller.config.adb_timeout = timeout
             controller.config.max_recovery_attempts = max_attempts
+            if embedded:
+                controller.config.server.embedded = True
             
             if not force and controller.is_adb_connected():
                 logger.info('Device is already connected via ADB')
@@ -141,7 +152,8 @@ def main():
         serial_number=args.serial,
         max_attempts=args.attempts,
         timeout=args.timeout,
-        force=args.force
+        force=args.force,
+        embedded=args.embedded
     ))
 
 
@@ -38,6 +38,8 @@ Examples:
   %(prog)s --port 12345       Start server on custom port
   %(prog)s --host 0.0.0.0     Listen on all interfaces
   %(prog)s --log-level DEBUG  Enable debug logging
+  %(prog)s --asyncio          Serve clients from an asyncio event loop
+  %(prog)s --uart-trace relay.trc  Record relay frames (see relay-trace)
 
 For more information, visit: https://github.com/yourusername/UsbRelay
         """
@@ -65,6 +67,20 @@ For more information, visit: https://github.com/yourusername/UsbRelay
         help='Logging level (default: INFO)'
     )
     
+    parser.add_argument(
+        '--asyncio',
+        action='store_true',
+        help='Serve clients concurrently from an asyncio event loop'
+    )
+    
+    parser.add_argument(
+        '--uart-trace',
+        type=str,
+        metavar='FILE',
+        default=None,
+        help='Record relay frames to a binary trace file'
+    )
+    
     parser.add_argument(
         '--version',
         action='version',
@@ -77,7 +93,9 @@ For more information, visit: https://github.com/yourusername/UsbRelay
 def run_server(
     host: Optional[str] = None,
     port: Optional[int] = None,
-    log_level: str = 'INFO'
+    log_level: str = 'INFO',
+    use_asyncio: bool = False,
+    uart_trace: Optional[str] = None
 ) -> int:
     """
     Start the relay server.
@@ -86,6 +104,8 @@ def run_server(
         host: Server host address
         port: Server port number
         log_level: Logging level
+        use_asyncio: Use the asyncio server mode
+        uart_trace: Binary UART trace file (default: from config)
     
     Returns:
         Exit code (0 for success)
@@ -101,14 +121,17 @@ def run_server(
     
     try:
         # Create and start task manager
-        task_manager = RelayTaskManager(host=host, port=port)
+        task_manager = RelayTaskManager(host=host, port=port, trace_file=uart_trace)
         
         logger.info(f'Server listening on {task_manager.host}:{task_manager.port}')
         logger.info('Press Ctrl+C to stop server')
         logger.info('-' * 60)
         
         # Start server
-        task_manager.start()
+        if use_asyncio:
+            task_manager.start_async()
+        else:
+            task_manager.start()
         
         return 0
         
@@ -128,7 +151,9 @@ def main():
     sys.exit(run_server(
         host=args.host,
         port=args.port,
-        log_level=args.log_level
+        log_level=args.log_level,
+        use_asyncio=args.asyncio,
+        uart_trace=args.uart_trace
     ))
 
 
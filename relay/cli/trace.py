@@ -0,0 +1,178 @@
+# -*- coding: utf-8 -*-
+"""
+UART Trace CLI
+
+Command-line interface for reading binary UART trace files recorded by
+the relay server.
+"""
+
+import sys
+import argparse
+import datetime
+from typing import Optional
+
+from relay.hardware.trace import (
+    TRACE_TX,
+    read_trace,
+    describe_frame,
+    latency_summary,
+)
+
+
+def parse_arguments() -> argparse.Namespace:
+    """
+    Parse command line arguments.
+    
+    Returns:
+        Parsed arguments
+    """
+    parser = argparse.ArgumentParser(
+        prog='relay-trace',
+        description='Render UART traces or compute relay round-trip latency',
+        formatter_class=argparse.RawDescriptionHelpFormatter,
+        epilog="""
+Examples:
+  %(prog)s show relay.trc             Print every recorded frame
+  %(prog)s show relay.trc --board 1   Print the frames of board 1
+  %(prog)s latency relay.trc          Round-trip latency per command type
+
+For more information, visit: https://github.com/yourusername/UsbRelay
+        """
+    )
+    
+    parser.add_argument(
+        'command',
+        choices=['show', 'latency'],
+        help='show: render frames, latency: round-trip latency per command'
+    )
+    
+    parser.add_argument(
+        'file',
+        type=str,
+        help='Trace file written by relay-server --uart-trace'
+    )
+    
+    parser.add_argument(
+        '--board',
+        type=int,
+        default=None,
+        metavar='N',
+        help='Only use frames of this board'
+    )
+    
+    parser.add_argument(
+        '--limit',
+        type=int,
+        default=None,
+        metavar='N',
+        help='Print at most N frames (show only)'
+    )
+    
+    parser.add_argument(
+        '--version',
+        action='version',
+        version='%(prog)s 1.0.0'
+    )
+    
+    return parser.parse_args()
+
+
+def show_trace(path: str, board: Optional[int] = None, limit: Optional[int] = None) -> None:
+    """
+    Print the frames of a trace, one per line.
+    
+    Args:
+        path: Trace file
+        board: Only print frames of this board
+        limit: Maximum number of frames to print
+    """
+    previous = None
+    shown = 0
+    
+    for record in read_trace(path):
+        if board is not None and record.channel != board:
+            continue
+        if limit is not None and shown >= limit:
+            break
+        
+        stamp = datetime.datetime.fromtimestamp(record.timestamp).strftime('%Y-%m-%d %H:%M:%S.%f')
+        delta = record.timestamp - previous if previous is not None else 0.0
+        direction = 'TX' if record.direction == TRACE_TX else 'RX'
+        
+        print(f'{stamp}  +{delta * 1000:9.3f}ms  board {record.channel}  {direction}  '
+              f'{record.frame.hex(" "):<30} {describe_frame(record)}')
+        
+        previous = record.timestamp
+        shown += 1
+
+
+def show_latency(path: str, board: Optional[int] = None) -> None:
+    """
+    Print round-trip latency per command type.
+    
+    Args:
+        path: Trace file
+        board: Only use frames of this board
+    """
+    records = read_trace(path)
+    if board is not None:
+        records = (record for record in records if record.channel == board)
+    
+    summary = latency_summary(records)
+    if not summary:
+        print('No commands in trace')
+        return
+    
+    print(f'{"command":<12}{"count":>7}{"lost":>6}{"mean ms":>10}'
+          f'{"p50 ms":>10}{"p95 ms":>10}{"p99 ms":>10}{"max ms":>10}')
+    for command, stats in summary.items():
+        print(f'{command:<12}{stats["count"]:>7}{stats["unanswered"]:>6}'
+              f'{stats["mean"] * 1000:>10.2f}{stats["p50"] * 1000:>10.2f}'
+              f'{stats["p95"] * 1000:>10.2f}{stats["p99"] * 1000:>10.2f}'
+              f'{stats["max"] * 1000:>10.2f}')
+
+
+def run_trace(
+    command: str,
+    path: str,
+    board: Optional[int] = None,
+    limit: Optional[int] = None
+) -> int:
+    """
+    Run a trace command.
+    
+    Args:
+        command: 'show' or 'latency'
+        path: Trace file
+        board: Only use frames of this board
+        limit: Maximum number of frames to print (show only)
+    
+    Returns:
+        Exit code (0 for success)
+    """
+    try:
+        if command == 'show':
+            show_trace(path, board, limit)
+        else:
+            show_latency(path, board)
+        return 0
+    
+    except (OSError, ValueError) as e:
+        print(f'relay-trace: {e}', file=sys.stderr)
+        return 1
+
+
+def main():
+    """Main entry point for relay-trace command."""
+    args = parse_arguments()
+    
+    sys.exit(run_trace(
+        command=args.command,
+        path=args.file,
+        board=args.board,
+        limit=args.limit
+    ))
+
+
+if __name__ == '__main__':
+    main()
@@ -5,35 +5,142 @@ Relay Client
 Client for sending relay control requests to the server.
 """
 
+import os
+import time
 import socket
 import pickle
-from typing import Optional, Any
+import itertools
+import threading
+from concurrent.futures import Future, TimeoutError as FutureTimeoutError
+from typing import Optional, Any, Dict, Iterable, Iterator, List, Tuple
 
-from relay.utils.relay_utils import Task
+from relay.utils.relay_utils import Device, Task, TaskBatch, port_mask, task_off_time
+from relay.utils.codec import CodecError
+from relay.utils.framing import (
+    CODEC_PICKLE,
+    CODEC_BINARY,
+    FramingError,
+    encode_frame,
+    encode_payload,
+    decode_payload,
+    read_frame,
+    unix_socket_path,
+)
+from relay.constants import (
+    RELAY_GET_STATS_MSG,
+    RELAY_POWER_CYCLE_MSG,
+    RELAY_POWER_CYCLE_MSG_SEC,
+    RELAY_DISCONNECT_MASK_MSG,
+    RELAY_CONNECT_MASK_MSG,
+    RELAY_SUBSCRIBE_MSG,
+)
 from relay.core.config import ConfigManager
 
 
+# Host names that mean the server runs on this machine
+LOCAL_HOSTS = ('localhost', '127.0.0.1', '::1', '0.0.0.0', '')
+
+
+class UnansweredConnectionError(ConnectionError):
+    """A new connection was closed before the server answered any frame."""
+    pass
+
+
+def local_unix_socket(host: str, port: int) -> Optional[str]:
+    """
+    Unix domain socket of a relay server on this machine.
+    
+    Args:
+        host: Server host address
+        port: Server TCP port
+    
+    Returns:
+        Socket path from ServerConfig.unix_socket, or None if the server
+        is remote or Unix domain sockets are disabled
+    """
+    if host not in LOCAL_HOSTS:
+        return None
+    return unix_socket_path(ConfigManager().config.server.unix_socket, port)
+
+
 class RelayClient:
     """
     Client for communicating with relay server.
     
     Provides a high-level interface for sending relay control commands
     to the server and receiving responses.
+    
+    By default every request uses its own one-shot connection, which any
+    server version understands. With ``persistent=True`` the client keeps
+    one framed connection open and multiplexes many in-flight requests
+    over it; responses are matched to requests by request id.
+    
+    Requests are encoded with the binary codec unless configured
+    otherwise (``ServerConfig.wire_codec``). A server that answers in
+    another codec is talked to in that codec from then on. A server that
+    closes the connection without answering a framed request predates
+    framing; the request is then sent as a bare pickle, and later
+    requests go the same way for as long as the server answers them.
+    
+    Clients of a server on the same host connect over its Unix domain
+    socket (``ServerConfig.unix_socket``), falling back to TCP if the
+    server does not listen there.
+    
+    A persistent connection that has been idle for
+    ``health_check_interval`` seconds is checked with a statistics
+    request before it is reused, and replaced if the server does not
+    answer. A request that fails because a reused connection was closed
+    (the server restarted) is sent once more on a new connection. A new
+    connection closed without any answer falls back to a bare pickle,
+    as for one-shot requests. get_shared_client() hands out one such client per server for the
+    whole process.
     """
     
-    def __init__(self, host: Optional[str] = None, port: Optional[int] = None):
+    def __init__(
+        self,
+        host: Optional[str] = None,
+        port: Optional[int] = None,
+        persistent: bool = False,
+        codec: Optional[int] = None,
+        health_check_interval: Optional[float] = None,
+        unix_socket: Optional[str] = None
+    ):
         """
         Initialize relay client.
         
         Args:
             host: Server host address (default: from config)
             port: Server port number (default: from config)
+            persistent: Keep one framed connection open for all requests
+            codec: Payload codec, CODEC_BINARY or CODEC_PICKLE
+                (default: from config)
+            health_check_interval: Idle seconds after which a persistent
+                connection is checked before reuse (default: never)
+            unix_socket: Unix domain socket to try before TCP (default:
+                the server's, if it is local; '' to always use TCP)
         """
         config = ConfigManager().config
         
         self.host = host or config.server.host
         self.port = port or config.server.port
         self.timeout = 5.0
+        self.persistent = persistent
+        if codec is None:
+            codec = CODEC_BINARY if config.server.wire_codec == 'binary' else CODEC_PICKLE
+        self.codec = codec
+        self.health_check_interval = health_check_interval
+        if unix_socket is None:
+            unix_socket = local_unix_socket(self.host, self.port)
+        self.unix_socket = unix_socket or None
+        
+        # Set once a server answered a bare pickle but not a frame
+        self.legacy_server = False
+        
+        self._connection: Optional[socket.socket] = None
+        self._pending: Dict[int, Tuple[Future, Task, int]] = {}
+        self._request_ids = itertools.count(1)
+        self._lock = threading.RLock()
+        self._last_used = 0.0
     
     def send_request(self, task: Task, timeout: Optional[float] = None) -> Optional[Any]:
         """
@@ -46,32 +153,532 @@ class RelayClient:
         Returns:
             Response from server or None if failed
         """
+        # The server answers power cycles only after power is back on
+        timeout = (timeout or self.timeout) + task_off_time(task)
+        
+        if self.legacy_server:
+            answered, response = self._send_legacy(task, timeout)
+            if answered:
+                return response
+            
+            # Nothing came back: the server may have been upgraded
+            self.legacy_server = False
+        
+        if self.persistent:
+            for attempt in range(2):
+                reused = self._connection is not None
+                try:
+                    future = self.submit(task)
+                    return future.result(timeout)
+                except FutureTimeoutError:
+                    self._forget(future)
+                    return None
+                except UnansweredConnectionError:
+                    # Closed without a single answer: the server may predate
+                    # framing, so send this request the legacy way
+                    break
+                except ConnectionError:
+                    # A reused connection may have been closed by a server
+                    # restart before the request reached it; retry once
+                    if not reused or attempt:
+                        return None
+                except (socket.error, FramingError, CodecError, pickle.PickleError):
+                    return None
+            else:
+                return None
+            
+            answered, response = self._send_legacy(task, timeout)
+            self.legacy_server = answered
+            return response
+        
+        for _ in range(2):
+            answered, response = self._send_framed_once(task, timeout)
+            if answered:
+                return response
+            if response is None:
+                break
+            
+            # The server refused the codec and answered in the one it accepts
+            self.codec = response
+        else:
+            return None
+        
+        # No answer at all to a frame: the server may predate framing.
+        # Only this request is retried; the codec stays as it is.
+        answered, response = self._send_legacy(task, timeout)
+        self.legacy_server = answered
+        return response
+    
+    def _send_framed_once(self, task: Task, timeout: float) -> Tuple[bool, Optional[Any]]:
+        """
+        Send one framed request on its own connection.
+        
+        Returns:
+            Tuple of (answered, response). If answered is False nothing was
+            run, and response is the codec the server answered in, or None
+            if the server closed the connection without answering
+        """
+        codec = self.codec
+        connection = None
+        
+        try:
+            connection = self._open_connection(timeout)
+            connection.sendall(encode_frame(0, encode_payload(task, codec), codec))
+            
+            frame = read_frame(connection)
+            if frame is None:
+                return False, None
+            if frame[1] != codec:
+                return False, frame[1]
+            
+            return True, decode_payload(frame[2], codec)
+        
+        except ConnectionResetError:
+            return False, None
+        except (socket.error, FramingError, CodecError, pickle.PickleError):
+            return True, None
+        finally:
+            if connection:
+                connection.close()
+    
+    def _send_legacy(self, task: Task, timeout: float) -> Tuple[bool, Optional[Any]]:
+        """
+        Send a bare pickle on a one-shot connection and read the reply.
+        
+        Returns:
+            Tuple of (answered, response); answered is False if the server
+            closed the connection without replying
+        """
         connection = None
         
         try:
-            connection = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
-            connection.settimeout(timeout or self.timeout)
-            connection.connect((self.host, self.port))
+            connection = self._open_connection(timeout)
             
             # Send task
             data = pickle.dumps(task)
-            connection.send(data)
+            connection.sendall(data)
             
-            # Receive response
-            response_data = connection.recv(4096)
-            response = pickle.loads(response_data)
+            # Receive response (the server closes after replying)
+            chunks = []
+            while True:
+                chunk = connection.recv(4096)
+                if not chunk:
+                    break
+                chunks.append(chunk)
             
-            return response
+            if not chunks:
+                return False, None
+            return True, pickle.loads(b''.join(chunks))
             
-        except socket.timeout:
-            return None
-        except (socket.error, pickle.PickleError) as e:
-            return None
+        except ConnectionResetError:
+            return False, None
+        except (socket.error, EOFError, pickle.PickleError):
+            return True, None
         finally:
             if connection:
                 connection.close()
     
+    def _open_connection(self, timeout: float) -> socket.socket:
+        """Connect over the Unix domain socket if the server has one, else TCP."""
+        if self.unix_socket:
+            connection = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+            connection.settimeout(timeout)
+            try:
+                connection.connect(self.unix_socket)
+                return connection
+            except socket.error:
+                # Not listening there (older server, or TCP only)
+                connection.close()
+        
+        connection = socket.create_connection((self.host, self.port), timeout)
+        connection.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        connection.setsockopt(socket.SOL_SOCKET, socket.SO_KEEPALIVE, 1)
+        return connection
+    
+    def submit(self, task: Task) -> Future:
+        """
+        Send a request over the persistent connection without waiting.
+        
+        Args:
+            task: Task to send
+        
+        Returns:
+            Future resolved with the server's response
+        
+        Raises:
+            RuntimeError: If the client is not in persistent mode
+            socket.error: If the server cannot be reached
+        """
+        if not self.persistent:
+            raise RuntimeError('submit() requires a persistent client')
+        
+        if self.health_check_interval is not None:
+            self._check_connection()
+        
+        future: Future = Future()
+        self._send(task, future)
+        return future
+    
+    def _check_connection(self) -> None:
+        """Drop the persistent connection if it has idled and does not answer."""
+        connection = self._connection
+        if connection is None or time.monotonic() - self._last_used < self.health_check_interval:
+            return
+        
+        probe: Future = Future()
+        try:
+            self._send(Task(Device(), RELAY_GET_STATS_MSG), probe)
+            probe.result(self.timeout)
+        except Exception:
+            # The next request opens a new connection
+            self._disconnect(connection)
+    
+    def _send(self, task: Task, future: Future) -> None:
+        """Send a request frame whose response resolves future."""
+        with self._lock:
+            connection = self._connection or self._connect()
+            self._last_used = time.monotonic()
+            request_id = next(self._request_ids) & 0xFFFFFFFF
+            codec = self.codec
+            self._pending[request_id] = (future, task, codec)
+            
+            try:
+                connection.sendall(encode_frame(request_id, encode_payload(task, codec), codec))
+            except Exception:
+                self._pending.pop(request_id, None)
+                self._disconnect(connection)
+                raise
+    
+    def _forget(self, future: Future) -> None:
+        """Drop the pending entry of a request nobody waits for anymore."""
+        with self._lock:
+            for request_id, entry in list(self._pending.items()):
+                if entry[0] is future:
+                    del self._pending[request_id]
+    
+    def _connect(self) -> socket.socket:
+        """Open the persistent connection and start its reader thread."""
+        connection = self._open_connection(self.timeout)
+        connection.settimeout(None)
+        self._connection = connection
+        
+        threading.Thread(
+            target=self._read_responses,
+            args=(connection,),
+            name='relay-client-reader',
+            daemon=True
+        ).start()
+        
+        return connection
+    
+    def _read_responses(self, connection: socket.socket) -> None:
+        """Dispatch response frames to their pending futures."""
+        answered = False
+        
+        try:
+            while True:
+                frame = read_frame(connection)
+                if frame is None:
+                    break
+                
+                answered = True
+                request_id, codec, payload = frame
+                with self._lock:
+                    self._last_used = time.monotonic()
+                    entry = self._pending.pop(request_id, None)
+                if entry is None:
+                    continue
+                
+                future, task, sent_codec = entry
+                if future.done():
+                    continue
+                
+                if codec != sent_codec:
+                    # The server did not accept the request's codec and
+                    # answered in one it does; switch to it and resend
+                    self.codec = codec
+                    threading.Thread(target=self._resend, args=(task, future), daemon=True).start()
+                    continue
+                
+                try:
+                    future.set_result(decode_payload(payload, codec))
+                except (CodecError, pickle.PickleError, EOFError) as e:
+                    future.set_exception(e)
+        except (socket.error, FramingError):
+            pass
+        finally:
+            self._disconnect(connection, None if answered else UnansweredConnectionError(
+                'Relay server closed the connection without answering'
+            ))
+    
+    def _resend(self, task: Task, future: Future) -> None:
+        """Send a request again after a codec switch."""
+        try:
+            self._send(task, future)
+        except Exception as e:
+            if not future.done():
+                future.set_exception(e)
+    
+    def _disconnect(self, connection: socket.socket, error: Optional[ConnectionError] = None) -> None:
+        """
+        Drop a persistent connection and fail its pending requests.
+        
+        Args:
+            connection: Connection to drop
+            error: Exception for the pending requests (default: lost
+                connection)
+        """
+        with self._lock:
+            if self._connection is not connection:
+                return
+            self._connection = None
+            pending, self._pending = self._pending, {}
+        
+        try:
+            connection.close()
+        except socket.error:
+            pass
+        
+        for future, _, _ in pending.values():
+            if not future.done():
+                future.set_exception(error or ConnectionError('Connection to relay server lost'))
+    
+    def close(self) -> None:
+        """Close the persistent connection, if any."""
+        connection = self._connection
+        if connection is not None:
+            try:
+                connection.shutdown(socket.SHUT_RDWR)
+            except socket.error:
+                pass
+            self._disconnect(connection)
+    
+    def power_cycle(
+        self,
+        device: Device,
+        off_time: float = 1.0,
+        by_value: bool = False,
+        priority: int = 0
+    ) -> Optional[Any]:
+        """
+        Switch a port off and back on in one server-side operation.
+        
+        Args:
+            device: Target device (port index, or hub value if by_value)
+            off_time: Seconds to keep power off
+            by_value: Address the port by hub value instead of index
+            priority: Task priority
+        
+        Returns:
+            'OK' once power is back on, 'KO' or None if failed
+        """
+        message = RELAY_POWER_CYCLE_MSG_SEC if by_value else RELAY_POWER_CYCLE_MSG
+        return self.send_request(Task(device, message, priority, off_time))
+    
+    def switch_ports(
+        self,
+        ports: Iterable[int],
+        on: bool,
+        board: Optional[int] = None,
+        priority: int = 0,
+        timeout: Optional[float] = None
+    ) -> Optional[Any]:
+        """
+        Turn several ports on or off in one request.
+        
+        The server sends every port with as few serial frames as the board
+        allows. With ``ServerConfig.mask_skip_known`` it skips ports it
+        believes are already in the target state.
+        
+        Args:
+            ports: Relay port indexes; global unless board is given
+            on: Turn the ports on (True) or off (False)
+            board: Relay board the port indexes are local to
+            priority: Task priority
+            timeout: Connection timeout (default: 5.0 seconds)
+        
+        Returns:
+            'OK' if every port was switched, 'KO' or None if failed
+        """
+        message = RELAY_CONNECT_MASK_MSG if on else RELAY_DISCONNECT_MASK_MSG
+        device = Device(value=port_mask(ports))
+        return self.send_request(Task(device, message, priority, board=board), timeout)
+    
+    def send_batch(
+        self,
+        tasks: Iterable[Task],
+        stop_on_failure: bool = False,
+        atomic: bool = False,
+        timeout: Optional[float] = None
+    ) -> Optional[List[Any]]:
+        """
+        Send many tasks in one request.
+        
+        Args:
+            tasks: Tasks to run, in order
+            stop_on_failure: Skip remaining tasks after the first failure
+            atomic: Run all tasks without any other command in between
+            timeout: Connection timeout (default: 5.0 seconds)
+        
+        Returns:
+            List of per-task responses (None for skipped tasks), or None
+            if the request failed
+        """
+        batch = TaskBatch(tasks, stop_on_failure=stop_on_failure, atomic=atomic)
+        
+        # Every serial command takes a while; allow for it on long batches
+        timeout = (timeout or self.timeout) + 0.5 * len(batch)
+        response = self.send_request(batch, timeout)
+        return response if isinstance(response, list) else None
+    
+    def subscribe(self) -> Iterator[Dict[str, Any]]:
+        """
+        Stream port state events from the server.
+        
+        The events arrive on a connection of their own. The first is a
+        'snapshot' of every board, followed by every change the server
+        makes (see relay.server.events). The stream ends when the server
+        closes the connection, for example on restart; subscribe again
+        to get a fresh snapshot. Closing the iterator closes the
+        connection.
+        
+        Returns:
+            Iterator of event dictionaries
+        
+        Raises:
+            socket.error: If the server cannot be reached
+            ConnectionError: If the server refused the subscription
+        """
+        codec = self.codec
+        connection = self._open_connection(self.timeout)
+        
+        try:
+            task = Task(Device(), RELAY_SUBSCRIBE_MSG)
+            connection.sendall(encode_frame(0, encode_payload(task, codec), codec))
+            connection.settimeout(None)
+            
+            while True:
+                frame = read_frame(connection)
+                if frame is None:
+                    return
+                
+                event = decode_payload(frame[2], frame[1])
+                if not isinstance(event, dict):
+                    raise ConnectionError(f'Relay server refused the subscription: {event}')
+                yield event
+        except FramingError:
+            return
+        finally:
+            connection.close()
+    
+    def get_stats(self, timeout: Optional[float] = None) -> Optional[Dict[str, Any]]:
+        """
+        Get server scheduler statistics.
+        
+        Args:
+            timeout: Connection timeout (default: 5.0 seconds)
+        
+        Returns:
+            Queue depth and per-priority wait times, or None if failed
+        """
+        return self.send_request(Task(Device(), RELAY_GET_STATS_MSG), timeout)
+    
+    def __enter__(self):
+        """Context manager entry."""
+        return self
+    
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        """Context manager exit."""
+        self.close()
+        return False
+    
     def __repr__(self):
         """String representation."""
-        return f'RelayClient(host={self.host}, port={self.port})'
+        mode = 'persistent' if self.persistent else 'one-shot'
+        return f'RelayClient(host={self.host}, port={self.port}, mode={mode})'
+
+
+_shared_clients: Dict[Tuple[str, int], RelayClient] = {}
+_shared_lock = threading.Lock()
+
+
+def get_shared_client(host: Optional[str] = None, port: Optional[int] = None) -> RelayClient:
+    """
+    Get the process-wide client for a relay server.
+    
+    The client is persistent, so all callers share one warm connection
+    per server, checked before reuse after ``ServerConfig.client_health_check``
+    idle seconds and reopened when the server restarts. It is thread-safe;
+    callers must not close it.
+    
+    Args:
+        host: Server host address (default: from config)
+        port: Server port number (default: from config)
+    
+    Returns:
+        Shared persistent RelayClient
+    """
+    if host is None or port is None:
+        server = ConfigManager().config.server
+        host, port = host or server.host, port or server.port
+    
+    with _shared_lock:
+        client = _shared_clients.get((host, port))
+        if client is None:
+            client = RelayClient(
+                host,
+                port,
+                persistent=True,
+                health_check_interval=ConfigManager().config.server.client_health_check
+            )
+            _shared_clients[(host, port)] = client
+        return client
+
+
+def close_shared_clients() -> None:
+    """Close and forget every shared client."""
+    with _shared_lock:
+        clients = list(_shared_clients.values())
+        _shared_clients.clear()
+    
+    for client in clients:
+        client.close()
+
+
+def get_relay_channel(host: Optional[str] = None, port: Optional[int] = None) -> Any:
+    """
+    Get what relay requests are sent through: the embedded engine or the server.
+    
+    With ``ServerConfig.embedded`` set and a local server address, the
+    tasks run in this process on a RelayEngine (see get_shared_engine),
+    without the socket hop. If the boards are locked by a running relay
+    server, or embedding is off, the shared client of the server is used.
+    Both have the same send_request() and submit() interface.
+    
+    Args:
+        host: Server host address (default: from config)
+        port: Server port number (default: from config)
+    
+    Returns:
+        Running RelayEngine or shared persistent RelayClient
+    """
+    server = ConfigManager().config.server
+    if server.embedded and (host or server.host) in LOCAL_HOSTS:
+        from relay.server.engine import get_shared_engine
+        
+        engine = get_shared_engine()
+        if engine is not None:
+            return engine
+    
+    return get_shared_client(host, port)
+
+
+def _forget_shared_clients() -> None:
+    """Drop the parent's shared clients in a forked child."""
+    global _shared_lock
+    _shared_lock = threading.Lock()
+    _shared_clients.clear()
+
 
+if hasattr(os, 'register_at_fork'):
+    os.register_at_fork(after_in_child=_forget_shared_clients)
@@ -86,6 +86,13 @@ RELAY_DISCONNECT_MSG_SEC = 2  # Disconnect USB by hub value
 RELAY_CONNECT_MSG_SEC = 3     # Connect USB by hub value
 RELAY_GET_STATE_MSG = 4       # Get all port states
 RELAY_SET_STATE_MSG = 5       # Set port state (bind device)
+RELAY_GET_STATS_MSG = 6       # Get server scheduler statistics
+RELAY_POWER_CYCLE_MSG = 7     # Power cycle USB by port index
+RELAY_POWER_CYCLE_MSG_SEC = 8  # Power cycle USB by hub value
+RELAY_BATCH_MSG = 9           # Batch of tasks (TaskBatch)
+RELAY_DISCONNECT_MASK_MSG = 10  # Disconnect USB ports in bitmask (Device.value)
+RELAY_CONNECT_MASK_MSG = 11     # Connect USB ports in bitmask (Device.value)
+RELAY_SUBSCRIBE_MSG = 12        # Stream port state events (framed connections)
 
 Constants.RELAY_DISCONNECT_MSG = RELAY_DISCONNECT_MSG
 Constants.RELAY_CONNECT_MSG = RELAY_CONNECT_MSG
@@ -93,6 +100,22 @@ Constants.RELAY_DISCONNECT_MSG_SEC = RELAY_DISCONNECT_MSG_SEC
 Constants.RELAY_CONNECT_MSG_SEC = RELAY_CONNECT_MSG_SEC
 Constants.RELAY_GET_STATE_MSG = RELAY_GET_STATE_MSG
 Constants.RELAY_SET_STATE_MSG = RELAY_SET_STATE_MSG
+Constants.RELAY_GET_STATS_MSG = RELAY_GET_STATS_MSG
+Constants.RELAY_POWER_CYCLE_MSG = RELAY_POWER_CYCLE_MSG
+Constants.RELAY_POWER_CYCLE_MSG_SEC = RELAY_POWER_CYCLE_MSG_SEC
+Constants.RELAY_BATCH_MSG = RELAY_BATCH_MSG
+Constants.RELAY_DISCONNECT_MASK_MSG = RELAY_DISCONNECT_MASK_MSG
+Constants.RELAY_CONNECT_MASK_MSG = RELAY_CONNECT_MASK_MSG
+Constants.RELAY_SUBSCRIBE_MSG = RELAY_SUBSCRIBE_MSG
+
+# Task Priorities (lower value runs first)
+TASK_PRIORITY_HIGH = 0        # Recovery toggles and bindings
+TASK_PRIORITY_NORMAL = 5      # Regular commands
+TASK_PRIORITY_LOW = 10        # State polling
+
+Constants.TASK_PRIORITY_HIGH = TASK_PRIORITY_HIGH
+Constants.TASK_PRIORITY_NORMAL = TASK_PRIORITY_NORMAL
+Constants.TASK_PRIORITY_LOW = TASK_PRIORITY_LOW
 
 # =============================================================================
 # SERVER CONFIGURATION
@@ -123,6 +146,7 @@ Constants.FRAME_SUCCESS = 0
 
 Constants.CMD_CONTROL = 33
 Constants.CMD_ALL = 64
+Constants.CMD_MASK = 65
 Constants.CMD_USB = 16
 Constants.CMD_OFF = 0
 Constants.CMD_ON = 255
@@ -19,7 +19,7 @@ except ImportError:
     HAS_WIN32 = False
 
 from relay.core.base import BaseRelayController, ADBCommandMixin
-from relay.utils.relay_utils import Device, Task
+from relay.utils.relay_utils import Device, Task, parse_port_states
 from relay.utils.database import DatabaseManager
 from relay.utils.usb_info import USBDeviceInfo
 from relay.constants import (
@@ -27,6 +27,9 @@ from relay.constants import (
     RELAY_CONNECT_MSG,
     RELAY_SET_STATE_MSG,
     RELAY_GET_STATE_MSG,
+    TASK_PRIORITY_HIGH,
+    TASK_PRIORITY_NORMAL,
+    TASK_PRIORITY_LOW,
 )
 
 
@@ -191,7 +194,7 @@ class DeviceInitializer(BaseRelayController, ADBCommandMixin):
         
         # Release port
         device = Device(self.serial_number, index=relay_port, value=0)
-        task = Task(device, RELAY_SET_STATE_MSG)
+        task = Task(device, RELAY_SET_STATE_MSG, TASK_PRIORITY_HIGH)
         
         response = self._send_relay_request(task)
         
@@ -247,16 +250,10 @@ class DeviceInitializer(BaseRelayController, ADBCommandMixin):
     def _get_relay_port_states(self) -> List[str]:
         """Get current relay port states from server."""
         try:
-            task = Task(Device(self.serial_number), RELAY_GET_STATE_MSG)
+            task = Task(Device(self.serial_number), RELAY_GET_STATE_MSG, TASK_PRIORITY_LOW)
             response = self._send_relay_request(task)
             
-            if isinstance(response, str):
-                # Parse response string
-                return response.strip('[]').replace("'", '').split(', ')
-            elif isinstance(response, list):
-                return response
-            else:
-                return []
+            return parse_port_states(response)
                 
         except Exception as e:
             self.logger.error(f'Failed to get relay states: {e}')
@@ -362,14 +359,14 @@ class DeviceInitializer(BaseRelayController, ADBCommandMixin):
         
         for attempt in range(times):
             # Disconnect
-            task_disconnect = Task(device, RELAY_DISCONNECT_MSG)
+            task_disconnect = Task(device, RELAY_DISCONNECT_MSG, TASK_PRIORITY_NORMAL)
             self._send_relay_request(task_disconnect)
             time.sleep(2)
             
             # Check if device disappears
             if self.serial_number not in self._get_adb_devices():
                 # Reconnect
-                task_connect = Task(device, RELAY_CONNECT_MSG)
+                task_connect = Task(device, RELAY_CONNECT_MSG, TASK_PRIORITY_NORMAL)
                 self._send_relay_request(task_connect)
                 
                 # Wait for ADB
@@ -377,7 +374,7 @@ class DeviceInitializer(BaseRelayController, ADBCommandMixin):
                     return True
             else:
                 self.logger.debug(f'Device not found on relay port [{port}]')
-                task_connect = Task(device, RELAY_CONNECT_MSG)
+                task_connect = Task(device, RELAY_CONNECT_MSG, TASK_PRIORITY_NORMAL)
                 self._send_relay_request(task_connect)
         
         return False
@@ -463,22 +460,18 @@ class DeviceInitializer(BaseRelayController, ADBCommandMixin):
     
     def _send_relay_request(self, task: Task) -> Optional[str]:
         """
-        Send relay control request to server.
+        Send relay control request to server, or run it in process.
         
         Args:
             task: Task to send
         
         Returns:
-            Response from server
+            Response from server or embedded engine
         """
-        from relay.client import RelayClient
-        
-        client = RelayClient(
-            host=self.config.server.host,
-            port=self.config.server.port
-        )
+        from relay.client import get_relay_channel
         
-        return client.send_request(task)
+        channel = get_relay_channel(self.config.server.host, self.config.server.port)
+        return channel.send_request(task)
     
     def _ensure_database_row(self) -> None:
         """Ensure database row exists for device."""
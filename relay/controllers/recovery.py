@@ -9,11 +9,11 @@ import os
 import time
 import socket
 import pickle
-from typing import Optional, List
+from typing import Optional, List, Any
 from pathlib import Path
 
 from relay.core.base import BaseRelayController, ADBCommandMixin
-from relay.utils.relay_utils import Device, Task
+from relay.utils.relay_utils import Device, Task, parse_port_states
 from relay.utils.database import DatabaseManager
 from relay.utils.usb_info import USBDeviceInfo
 from relay.constants import (
@@ -22,6 +22,11 @@ from relay.constants import (
     RELAY_DISCONNECT_MSG_SEC,
     RELAY_CONNECT_MSG_SEC,
     RELAY_GET_STATE_MSG,
+    RELAY_GET_STATS_MSG,
+    RELAY_POWER_CYCLE_MSG,
+    RELAY_POWER_CYCLE_MSG_SEC,
+    TASK_PRIORITY_HIGH,
+    TASK_PRIORITY_LOW,
 )
 
 
@@ -51,6 +56,9 @@ class DeviceRecoveryController(BaseRelayController, ADBCommandMixin):
         self.hub_value_str: str = ''
         self.relay_port_states: List[str] = []
         
+        # Whether the relay server runs power cycles itself (None: unknown)
+        self.server_power_cycle: Optional[bool] = None
+        
         # Database fields
         self.current_date = time.strftime('%Y%m%d', time.localtime())
         self.hostname = socket.gethostname()
@@ -181,16 +189,10 @@ class DeviceRecoveryController(BaseRelayController, ADBCommandMixin):
     def _get_relay_port_states(self) -> List[str]:
         """Get current relay port states from server."""
         try:
-            task = Task(Device(self.serial_number), RELAY_GET_STATE_MSG)
+            task = Task(Device(self.serial_number), RELAY_GET_STATE_MSG, TASK_PRIORITY_LOW)
             response = self._send_relay_request(task)
             
-            if isinstance(response, str):
-                # Parse response string
-                return response.strip('[]').replace("'", '').split(', ')
-            elif isinstance(response, list):
-                return response
-            else:
-                return []
+            return parse_port_states(response)
                 
         except Exception as e:
             self.logger.error(f'Failed to get relay states: {e}')
@@ -240,14 +242,8 @@ class DeviceRecoveryController(BaseRelayController, ADBCommandMixin):
         for attempt in range(2):
             self.logger.info(f'Recovery attempt {attempt + 1}/2')
             
-            # Disconnect
-            task_disconnect = Task(device, RELAY_DISCONNECT_MSG)
-            self._send_relay_request(task_disconnect)
-            time.sleep(1)
-            
-            # Reconnect
-            task_connect = Task(device, RELAY_CONNECT_MSG)
-            self._send_relay_request(task_connect)
+            # Disconnect and reconnect
+            self._power_cycle(device, by_value=False)
             
             # Wait for ADB
             if self.wait_for_adb(timeout=self.config.adb_timeout):
@@ -291,14 +287,8 @@ class DeviceRecoveryController(BaseRelayController, ADBCommandMixin):
                 self.logger.warning('Device is offline, restarting ADB server')
                 self.restart_adb_server()
             
-            # Disconnect USB
-            task_disconnect = Task(device, RELAY_DISCONNECT_MSG_SEC)
-            self._send_relay_request(task_disconnect)
-            time.sleep(1)
-            
-            # Reconnect USB
-            task_connect = Task(device, RELAY_CONNECT_MSG_SEC)
-            self._send_relay_request(task_connect)
+            # Disconnect and reconnect USB
+            self._power_cycle(device, by_value=True)
             
             # Wait for ADB connection
             if self.wait_for_adb(timeout=self.config.adb_timeout):
@@ -307,24 +297,82 @@ class DeviceRecoveryController(BaseRelayController, ADBCommandMixin):
         
         return False
     
+    def _power_cycle(self, device: Device, by_value: bool, off_time: float = 1.0) -> None:
+        """
+        Switch the device's relay port off and back on.
+        
+        Uses the server-side power cycle; falls back to separate
+        disconnect/connect requests only if the server does not support
+        it. A cycle that failed on a supporting server is not repeated,
+        since part of it may already have reached the board.
+        
+        Args:
+            device: Target device
+            by_value: Address the port by hub value instead of index
+            off_time: Seconds to keep power off
+        """
+        message = RELAY_POWER_CYCLE_MSG_SEC if by_value else RELAY_POWER_CYCLE_MSG
+        task = Task(device, message, TASK_PRIORITY_HIGH, off_time)
+        
+        response = self._send_relay_request(task)
+        if response == 'OK':
+            return
+        
+        if not self._lacks_server_power_cycle(response):
+            self.logger.error(f'Server power cycle failed: {response}')
+            return
+        
+        self.logger.warning('Server does not support power cycle, toggling port directly')
+        
+        if by_value:
+            off_message, on_message = RELAY_DISCONNECT_MSG_SEC, RELAY_CONNECT_MSG_SEC
+        else:
+            off_message, on_message = RELAY_DISCONNECT_MSG, RELAY_CONNECT_MSG
+        
+        self._send_relay_request(Task(device, off_message, TASK_PRIORITY_HIGH))
+        time.sleep(off_time)
+        self._send_relay_request(Task(device, on_message, TASK_PRIORITY_HIGH))
+    
+    def _lacks_server_power_cycle(self, response: Any) -> bool:
+        """
+        Tell an unsupported power cycle from a failed one.
+        
+        Servers without power cycle support answer unknown messages with
+        'KO'. They also predate RELAY_GET_STATS_MSG, which is answered
+        with a dictionary by servers that support both, so one statistics
+        request settles it. No answer at all never counts as unsupported.
+        
+        Args:
+            response: Server response to the power cycle request
+        
+        Returns:
+            True if the server does not know the power cycle message
+        """
+        if response != 'KO':
+            return False
+        
+        if self.server_power_cycle is None:
+            stats = self._send_relay_request(Task(Device('recovery'), RELAY_GET_STATS_MSG))
+            if stats is None:
+                return False
+            self.server_power_cycle = isinstance(stats, dict)
+        
+        return not self.server_power_cycle
+    
     def _send_relay_request(self, task: Task) -> Any:
         """
-        Send relay control request to server.
+        Send relay control request to server, or run it in process.
         
         Args:
             task: Task to send
         
         Returns:
-            Response from server
+            Response from server or embedded engine
         """
-        from relay.client import RelayClient
-        
-        client = RelayClient(
-            host=self.config.server.host,
-            port=self.config.server.port
-        )
+        from relay.client import get_relay_channel
         
-        return client.send_request(task)
+        channel = get_relay_channel(self.config.server.host, self.config.server.port)
+        return channel.send_request(task)
     
     def _update_database(self, update_clause: str) -> None:
         """
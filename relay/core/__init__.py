@@ -8,12 +8,13 @@ This package contains the core business logic for relay control:
 - Base classes and interfaces
 """
 
-from relay.core.config import ConfigManager, LoggerFactory
+from relay.core.config import ConfigManager, LoggerFactory, SerialConfig
 from relay.core.base import BaseRelayController
 
 __all__ = [
     'ConfigManager',
     'LoggerFactory',
+    'SerialConfig',
     'BaseRelayController',
 ]
 
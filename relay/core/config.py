@@ -24,6 +24,23 @@ FOREGROUND_YELLOW = FOREGROUND_RED | FOREGROUND_GREEN
 STD_OUTPUT_HANDLE = -11
 
 
+def user_cache_file(name: str) -> str:
+    """
+    Absolute path of a state file in the per-user cache directory.
+    
+    State learned at run time (board latencies, the boards found) is kept
+    here, so it does not depend on the directory a server is started from.
+    
+    Args:
+        name: File name
+    
+    Returns:
+        Path under $XDG_CACHE_HOME/usb_relay (default ~/.cache/usb_relay)
+    """
+    cache_home = os.environ.get('XDG_CACHE_HOME') or os.path.join(os.path.expanduser('~'), '.cache')
+    return os.path.join(cache_home, 'usb_relay', name)
+
+
 @dataclass
 class DatabaseConfig:
     """Database connection configuration."""
@@ -41,6 +58,41 @@ class ServerConfig:
     host: str = 'localhost'
     port: int = 11222
     backlog: int = 5
+    aging_interval: float = 1.0
+    state_cache_max_age: float = 30.0
+    state_resync_interval: float = 300.0
+    max_off_time: float = 60.0
+    wire_codec: str = 'binary'
+    allow_pickle: bool = False
+    ports_per_board: int = 5
+    uart_trace_file: str = ''
+    uart_trace_capacity: int = 4096
+    link_retry_deadline: float = 30.0
+    link_max_backoff: float = 30.0
+    board_cache_file: str = field(default_factory=lambda: user_cache_file('relay_boards.json'))
+    mask_frames: bool = False
+    mask_skip_known: bool = False
+    client_health_check: float = 30.0
+    unix_socket: str = '/tmp/usb_relay_{port}.sock'
+    board_lock: str = 'usb_relay_{board}.lock'
+    embedded: bool = False
+
+
+@dataclass
+class SerialConfig:
+    """Serial command pacing configuration (see CommandPacing)."""
+    timeout_floor: float = 0.05
+    timeout_cap: float = 1.0
+    timeout_percentile: float = 99.0
+    timeout_factor: float = 2.0
+    gap_floor: float = 0.0
+    gap_cap: float = 0.1
+    gap_factor: float = 0.1
+    pacing_window: int = 200
+    pacing_min_samples: int = 20
+    response_timeout: Optional[float] = None
+    min_gap: Optional[float] = None
+    pacing_file: str = field(default_factory=lambda: user_cache_file('relay_pacing.json'))
 
 
 @dataclass
@@ -48,6 +100,7 @@ class RelayConfig:
     """Main relay configuration."""
     database: DatabaseConfig = field(default_factory=DatabaseConfig)
     server: ServerConfig = field(default_factory=ServerConfig)
+    serial: SerialConfig = field(default_factory=SerialConfig)
     log_dir: str = 'RelayLog'
     adb_timeout: int = 10
     max_recovery_attempts: int = 3
@@ -65,10 +118,12 @@ class RelayConfig:
         """
         db_config = DatabaseConfig(**config_dict.get('database', {}))
         srv_config = ServerConfig(**config_dict.get('server', {}))
+        serial_config = SerialConfig(**config_dict.get('serial', {}))
         
         return cls(
             database=db_config,
             server=srv_config,
+            serial=serial_config,
             log_dir=config_dict.get('log_dir', 'RelayLog'),
             adb_timeout=config_dict.get('adb_timeout', 10),
             max_recovery_attempts=config_dict.get('max_recovery_attempts', 3)
@@ -89,6 +144,38 @@ class RelayConfig:
                 'host': self.server.host,
                 'port': self.server.port,
                 'backlog': self.server.backlog,
+                'aging_interval': self.server.aging_interval,
+                'state_cache_max_age': self.server.state_cache_max_age,
+                'state_resync_interval': self.server.state_resync_interval,
+                'max_off_time': self.server.max_off_time,
+                'wire_codec': self.server.wire_codec,
+                'allow_pickle': self.server.allow_pickle,
+                'ports_per_board': self.server.ports_per_board,
+                'uart_trace_file': self.server.uart_trace_file,
+                'uart_trace_capacity': self.server.uart_trace_capacity,
+                'link_retry_deadline': self.server.link_retry_deadline,
+                'link_max_backoff': self.server.link_max_backoff,
+                'board_cache_file': self.server.board_cache_file,
+                'mask_frames': self.server.mask_frames,
+                'mask_skip_known': self.server.mask_skip_known,
+                'client_health_check': self.server.client_health_check,
+                'unix_socket': self.server.unix_socket,
+                'board_lock': self.server.board_lock,
+                'embedded': self.server.embedded,
+            },
+            'serial': {
+                'timeout_floor': self.serial.timeout_floor,
+                'timeout_cap': self.serial.timeout_cap,
+                'timeout_percentile': self.serial.timeout_percentile,
+                'timeout_factor': self.serial.timeout_factor,
+                'gap_floor': self.serial.gap_floor,
+                'gap_cap': self.serial.gap_cap,
+                'gap_factor': self.serial.gap_factor,
+                'pacing_window': self.serial.pacing_window,
+                'pacing_min_samples': self.serial.pacing_min_samples,
+                'response_timeout': self.serial.response_timeout,
+                'min_gap': self.serial.min_gap,
+                'pacing_file': self.serial.pacing_file,
             },
             'log_dir': self.log_dir,
             'adb_timeout': self.adb_timeout,
@@ -132,6 +219,8 @@ class ConfigManager:
                 config.database = DatabaseConfig(**config_local.DATABASE_CONFIG)
             if hasattr(config_local, 'SERVER_CONFIG'):
                 config.server = ServerConfig(**config_local.SERVER_CONFIG)
+            if hasattr(config_local, 'SERIAL_CONFIG'):
+                config.serial = SerialConfig(**config_local.SERIAL_CONFIG)
         except ImportError:
             pass
         
@@ -4,15 +4,49 @@ Hardware Communication Modules
 
 This package contains hardware-specific communication modules:
 - Serial communication with relay boards
+- Asyncio serial transport
 - Protocol frame building
+- UART trace recording
+- Adaptive command pacing
+- Serial link supervision and reconnect
+- Relay board discovery
+- Cross-process relay board locks
+- Virtual relay board emulator
 - Hardware configuration
 """
 
-from relay.hardware.serial_comm import SerialCommunicator
-from relay.hardware.protocol import ProtocolFrameBuilder
+from relay.hardware.serial_comm import SerialCommunicator, PortIdentity
+from relay.hardware.async_serial import AsyncSerialTransport
+from relay.hardware.protocol import (
+    ProtocolFrameBuilder,
+    FrameDecoder,
+    Ack,
+    ErrorResponse,
+    PortStates,
+)
+from relay.hardware.trace import UartTraceRecorder, read_trace
+from relay.hardware.pacing import CommandPacing
+from relay.hardware.link import SerialLinkSupervisor
+from relay.hardware.discovery import BoardDiscovery
+from relay.hardware.board_lock import BoardLock, BoardLockError
+from relay.hardware.emulator import VirtualRelayBoard
 
 __all__ = [
     'SerialCommunicator',
+    'PortIdentity',
+    'AsyncSerialTransport',
+    'CommandPacing',
+    'SerialLinkSupervisor',
+    'BoardDiscovery',
+    'BoardLock',
+    'BoardLockError',
+    'VirtualRelayBoard',
     'ProtocolFrameBuilder',
+    'FrameDecoder',
+    'Ack',
+    'ErrorResponse',
+    'PortStates',
+    'UartTraceRecorder',
+    'read_trace',
 ]
 
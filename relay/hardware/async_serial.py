@@ -0,0 +1,323 @@
+# -*- coding: utf-8 -*-
+"""
+Asyncio Serial Transport
+
+Awaitable relay commands on an event loop. The tty file descriptor of an
+open SerialCommunicator is registered with the loop, so several boards
+(and network I/O) are served from one thread without blocking reads:
+received bytes are decoded as they arrive and handed to the coroutine
+waiting for a response. Where the platform has no pollable descriptor
+for serial ports (Windows, or loops without add_reader), reads and
+writes fall back to the communicator's blocking calls in the loop's
+default executor.
+
+The synchronous SerialCommunicator API is unchanged; both share the
+port, the protocol builder, logging and the UART trace.
+"""
+
+import asyncio
+import os
+import time
+from collections import deque
+from typing import Deque, List, Optional, Sequence
+
+from relay.hardware.protocol import FrameDecoder, ErrorResponse, PortStates
+from relay.hardware.serial_comm import SerialCommunicator, Response
+
+
+class AsyncSerialTransport:
+    """
+    Asyncio transport over the port of a SerialCommunicator.
+    
+    send() and receive_frame() are the raw operations; transact() and the
+    command coroutines pair one command with its response and run one at
+    a time. Every wait honours a deadline (the communicator's deadline()
+    by default, learned with pacing) and can be cancelled; a cancelled or
+    timed-out wait leaves no state behind, and responses nobody waits for
+    are kept for the next receive_frame().
+    
+    While the transport is started the communicator's blocking read
+    methods must not be used, as both would consume the same bytes.
+    """
+    
+    # Responses kept while nobody is waiting
+    MAX_BUFFERED = 64
+    
+    def __init__(self, serial: SerialCommunicator):
+        """
+        Initialize asyncio transport.
+        
+        Args:
+            serial: Open serial communicator
+        """
+        self.serial = serial
+        self.logger = serial.logger
+        self.protocol = serial.protocol
+        
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._fd: Optional[int] = None
+        self._decoder = FrameDecoder()
+        self._responses: Deque[Response] = deque(maxlen=self.MAX_BUFFERED)
+        self._waiters: Deque[asyncio.Future] = deque()
+        self._lock: Optional[asyncio.Lock] = None
+        self._error: Optional[OSError] = None
+    
+    @property
+    def uses_fd(self) -> bool:
+        """Check if the port is polled by the event loop (no executor fallback)."""
+        return self._fd is not None
+    
+    async def start(self) -> 'AsyncSerialTransport':
+        """
+        Attach the transport to the running loop.
+        
+        Returns:
+            The transport itself
+        
+        Raises:
+            RuntimeError: If the port is not open
+        """
+        if not self.serial.is_open:
+            raise RuntimeError('Serial port is not open')
+        
+        self._loop = asyncio.get_running_loop()
+        self._lock = asyncio.Lock()
+        self._error = None
+        self._decoder.reset()
+        self._responses.clear()
+        
+        fd = self.serial.fileno()
+        if fd is not None:
+            try:
+                self._loop.add_reader(fd, self._on_readable)
+                self._fd = fd
+            except NotImplementedError:
+                pass
+        
+        if self._fd is None:
+            self.logger.debug('Serial port cannot be polled, using executor reads')
+        return self
+    
+    def stop(self) -> None:
+        """Detach from the loop and fail pending receives."""
+        if self._fd is not None:
+            self._loop.remove_reader(self._fd)
+            self._fd = None
+        self._fail_waiters(ConnectionError('Serial transport stopped'))
+    
+    async def send(self, frames: Sequence[bytes]) -> None:
+        """
+        Write frames to the port.
+        
+        Args:
+            frames: Frames to send, in order, written as one block
+        
+        Raises:
+            OSError: If the port failed
+        """
+        if self._error is not None:
+            raise self._error
+        
+        if self._fd is None:
+            await self._loop.run_in_executor(None, self.serial.send_frames, list(frames))
+            return
+        
+        data = memoryview(b''.join(frames))
+        while data:
+            try:
+                data = data[os.write(self._fd, data):]
+            except BlockingIOError:
+                await self._writable()
+        
+        self.serial.trace_sent(frames)
+    
+    async def receive_frame(self, timeout: Optional[float] = None) -> Optional[Response]:
+        """
+        Wait for the next response frame.
+        
+        Args:
+            timeout: Deadline in seconds (default: serial.deadline())
+        
+        Returns:
+            Ack, ErrorResponse or PortStates, or None if no frame arrived
+            in time
+        
+        Raises:
+            OSError: If the port failed
+            asyncio.CancelledError: If the wait was cancelled
+        """
+        if self._responses:
+            return self._responses.popleft()
+        if self._error is not None:
+            raise self._error
+        
+        timeout = self.serial.deadline(timeout)
+        
+        if self._fd is None:
+            return await self._loop.run_in_executor(None, self.serial.read_response, timeout)
+        
+        waiter = self._loop.create_future()
+        self._waiters.append(waiter)
+        try:
+            return await asyncio.wait_for(waiter, timeout)
+        except asyncio.TimeoutError:
+            if self._decoder.pending:
+                self.logger.warning(f'[RX] Incomplete frame ({self._decoder.pending} bytes)')
+            return None
+        finally:
+            if waiter in self._waiters:
+                self._waiters.remove(waiter)
+    
+    async def transact(self, frame: bytes, timeout: Optional[float] = None) -> Optional[Response]:
+        """
+        Send a command frame and wait for its response.
+        
+        Commands from concurrent coroutines run one at a time, paced
+        like SerialCommunicator.transact().
+        
+        Args:
+            frame: Command frame to send
+            timeout: Response deadline in seconds (default: serial.deadline())
+        
+        Returns:
+            Ack, ErrorResponse or PortStates, or None if the relay did not
+            answer in time
+        
+        Raises:
+            OSError: If the port failed
+        """
+        async with self._lock:
+            if self._error is not None:
+                raise self._error
+            if self._fd is None:
+                return await self._loop.run_in_executor(None, self.serial.transact, frame, timeout)
+            
+            pacing = self.serial.pacing
+            if pacing is not None:
+                await asyncio.sleep(pacing.gap_remaining())
+            
+            # Drop late replies to earlier commands
+            self._responses.clear()
+            self._decoder.reset()
+            
+            started = time.monotonic()
+            await self.send([frame])
+            response = await self.receive_frame(timeout)
+            
+            if pacing is not None:
+                if response is None:
+                    pacing.record_timeout()
+                else:
+                    pacing.record(time.monotonic() - started)
+        
+        if response is None:
+            self.logger.warning('[RX] No response from relay')
+        elif isinstance(response, ErrorResponse):
+            self.logger.warning(f'[RX] Relay reported error status {response.status}')
+        
+        return response
+    
+    async def usb_on(self, port_index: int) -> Optional[Response]:
+        """Turn USB power ON for a port (see SerialCommunicator.usb_on)."""
+        self.logger.info(f'Power ON relay port [{port_index}]')
+        return await self.transact(self.protocol.build_usb_on_by_index(port_index))
+    
+    async def usb_off(self, port_index: int) -> Optional[Response]:
+        """Turn USB power OFF for a port (see SerialCommunicator.usb_off)."""
+        self.logger.info(f'Power OFF relay port [{port_index}]')
+        return await self.transact(self.protocol.build_usb_off_by_index(port_index))
+    
+    async def usb_on_by_value(self, hub_value: int) -> Optional[Response]:
+        """Connect USB cable by hub value (see SerialCommunicator.usb_on_by_value)."""
+        self.logger.info(f'Connect USB cable [0x{hub_value:02x}]')
+        return await self.transact(self.protocol.build_usb_on_by_value(hub_value))
+    
+    async def usb_off_by_value(self, hub_value: int) -> Optional[Response]:
+        """Disconnect USB cable by hub value (see SerialCommunicator.usb_off_by_value)."""
+        self.logger.info(f'Disconnect USB cable [0x{hub_value:02x}]')
+        return await self.transact(self.protocol.build_usb_off_by_value(hub_value))
+    
+    async def set_port_state(self, port_index: int, hub_value: int) -> Optional[Response]:
+        """Bind a hub value to a port (see SerialCommunicator.set_port_state)."""
+        self.logger.info(f'Bind port [{port_index}] to hub ID [0x{hub_value:02x}]')
+        return await self.transact(self.protocol.build_set_port_state(port_index, hub_value))
+    
+    async def get_all_port_states(self) -> List[str]:
+        """Query states of all relay ports (see SerialCommunicator.get_all_port_states)."""
+        self.logger.info('Reading all relay port states')
+        response = await self.transact(self.protocol.build_get_port_states())
+        
+        if not isinstance(response, PortStates):
+            return []
+        return response.hex_states()
+    
+    def _on_readable(self) -> None:
+        """Read available bytes and dispatch the completed frames."""
+        try:
+            data = os.read(self._fd, 4096)
+        except BlockingIOError:
+            return
+        except OSError as e:
+            self._port_failed(e)
+            return
+        
+        if not data:
+            self._port_failed(OSError('Serial port closed'))
+            return
+        
+        corrupt = self._decoder.corrupt_frames
+        for response in self._decoder.decode(data):
+            self.serial.trace_received(response)
+            self._deliver(response)
+        
+        if self._decoder.corrupt_frames != corrupt:
+            self.logger.warning(f'[RX] Dropped {self._decoder.corrupt_frames - corrupt} '
+                                f'corrupt frame(s)')
+    
+    def _deliver(self, response: Response) -> None:
+        """Hand a response to the oldest waiter, or keep it."""
+        while self._waiters:
+            waiter = self._waiters.popleft()
+            if not waiter.done():
+                waiter.set_result(response)
+                return
+        self._responses.append(response)
+    
+    async def _writable(self) -> None:
+        """Wait until the port accepts more bytes."""
+        ready = self._loop.create_future()
+        self._loop.add_writer(self._fd, lambda: ready.done() or ready.set_result(None))
+        try:
+            await ready
+        finally:
+            self._loop.remove_writer(self._fd)
+    
+    def _port_failed(self, error: OSError) -> None:
+        """Stop polling a failed port and report the error to all callers."""
+        self.logger.error(f'Serial port failed: {error}')
+        self._error = error
+        if self._fd is not None:
+            self._loop.remove_reader(self._fd)
+            self._fd = None
+        self._fail_waiters(error)
+    
+    def _fail_waiters(self, error: Exception) -> None:
+        """Fail every pending receive."""
+        while self._waiters:
+            waiter = self._waiters.popleft()
+            if not waiter.done():
+                waiter.set_exception(error)
+    
+    async def __aenter__(self):
+        """Async context manager entry."""
+        return await self.start()
+    
+    async def __aexit__(self, exc_type, exc_val, exc_tb):
+        """Async context manager exit."""
+        self.stop()
+        return False
+    
+    def __repr__(self):
+        """String representation."""
+        mode = 'fd' if self.uses_fd else 'executor'
+        return f'AsyncSerialTransport(port={self.serial.port}, mode={mode})'
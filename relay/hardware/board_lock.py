@@ -0,0 +1,141 @@
+# -*- coding: utf-8 -*-
+"""
+Relay Board Lock
+
+Cross-process lock on a relay board, so that only one process (a relay
+server or an embedded engine) talks to a board at a time. The lock is an
+advisory lock on a small file named after the board's USB identity; the
+operating system drops it when the holding process exits, so a crash
+never leaves a board locked.
+"""
+
+import os
+import re
+import tempfile
+from typing import Optional
+
+try:
+    import fcntl
+except ImportError:
+    fcntl = None
+    import msvcrt
+
+
+class BoardLockError(RuntimeError):
+    """Raised when a relay board is locked by another process."""
+
+
+def board_lock_path(template: str, key: str) -> Optional[str]:
+    """
+    Get the lock file of a board.
+    
+    Args:
+        template: Lock file name with a '{board}' placeholder; relative
+            names are placed in the temporary directory
+        key: Board key (see pacing_key)
+    
+    Returns:
+        Lock file path, or None if locking is disabled (empty template)
+    """
+    if not template:
+        return None
+    
+    name = template.format(board=re.sub(r'[^A-Za-z0-9.@-]+', '_', key).strip('_'))
+    return os.path.join(tempfile.gettempdir(), name)
+
+
+class BoardLock:
+    """
+    Exclusive, non-blocking lock on one relay board.
+    
+    The lock file holds the process id of the holder, for the error
+    message of processes that find the board taken.
+    """
+    
+    def __init__(self, path: str):
+        """
+        Initialize board lock.
+        
+        Args:
+            path: Lock file path
+        """
+        self.path = path
+        self._fd: Optional[int] = None
+        self._pid: Optional[int] = None
+    
+    @property
+    def locked(self) -> bool:
+        """Check if this process holds the lock."""
+        return self._fd is not None and self._pid == os.getpid()
+    
+    def acquire(self) -> None:
+        """
+        Take the lock without waiting.
+        
+        Raises:
+            BoardLockError: If another process holds the lock
+            OSError: If the lock file cannot be opened
+        """
+        if self.locked:
+            return
+        
+        fd = os.open(self.path, os.O_RDWR | os.O_CREAT, 0o666)
+        try:
+            if fcntl is not None:
+                fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            else:
+                msvcrt.locking(fd, msvcrt.LK_NBLCK, 1)
+        except OSError:
+            holder = self._holder(fd)
+            os.close(fd)
+            raise BoardLockError(f'Relay board is in use by process {holder} ({self.path})') from None
+        
+        os.ftruncate(fd, 0)
+        os.write(fd, str(os.getpid()).encode())
+        self._fd = fd
+        self._pid = os.getpid()
+    
+    def release(self) -> None:
+        """Release the lock, if held."""
+        fd, self._fd = self._fd, None
+        if fd is None:
+            return
+        
+        if self._pid != os.getpid():
+            # Inherited by a forked child: the lock is the parent's to release
+            os.close(fd)
+            return
+        
+        try:
+            if fcntl is not None:
+                fcntl.flock(fd, fcntl.LOCK_UN)
+            else:
+                os.lseek(fd, 0, os.SEEK_SET)
+                msvcrt.locking(fd, msvcrt.LK_UNLCK, 1)
+        except OSError:
+            pass
+        finally:
+            os.close(fd)
+    
+    @staticmethod
+    def _holder(fd: int) -> str:
+        """Read the process id the holder wrote to the lock file."""
+        try:
+            os.lseek(fd, 0, os.SEEK_SET)
+            return os.read(fd, 32).decode().strip() or 'unknown'
+        except (OSError, UnicodeDecodeError):
+            return 'unknown'
+    
+    def __enter__(self):
+        """Context manager entry."""
+        self.acquire()
+        return self
+    
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        """Context manager exit."""
+        self.release()
+        return False
+    
+    def __repr__(self):
+        """String representation."""
+        return f'BoardLock(path={self.path}, locked={self.locked})'
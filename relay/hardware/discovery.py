@@ -0,0 +1,258 @@
+# -*- coding: utf-8 -*-
+"""
+Relay Board Discovery
+
+Finds the relay boards attached to the host and remembers them. Boards
+are identified by their USB adapter (VID, PID, serial number, location)
+rather than by port name or position in the port list, so board numbers
+stay the same across reboots. The boards found are written to a cache
+file; on the next start the cached ports are opened directly, and the
+full port scan only runs when a cached entry has gone stale or the USB
+serial devices of the host have changed.
+"""
+
+import glob
+import json
+import logging
+import os
+import sys
+from typing import Callable, List, Optional, Tuple
+
+from serial.tools.list_ports import comports
+
+from relay.hardware.serial_comm import SerialCommunicator, PortIdentity
+from relay.hardware.board_lock import BoardLockError
+
+try:
+    from serial.tools.list_ports_linux import SysFS
+except ImportError:
+    SysFS = None
+
+
+BoardEntry = Tuple[str, Optional[PortIdentity]]
+
+# Device nodes of USB serial adapters, listed without probing each port
+if sys.platform.startswith('linux'):
+    USB_SERIAL_PATTERNS = ('/dev/ttyUSB*', '/dev/ttyACM*', '/dev/ttyXRUSB*')
+elif sys.platform == 'darwin':
+    USB_SERIAL_PATTERNS = ('/dev/cu.usb*',)
+else:
+    USB_SERIAL_PATTERNS = ()
+
+
+def identity_key(entry: BoardEntry) -> tuple:
+    """Sort key giving boards a stable order independent of port names."""
+    port, identity = entry
+    if identity is None:
+        return (1, '', '', port)
+    return (0, identity.serial_number or '', identity.location or '', port)
+
+
+class BoardDiscovery:
+    """
+    Relay board discovery with a cache of known boards.
+    
+    A cached board is stale if its port cannot be opened or, where the
+    platform can describe a single port cheaply (Linux sysfs), if another
+    adapter now sits on that port. The cache as a whole is stale when the
+    USB serial device nodes differ from those present when it was written,
+    so a board plugged in since then is found. A stale cache triggers one
+    full scan.
+    
+    Windows has no cheap device listing: there, a board added while every
+    cached board is still present is only found by a forced rescan
+    (``open_boards(open_port, rescan=True)``) or after deleting the cache
+    file.
+    """
+    
+    def __init__(
+        self,
+        cache_file: Optional[str] = None,
+        identifier: str = 'Serial',
+        logger: Optional[logging.Logger] = None
+    ):
+        """
+        Initialize board discovery.
+        
+        Args:
+            cache_file: JSON file of known boards (default: no cache)
+            identifier: Port description identifier of relay adapters
+            logger: Logger for discovery events
+        """
+        self.cache_file = cache_file
+        self.identifier = identifier
+        self.logger = logger or logging.getLogger('relay.discovery')
+    
+    def scan(self) -> List[BoardEntry]:
+        """
+        Scan all serial ports for relay adapters.
+        
+        Returns:
+            (port, identity) of every matching adapter, in stable order
+        """
+        boards = []
+        for info in comports():
+            if self.identifier not in info.description:
+                continue
+            identity = None
+            if info.vid is not None:
+                identity = PortIdentity(info.vid, info.pid, info.serial_number, info.location)
+            boards.append((info.device, identity))
+        
+        return sorted(boards, key=identity_key)
+    
+    @staticmethod
+    def usb_devices() -> Optional[List[str]]:
+        """
+        List the USB serial device nodes of the host.
+        
+        Returns:
+            Sorted device paths, or None where the platform has no cheap
+            listing (Windows)
+        """
+        if not USB_SERIAL_PATTERNS:
+            return None
+        return sorted(path for pattern in USB_SERIAL_PATTERNS for path in glob.glob(pattern))
+    
+    def load_cache(self) -> Tuple[List[BoardEntry], Optional[List[str]]]:
+        """
+        Read the known boards from the cache file.
+        
+        Returns:
+            Cached (port, identity) entries, empty if there is no cache,
+            and the USB serial devices present when it was written
+        """
+        if not self.cache_file or not os.path.exists(self.cache_file):
+            return [], None
+        
+        try:
+            with open(self.cache_file, 'r') as f:
+                cache = json.load(f)
+            boards = [
+                (entry['port'],
+                 PortIdentity(**entry['identity']) if entry.get('identity') else None)
+                for entry in cache['boards']
+            ]
+            return boards, cache.get('devices')
+        except (OSError, ValueError, KeyError, TypeError) as e:
+            self.logger.warning(f'Ignoring board cache {self.cache_file}: {e}')
+            return [], None
+    
+    def save_cache(self, boards: List[BoardEntry]) -> None:
+        """
+        Write the known boards and the current USB serial devices to the
+        cache file.
+        
+        Args:
+            boards: (port, identity) entries in board order
+        """
+        if not self.cache_file:
+            return
+        
+        cache = {
+            'devices': self.usb_devices(),
+            'boards': [
+                {'port': port, 'identity': identity._asdict() if identity else None}
+                for port, identity in boards
+            ],
+        }
+        try:
+            os.makedirs(os.path.dirname(os.path.abspath(self.cache_file)), exist_ok=True)
+            with open(self.cache_file, 'w') as f:
+                json.dump(cache, f, indent=2)
+        except OSError as e:
+            self.logger.warning(f'Failed to write board cache {self.cache_file}: {e}')
+    
+    def open_boards(
+        self,
+        open_port: Callable[[str, Optional[PortIdentity]], SerialCommunicator],
+        rescan: bool = False
+    ) -> List[SerialCommunicator]:
+        """
+        Open every relay board, from the cache if it is still valid.
+        
+        Boards keep their cached order, also when a rescan finds them on
+        another port; new boards follow in stable identity order.
+        
+        Args:
+            open_port: Opens a port given its identity; raises if the port
+                cannot be opened
+            rescan: Scan all serial ports even if the cache is valid
+        
+        Returns:
+            Opened serial communicators, in board order
+        
+        Raises:
+            BoardLockError: If open_port finds a board in use by another
+                process; the boards opened so far are closed and the
+                cache is left as it is
+        """
+        cached, cached_devices = self.load_cache()
+        opened: List[Tuple[BoardEntry, SerialCommunicator]] = []
+        stale = rescan or not cached
+        
+        devices = self.usb_devices()
+        if cached and devices is not None and devices != cached_devices:
+            self.logger.info('USB serial devices changed since the board cache was written')
+            stale = True
+        
+        for port, identity in cached:
+            if not self._matches(port, identity):
+                self.logger.info(f'Cached relay board on {port} is gone')
+                stale = True
+                continue
+            try:
+                opened.append(((port, identity), open_port(port, identity)))
+            except BoardLockError:
+                self._close(opened)
+                raise
+            except Exception as e:
+                self.logger.info(f'Cached relay board on {port} cannot be opened: {e}')
+                stale = True
+        
+        if stale:
+            if cached:
+                self.logger.info('Board cache is stale, scanning serial ports')
+            
+            open_ports = {entry[0] for entry, _ in opened}
+            known = [entry[1] for entry, _ in opened if entry[1] is not None]
+            for port, identity in self.scan():
+                if port in open_ports or (identity is not None and identity in known):
+                    continue
+                try:
+                    opened.append(((port, identity), open_port(port, identity)))
+                except BoardLockError:
+                    self._close(opened)
+                    raise
+                except Exception as e:
+                    self.logger.error(f'Failed to open relay board on {port}: {e}')
+            
+            cached_ids = [identity for _, identity in cached if identity is not None]
+            
+            def board_order(item):
+                port, identity = item[0]
+                if identity in cached_ids:
+                    return (0, cached_ids.index(identity), ())
+                return (1, 0, identity_key((port, identity)))
+            
+            opened.sort(key=board_order)
+            self.save_cache([entry for entry, _ in opened])
+        
+        return [communicator for _, communicator in opened]
+    
+    @staticmethod
+    def _close(opened: List[Tuple[BoardEntry, SerialCommunicator]]) -> None:
+        """Close the boards opened before discovery was aborted."""
+        for _, communicator in opened:
+            communicator.close()
+    
+    @staticmethod
+    def _matches(port: str, identity: Optional[PortIdentity]) -> bool:
+        """Check a cached entry without a full scan, where the platform allows it."""
+        if identity is None or SysFS is None or not sys.platform.startswith('linux'):
+            return True
+        
+        info = SysFS(port)
+        if info.vid is None:
+            return os.path.exists(port)
+        return (info.vid, info.pid, info.serial_number) == identity[:3]
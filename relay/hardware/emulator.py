@@ -0,0 +1,322 @@
+# -*- coding: utf-8 -*-
+"""
+Virtual Relay Board
+
+Emulates a USB relay board behind a Linux pseudo-terminal, so the real
+SerialCommunicator (and everything above it) can be run and benchmarked
+without hardware. The emulator speaks the protocol of
+ProtocolFrameBuilder:
+
+    on/off by port index    -> Ack (param: port), error if no such port
+    on/off by hub value     -> Ack (param: value), error if value unbound
+    on/off by port mask     -> Ack (param: low mask byte), error if no
+                               such port; only with mask_frames, else
+                               rejected like unknown firmware would
+    set port state (bind)   -> Ack (param: port), error if no such port
+    get port states         -> PortStates with the hub value bound to
+                               each port
+
+Replies can be delayed by a fixed processing latency and by the time the
+command and response take on the wire at the configured baud rate.
+
+Usage:
+    python -m relay.hardware.emulator --boards 2 --ports 5 --latency 0.005
+"""
+
+import argparse
+import logging
+import os
+import select
+import threading
+import time
+from typing import Dict, List, Optional
+
+from relay.hardware.protocol import ProtocolFrameBuilder
+
+try:
+    import tty
+except ImportError:
+    # Windows has no pseudo-terminals
+    tty = None
+
+
+# Bits on the wire per byte (start + 8 data + stop)
+BITS_PER_BYTE = 10
+
+ERROR_NO_PORT = 1
+ERROR_UNBOUND_VALUE = 2
+ERROR_UNKNOWN_COMMAND = 3
+
+_SET_STATE = 32
+_VALUE_FRAME_LENGTH = 8
+
+
+class VirtualRelayBoard:
+    """
+    Relay board emulated on a pseudo-terminal.
+    
+    Open ``board.port`` with SerialCommunicator like a real board. The
+    emulator tracks the power state of every port and the hub value bound
+    to it, and counts the commands it has answered.
+    """
+    
+    def __init__(
+        self,
+        ports: int = 5,
+        latency: float = 0.0,
+        baudrate: Optional[int] = 9600,
+        mask_frames: bool = False,
+        logger: Optional[logging.Logger] = None
+    ):
+        """
+        Initialize virtual relay board.
+        
+        Args:
+            ports: Number of relay ports
+            latency: Processing time per command in seconds
+            baudrate: Baud rate to pace replies at (None: no pacing)
+            mask_frames: Accept multi-port mask frames
+            logger: Logger for emulator events
+        """
+        self.ports = ports
+        self.latency = latency
+        self.baudrate = baudrate
+        self.mask_frames = mask_frames
+        self.logger = logger or logging.getLogger('relay.emulator')
+        
+        self.powered: Dict[int, bool] = {port: False for port in range(1, ports + 1)}
+        self.bindings: Dict[int, int] = {port: 0 for port in range(1, ports + 1)}
+        self.commands = 0
+        self.errors = 0
+        
+        self._master: Optional[int] = None
+        self._slave: Optional[int] = None
+        self._thread: Optional[threading.Thread] = None
+        self._running = False
+        self._lock = threading.Lock()
+        self.port: Optional[str] = None
+    
+    def start(self) -> 'VirtualRelayBoard':
+        """
+        Open the pseudo-terminal and start answering commands.
+        
+        Returns:
+            The board itself
+        
+        Raises:
+            RuntimeError: If the platform has no pseudo-terminals
+        """
+        if tty is None:
+            raise RuntimeError('Virtual relay boards need a POSIX pseudo-terminal')
+        
+        self._master, self._slave = os.openpty()
+        tty.setraw(self._slave)
+        self.port = os.ttyname(self._slave)
+        
+        self._running = True
+        self._thread = threading.Thread(
+            target=self._serve,
+            name=f'relay-emulator-{self.port}',
+            daemon=True
+        )
+        self._thread.start()
+        
+        self.logger.info(f'Virtual relay board with {self.ports} ports on {self.port}')
+        return self
+    
+    def stop(self) -> None:
+        """Stop answering and close the pseudo-terminal."""
+        self._running = False
+        if self._thread:
+            self._thread.join(1.0)
+            self._thread = None
+        
+        for fd in (self._master, self._slave):
+            if fd is not None:
+                try:
+                    os.close(fd)
+                except OSError:
+                    pass
+        self._master = self._slave = None
+    
+    def handle_frame(self, frame: bytes) -> bytes:
+        """
+        Apply a command frame and build the board's reply.
+        
+        Args:
+            frame: Complete, checksummed command frame
+        
+        Returns:
+            Response frame
+        """
+        P = ProtocolFrameBuilder
+        
+        with self._lock:
+            self.commands += 1
+            
+            if frame == P().build_get_port_states():
+                return self._response(0, [self.bindings[port] for port in sorted(self.bindings)])
+            
+            if len(frame) == P.FRAME_LENGTH and frame[3] == P.CMD_ALL:
+                port = frame[2]
+                if port not in self.powered:
+                    return self._error(port, ERROR_NO_PORT)
+                self.powered[port] = frame[4] == P.CMD_ON
+                return self._response(port, [P.FRAME_SUCCESS])
+            
+            if len(frame) == P.FRAME_LENGTH and frame[2] == _SET_STATE:
+                port, value = frame[3], frame[4]
+                if port not in self.bindings:
+                    return self._error(port, ERROR_NO_PORT)
+                self.bindings[port] = value
+                return self._response(port, [P.FRAME_SUCCESS])
+            
+            if self.mask_frames and len(frame) == P.MASK_FRAME_LENGTH and frame[2] == P.CMD_MASK:
+                port_mask = frame[3] | frame[4] << 8
+                ports = [port for port in range(1, P.MAX_MASK_PORTS + 1) if port_mask >> (port - 1) & 1]
+                missing = [port for port in ports if port not in self.powered]
+                if not ports or missing:
+                    return self._error(missing[0] if missing else 0, ERROR_NO_PORT)
+                for port in ports:
+                    self.powered[port] = frame[5] == P.CMD_ON
+                return self._response(frame[3], [P.FRAME_SUCCESS])
+            
+            if len(frame) == _VALUE_FRAME_LENGTH and frame[2] == P.CMD_CONTROL:
+                value = frame[3]
+                ports = [port for port, bound in self.bindings.items() if bound == value]
+                if not value or not ports:
+                    return self._error(value, ERROR_UNBOUND_VALUE)
+                for port in ports:
+                    self.powered[port] = frame[5] == P.CMD_ON
+                return self._response(value, [P.FRAME_SUCCESS])
+            
+            return self._error(0, ERROR_UNKNOWN_COMMAND)
+    
+    def _error(self, param: int, status: int) -> bytes:
+        """Build an error response."""
+        self.errors += 1
+        return self._response(param, [status])
+    
+    @staticmethod
+    def _response(param: int, payload: List[int]) -> bytes:
+        """Build a response frame around a payload."""
+        P = ProtocolFrameBuilder
+        body = [P.FRAME_HEAD, P.FRAME_RESPONSE, len(payload) + 6, param] + payload
+        return bytes(body + [P.calculate_xor(body), P.FRAME_END])
+    
+    def _serve(self) -> None:
+        """Read command frames from the terminal and answer them."""
+        buffer = bytearray()
+        
+        while self._running:
+            ready, _, _ = select.select([self._master], [], [], 0.1)
+            if not ready:
+                continue
+            try:
+                buffer += os.read(self._master, 256)
+            except OSError:
+                break
+            
+            for frame in self._split_frames(buffer):
+                reply = self.handle_frame(frame)
+                
+                delay = self.latency
+                if self.baudrate:
+                    delay += (len(frame) + len(reply)) * BITS_PER_BYTE / self.baudrate
+                if delay > 0:
+                    time.sleep(delay)
+                
+                try:
+                    os.write(self._master, reply)
+                except OSError:
+                    return
+    
+    @staticmethod
+    def _split_frames(buffer: bytearray) -> List[bytes]:
+        """Remove and return the complete command frames in the buffer."""
+        P = ProtocolFrameBuilder
+        frames = []
+        
+        while True:
+            head = buffer.find(P.FRAME_HEAD)
+            if head < 0:
+                del buffer[:]
+                return frames
+            del buffer[:head]
+            
+            if len(buffer) < 2:
+                return frames
+            length = buffer[1]
+            if length not in (P.FRAME_LENGTH, _VALUE_FRAME_LENGTH):
+                del buffer[:1]
+                continue
+            if len(buffer) < length:
+                return frames
+            
+            frame = bytes(buffer[:length])
+            if frame[-1] == P.FRAME_END and P.calculate_xor(frame[:-2]) == frame[-2]:
+                frames.append(frame)
+                del buffer[:length]
+            else:
+                del buffer[:1]
+    
+    def __enter__(self):
+        """Context manager entry."""
+        return self.start()
+    
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        """Context manager exit."""
+        self.stop()
+        return False
+    
+    def __repr__(self):
+        """String representation."""
+        return f'VirtualRelayBoard(port={self.port}, ports={self.ports}, commands={self.commands})'
+
+
+def start_virtual_boards(count: int, **kwargs) -> List[VirtualRelayBoard]:
+    """
+    Start several virtual relay boards.
+    
+    Args:
+        count: Number of boards
+        **kwargs: VirtualRelayBoard arguments
+    
+    Returns:
+        Started boards, in board order
+    """
+    return [VirtualRelayBoard(**kwargs).start() for _ in range(count)]
+
+
+def main():
+    """Main entry point."""
+    parser = argparse.ArgumentParser(description='Virtual relay boards on pseudo-terminals')
+    parser.add_argument('--boards', type=int, default=1, help='Number of boards')
+    parser.add_argument('--ports', type=int, default=5, help='Relay ports per board')
+    parser.add_argument('--latency', type=float, default=0.0, help='Processing time per command (s)')
+    parser.add_argument('--baudrate', type=int, default=9600, help='Baud rate to pace replies at (0: off)')
+    parser.add_argument('--mask-frames', action='store_true', help='Accept multi-port mask frames')
+    args = parser.parse_args()
+    
+    boards = start_virtual_boards(
+        args.boards,
+        ports=args.ports,
+        latency=args.latency,
+        baudrate=args.baudrate or None,
+        mask_frames=args.mask_frames
+    )
+    for board_id, board in enumerate(boards):
+        print(f'board {board_id}: {board.port}')
+    
+    try:
+        while True:
+            time.sleep(1.0)
+    except KeyboardInterrupt:
+        pass
+    finally:
+        for board in boards:
+            board.stop()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,208 @@
+# -*- coding: utf-8 -*-
+"""
+Serial Link Supervisor
+
+Watches the serial link of one relay board and brings it back after the
+USB-serial adapter drops: the adapter is found again by its USB identity
+(it may come back under another port name) and reopened with
+exponential backoff. Recovery times are recorded.
+"""
+
+import logging
+import threading
+import time
+from typing import Any, Callable, Dict, Optional
+
+from relay.hardware.serial_comm import SerialCommunicator
+
+
+class SerialLinkSupervisor:
+    """
+    Reconnects a SerialCommunicator whose adapter has gone away.
+    
+    The serial worker reports I/O failures with link_lost(); a background
+    thread then closes the port and retries opening the same adapter,
+    waiting ``initial_backoff`` seconds after the first failed attempt and
+    doubling up to ``max_backoff``. Workers wait for the link with
+    wait_until_up().
+    """
+    
+    def __init__(
+        self,
+        serial: SerialCommunicator,
+        initial_backoff: float = 0.5,
+        max_backoff: float = 30.0,
+        on_recover: Optional[Callable[[], Any]] = None,
+        logger: Optional[logging.Logger] = None
+    ):
+        """
+        Initialize link supervisor.
+        
+        Args:
+            serial: Serial communicator to supervise
+            initial_backoff: Seconds between the first reopen attempts
+            max_backoff: Maximum seconds between reopen attempts
+            on_recover: Called after the link has been reopened
+            logger: Logger for link events
+        """
+        self.serial = serial
+        self.initial_backoff = initial_backoff
+        self.max_backoff = max_backoff
+        self.on_recover = on_recover
+        self.logger = logger or logging.getLogger('relay.link')
+        
+        self._up = threading.Event()
+        self._stop = threading.Event()
+        self._lock = threading.Lock()
+        self._changed = threading.Condition(self._lock)
+        self._thread: Optional[threading.Thread] = None
+        self._lost_at: Optional[float] = None
+        
+        self.disconnects = 0
+        self.reopen_attempts = 0
+        self.last_recovery_time: Optional[float] = None
+        self.max_recovery_time = 0.0
+        self.total_recovery_time = 0.0
+        self.recoveries = 0
+        
+        if serial.is_open:
+            self._up.set()
+    
+    @property
+    def is_up(self) -> bool:
+        """Check if the link is usable."""
+        return self._up.is_set()
+    
+    @property
+    def down_for(self) -> float:
+        """Seconds since the link was lost (0 while it is up)."""
+        lost_at = self._lost_at
+        return 0.0 if lost_at is None else time.monotonic() - lost_at
+    
+    def link_lost(self, error: Optional[BaseException] = None) -> None:
+        """
+        Report that the link failed and start reconnecting.
+        
+        Args:
+            error: I/O error that revealed the failure
+        """
+        with self._lock:
+            if self._stop.is_set():
+                return
+            if self._up.is_set():
+                self._up.clear()
+                self._lost_at = time.monotonic()
+                self.disconnects += 1
+                self.logger.error(f'Serial link lost on {self.serial.port}: {error}')
+                self.serial.close()
+            elif self._lost_at is None:
+                self._lost_at = time.monotonic()
+            
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(
+                    target=self._reconnect_loop,
+                    name=f'relay-link-{self.serial.port}',
+                    daemon=True
+                )
+                self._thread.start()
+    
+    def wait_until_up(self, timeout: Optional[float] = None) -> bool:
+        """
+        Wait for the link to be usable.
+        
+        Args:
+            timeout: Maximum seconds to wait (default: forever)
+        
+        Returns:
+            True if the link is up
+        """
+        if self._up.is_set():
+            return True
+        if timeout is not None and timeout <= 0:
+            return False
+        
+        with self._changed:
+            self._changed.wait_for(lambda: self._up.is_set() or self._stop.is_set(), timeout)
+        return self._up.is_set()
+    
+    def start(self) -> None:
+        """Allow reconnecting again after stop()."""
+        self._stop.clear()
+    
+    def stop(self) -> None:
+        """Stop reconnecting and wake up waiting workers."""
+        self._stop.set()
+        with self._changed:
+            self._changed.notify_all()
+            thread, self._thread = self._thread, None
+        if thread and thread is not threading.current_thread():
+            thread.join(1.0)
+    
+    def _reconnect_loop(self) -> None:
+        """Reopen the adapter with exponential backoff until it is back."""
+        backoff = self.initial_backoff
+        
+        while not self._stop.is_set():
+            self.reopen_attempts += 1
+            if self._reopen():
+                recovery_time = self.down_for
+                with self._lock:
+                    self._lost_at = None
+                    self.last_recovery_time = recovery_time
+                    self.max_recovery_time = max(self.max_recovery_time, recovery_time)
+                    self.total_recovery_time += recovery_time
+                    self.recoveries += 1
+                    self._up.set()
+                    self._changed.notify_all()
+                
+                self.logger.info(f'Serial link recovered on {self.serial.port} '
+                                 f'after {recovery_time:.2f}s')
+                if self.on_recover:
+                    self.on_recover()
+                return
+            
+            self._stop.wait(backoff)
+            backoff = min(backoff * 2, self.max_backoff)
+    
+    def _reopen(self) -> bool:
+        """Find the adapter and open it; returns True on success."""
+        identity = self.serial.identity
+        port = self.serial.port
+        
+        if identity is not None:
+            port = SerialCommunicator.find_port_by_identity(identity)
+            if port is None:
+                self.logger.debug('Relay adapter not connected yet')
+                return False
+        
+        try:
+            self.serial.open(port, identity)
+            return True
+        except Exception as e:
+            self.logger.debug(f'Reopen of {port} failed: {e}')
+            return False
+    
+    def stats(self) -> Dict[str, Any]:
+        """
+        Get link statistics.
+        
+        Returns:
+            Link state, disconnect and recovery counts, and recovery
+            times in seconds
+        """
+        return {
+            'up': self.is_up,
+            'port': self.serial.port,
+            'down_for': self.down_for,
+            'disconnects': self.disconnects,
+            'reopen_attempts': self.reopen_attempts,
+            'recoveries': self.recoveries,
+            'last_recovery_time': self.last_recovery_time,
+            'max_recovery_time': self.max_recovery_time,
+            'avg_recovery_time': (self.total_recovery_time / self.recoveries
+                                  if self.recoveries else None),
+        }
+    
+    def __repr__(self):
+        """String representation."""
+        return f'SerialLinkSupervisor(port={self.serial.port}, up={self.is_up})'
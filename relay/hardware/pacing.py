@@ -0,0 +1,295 @@
+# -*- coding: utf-8 -*-
+"""
+Adaptive Command Pacing
+
+Learns how fast a relay board answers and paces its commands
+accordingly. Every answered command adds its command-to-response
+latency to a rolling window; a high percentile of the window, with
+headroom, becomes the response deadline, and a fraction of the median
+becomes the minimum idle gap before the next command. Both are kept
+between a floor and a cap. A command that goes unanswered counts as a
+sample at its deadline, so a deadline that proves too tight grows back.
+
+The learned samples are stored per board in a JSON file, so a restarted
+server starts from what it knew instead of the worst case.
+"""
+
+import json
+import logging
+import math
+import os
+import threading
+import time
+from collections import deque
+from typing import Any, Dict, List, Optional
+
+
+_save_lock = threading.Lock()
+
+
+def pacing_key(port: Optional[str], identity=None) -> str:
+    """
+    Name a board in the pacing file.
+    
+    Args:
+        port: Port name
+        identity: PortIdentity of the adapter, if known
+    
+    Returns:
+        USB identity ('vid:pid:serial' or 'vid:pid@location'), else the
+        port name
+    """
+    if identity is None:
+        return port or ''
+    if identity.serial_number:
+        return f'{identity.vid:04x}:{identity.pid:04x}:{identity.serial_number}'
+    return f'{identity.vid:04x}:{identity.pid:04x}@{identity.location}'
+
+
+def load_pacing(path: Optional[str]) -> Dict[str, List[float]]:
+    """
+    Read learned latency samples.
+    
+    Args:
+        path: Pacing file (None or missing: nothing learned)
+    
+    Returns:
+        Dictionary of board key to latency samples in seconds
+    """
+    if not path or not os.path.exists(path):
+        return {}
+    
+    try:
+        with open(path, 'r') as f:
+            boards = json.load(f)
+        return {
+            str(key): [float(sample) for sample in samples]
+            for key, samples in boards.items()
+        }
+    except (OSError, ValueError, TypeError, AttributeError) as e:
+        logging.getLogger('relay.pacing').warning(f'Ignoring pacing file {path}: {e}')
+        return {}
+
+
+def save_pacing(path: Optional[str], boards: Dict[str, List[float]]) -> None:
+    """
+    Write learned latency samples, keeping other boards' entries.
+    
+    Args:
+        path: Pacing file (None: do not persist)
+        boards: Dictionary of board key to latency samples in seconds
+    """
+    boards = {key: samples for key, samples in boards.items() if samples}
+    if not path or not boards:
+        return
+    
+    with _save_lock:
+        merged = load_pacing(path)
+        merged.update(boards)
+        
+        # Write a temporary file and swap it in, so readers never see a partial file
+        temporary = f'{path}.tmp'
+        try:
+            os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+            with open(temporary, 'w') as f:
+                json.dump({key: [round(sample, 6) for sample in samples]
+                           for key, samples in merged.items()}, f, indent=2)
+            os.replace(temporary, path)
+        except OSError as e:
+            logging.getLogger('relay.pacing').warning(f'Failed to write pacing file {path}: {e}')
+
+
+class CommandPacing:
+    """
+    Response deadline and command gap learned from a board's latency.
+    
+    Until ``min_samples`` commands have been measured the cap values are
+    used. Fixed values given as ``response_timeout`` or ``min_gap``
+    override the learned ones.
+    """
+    
+    def __init__(
+        self,
+        timeout_floor: float = 0.05,
+        timeout_cap: float = 1.0,
+        timeout_percentile: float = 99.0,
+        timeout_factor: float = 2.0,
+        gap_floor: float = 0.0,
+        gap_cap: float = 0.1,
+        gap_factor: float = 0.1,
+        window: int = 200,
+        min_samples: int = 20,
+        response_timeout: Optional[float] = None,
+        min_gap: Optional[float] = None
+    ):
+        """
+        Initialize command pacing.
+        
+        Args:
+            timeout_floor: Shortest response deadline in seconds
+            timeout_cap: Longest response deadline in seconds
+            timeout_percentile: Latency percentile the deadline is based on
+            timeout_factor: Headroom multiplier on that percentile
+            gap_floor: Shortest gap between commands in seconds
+            gap_cap: Longest gap between commands in seconds
+            gap_factor: Gap as a fraction of the median latency
+            window: Number of recent latencies kept
+            min_samples: Latencies needed before adapting
+            response_timeout: Fixed response deadline (default: learned)
+            min_gap: Fixed gap between commands (default: learned)
+        """
+        self.timeout_floor = timeout_floor
+        self.timeout_cap = max(timeout_cap, timeout_floor)
+        self.timeout_percentile = timeout_percentile
+        self.timeout_factor = timeout_factor
+        self.gap_floor = gap_floor
+        self.gap_cap = max(gap_cap, gap_floor)
+        self.gap_factor = gap_factor
+        self.min_samples = min_samples
+        self.fixed_timeout = response_timeout
+        self.fixed_gap = min_gap
+        
+        self._lock = threading.Lock()
+        self._samples: deque = deque(maxlen=max(window, 1))
+        self._last_done = 0.0
+        self.response_timeout = self.timeout_cap if response_timeout is None else response_timeout
+        self.min_gap = self.gap_cap if min_gap is None else min_gap
+        
+        self.answered = 0
+        self.timeouts = 0
+    
+    @classmethod
+    def from_config(cls, serial_config) -> 'CommandPacing':
+        """
+        Create pacing from a SerialConfig.
+        
+        Args:
+            serial_config: SerialConfig with the floor, cap and overrides
+        
+        Returns:
+            CommandPacing instance
+        """
+        return cls(
+            timeout_floor=serial_config.timeout_floor,
+            timeout_cap=serial_config.timeout_cap,
+            timeout_percentile=serial_config.timeout_percentile,
+            timeout_factor=serial_config.timeout_factor,
+            gap_floor=serial_config.gap_floor,
+            gap_cap=serial_config.gap_cap,
+            gap_factor=serial_config.gap_factor,
+            window=serial_config.pacing_window,
+            min_samples=serial_config.pacing_min_samples,
+            response_timeout=serial_config.response_timeout,
+            min_gap=serial_config.min_gap
+        )
+    
+    @property
+    def learned(self) -> bool:
+        """Check if enough latencies have been measured to adapt."""
+        return len(self._samples) >= self.min_samples
+    
+    def wait_for_gap(self) -> None:
+        """Sleep until the minimum gap after the last command has passed."""
+        remaining = self.gap_remaining()
+        if remaining > 0:
+            time.sleep(remaining)
+    
+    def gap_remaining(self) -> float:
+        """
+        Time left before the next command may be sent.
+        
+        Returns:
+            Seconds to wait (0 if the gap has passed)
+        """
+        return max(self._last_done + self.min_gap - time.monotonic(), 0.0)
+    
+    def record(self, latency: float) -> None:
+        """
+        Record an answered command.
+        
+        Args:
+            latency: Seconds from sending the command to its response
+        """
+        with self._lock:
+            self.answered += 1
+            self._samples.append(latency)
+            self._last_done = time.monotonic()
+            self._update()
+    
+    def record_timeout(self) -> None:
+        """Record a command that was not answered within the deadline."""
+        with self._lock:
+            self.timeouts += 1
+            # Censored sample: the real latency was at least the deadline
+            self._samples.append(self.response_timeout)
+            self._last_done = time.monotonic()
+            self._update()
+    
+    def samples(self) -> List[float]:
+        """
+        Get the latencies in the window, oldest first.
+        
+        Returns:
+            Latencies in seconds
+        """
+        with self._lock:
+            return list(self._samples)
+    
+    def load(self, samples: List[float]) -> None:
+        """
+        Start from previously learned latencies.
+        
+        Args:
+            samples: Latencies in seconds, oldest first
+        """
+        with self._lock:
+            self._samples.extend(samples)
+            self._update()
+    
+    def _update(self) -> None:
+        """Recompute deadline and gap from the window (lock held)."""
+        if len(self._samples) < self.min_samples:
+            return
+        
+        ordered = sorted(self._samples)
+        
+        if self.fixed_timeout is None:
+            timeout = _percentile(ordered, self.timeout_percentile) * self.timeout_factor
+            self.response_timeout = min(max(timeout, self.timeout_floor), self.timeout_cap)
+        
+        if self.fixed_gap is None:
+            gap = _percentile(ordered, 50.0) * self.gap_factor
+            self.min_gap = min(max(gap, self.gap_floor), self.gap_cap)
+    
+    def stats(self) -> Dict[str, Any]:
+        """
+        Get pacing statistics.
+        
+        Returns:
+            Current deadline and gap, latency percentiles of the window
+            and answered/timed-out command counts
+        """
+        with self._lock:
+            ordered = sorted(self._samples)
+        
+        return {
+            'learned': len(ordered) >= self.min_samples,
+            'response_timeout': self.response_timeout,
+            'min_gap': self.min_gap,
+            'samples': len(ordered),
+            'p50': _percentile(ordered, 50.0) if ordered else None,
+            'p99': _percentile(ordered, 99.0) if ordered else None,
+            'answered': self.answered,
+            'timeouts': self.timeouts,
+        }
+    
+    def __repr__(self):
+        """String representation."""
+        return (f'CommandPacing(response_timeout={self.response_timeout:.3f}, '
+                f'min_gap={self.min_gap:.3f}, samples={len(self._samples)})')
+
+
+def _percentile(values: List[float], percent: float) -> float:
+    """Nearest-rank percentile of sorted values."""
+    rank = max(int(math.ceil(percent / 100.0 * len(values))), 1)
+    return values[rank - 1]
@@ -2,9 +2,14 @@
 """
 Relay Protocol Frame Builder
 
-Defines the communication protocol for USB relay boards.
+Defines the communication protocol for USB relay boards: command frame
+building and incremental decoding of response frames into typed
+responses.
 """
 
+from collections import namedtuple
+from operator import xor
+
 try:
     # Python 3
     from functools import reduce
@@ -21,6 +26,17 @@ class ProtocolFrameBuilder:
     USB relay hardware over serial connection.
     
     Frame Format: [HEAD][LEN][INDEX][MODE][STATE][XOR][END]
+    
+    Response Format: [HEAD][RESPONSE][LEN][PARAM][DATA...][XOR][END],
+    where LEN is the length of the whole frame.
+    
+    Mask Format: [HEAD][LEN][CMD_MASK][MASK_LO][MASK_HI][STATE][XOR][END]
+    switches every port set in a 16-bit port mask (bit n-1 is port n)
+    at once. Only boards whose firmware implements it accept this frame.
+    
+    Frames are immutable ``bytes``. Every on/off frame, by port index or
+    by hub value, is built once into a lookup table when the module is
+    imported; builders return the shared table entries.
     """
     
     # Protocol Constants
@@ -29,17 +45,60 @@ class ProtocolFrameBuilder:
     FRAME_END = 85
     FRAME_RESPONSE = 255
     FRAME_SUCCESS = 0
+    RESPONSE_HEADER_SIZE = 3
+    MIN_RESPONSE_LENGTH = 6
+    MAX_RESPONSE_LENGTH = 64
+    MASK_FRAME_LENGTH = 8
+    MAX_MASK_PORTS = 16
     
     CMD_CONTROL = 33
     CMD_ALL = 64
+    CMD_MASK = 65
     CMD_USB = 16
     CMD_OFF = 0
     CMD_ON = 255
     
+    # Lookup tables filled by _build_frame_tables(), indexed [state][byte]
+    _INDEX_FRAMES = ((), ())
+    _VALUE_FRAMES = ((), ())
+    _GET_PORT_STATES = b''
+    
     def __init__(self):
         """Initialize protocol frame builder."""
         pass
     
+    @classmethod
+    def _build_frame_tables(cls):
+        """Precompute all on/off frames by port index and by hub value."""
+        def frame(*body):
+            return bytes(body + (cls.calculate_xor(body), cls.FRAME_END))
+        
+        cls._INDEX_FRAMES = tuple(
+            tuple(frame(cls.FRAME_HEAD, cls.FRAME_LENGTH, index, cls.CMD_ALL, state)
+                  for index in range(256))
+            for state in (cls.CMD_OFF, cls.CMD_ON)
+        )
+        cls._VALUE_FRAMES = tuple(
+            tuple(frame(cls.FRAME_HEAD, 8, cls.CMD_CONTROL, value, cls.CMD_USB, state)
+                  for value in range(256))
+            for state in (cls.CMD_OFF, cls.CMD_ON)
+        )
+        cls._GET_PORT_STATES = bytes(
+            [cls.FRAME_HEAD, cls.FRAME_LENGTH, 6, 0, 0, 127, cls.FRAME_END]
+        )
+    
+    @staticmethod
+    def _lookup(table, key):
+        """
+        Get a precomputed frame.
+        
+        Raises:
+            ValueError: If key does not fit in one byte
+        """
+        if not 0 <= key <= 255:
+            raise ValueError(f'Frame parameter out of range: {key}')
+        return table[key]
+    
     @staticmethod
     def calculate_xor(data_list):
         """
@@ -51,7 +110,7 @@ class ProtocolFrameBuilder:
         Returns:
             int: XOR checksum
         """
-        return reduce(lambda x, y: x ^ y, data_list, 0)
+        return reduce(xor, data_list, 0)
     
     @staticmethod
     def bytes_to_hex_string(data_list):
@@ -72,6 +131,26 @@ class ProtocolFrameBuilder:
                 hex_values.append('%02x' % data)
         return ' '.join(hex_values)
     
+    @classmethod
+    def is_valid_response(cls, frame):
+        """
+        Check framing, length and XOR checksum of a response frame.
+        
+        Args:
+            frame (bytes): Complete response frame
+        
+        Returns:
+            bool: True if the frame is well formed
+        """
+        return (
+            len(frame) >= cls.MIN_RESPONSE_LENGTH
+            and frame[0] == cls.FRAME_HEAD
+            and frame[1] == cls.FRAME_RESPONSE
+            and frame[2] == len(frame)
+            and frame[-1] == cls.FRAME_END
+            and cls.calculate_xor(frame[:-2]) == frame[-2]
+        )
+    
     def build_basic_frame(self, index, mode, state):
         """
         Build basic control frame.
@@ -82,12 +161,12 @@ class ProtocolFrameBuilder:
             state (int): Desired state
         
         Returns:
-            list: Frame byte list
+            bytes: Frame bytes
         """
         frame = [self.FRAME_HEAD, self.FRAME_LENGTH, index, mode, state]
         frame.append(self.calculate_xor(frame))
         frame.append(self.FRAME_END)
-        return frame
+        return bytes(frame)
     
     def build_usb_on_by_value(self, hub_value):
         """
@@ -97,15 +176,9 @@ class ProtocolFrameBuilder:
             hub_value (int): USB hub value
         
         Returns:
-            list: Frame byte list
+            bytes: Frame bytes
         """
-        frame = [
-            self.FRAME_HEAD, 8, self.CMD_CONTROL,
-            hub_value, self.CMD_USB, self.CMD_ON
-        ]
-        frame.append(self.calculate_xor(frame))
-        frame.append(self.FRAME_END)
-        return frame
+        return self._lookup(self._VALUE_FRAMES[1], hub_value)
     
     def build_usb_off_by_value(self, hub_value):
         """
@@ -115,15 +188,9 @@ class ProtocolFrameBuilder:
             hub_value (int): USB hub value
         
         Returns:
-            list: Frame byte list
+            bytes: Frame bytes
         """
-        frame = [
-            self.FRAME_HEAD, 8, self.CMD_CONTROL,
-            hub_value, self.CMD_USB, self.CMD_OFF
-        ]
-        frame.append(self.calculate_xor(frame))
-        frame.append(self.FRAME_END)
-        return frame
+        return self._lookup(self._VALUE_FRAMES[0], hub_value)
     
     def build_usb_on_by_index(self, port_index):
         """
@@ -133,9 +200,9 @@ class ProtocolFrameBuilder:
             port_index (int): Relay port index
         
         Returns:
-            list: Frame byte list
+            bytes: Frame bytes
         """
-        return self.build_basic_frame(port_index, self.CMD_ALL, self.CMD_ON)
+        return self._lookup(self._INDEX_FRAMES[1], port_index)
     
     def build_usb_off_by_index(self, port_index):
         """
@@ -145,9 +212,34 @@ class ProtocolFrameBuilder:
             port_index (int): Relay port index
         
         Returns:
-            list: Frame byte list
+            bytes: Frame bytes
         """
-        return self.build_basic_frame(port_index, self.CMD_ALL, self.CMD_OFF)
+        return self._lookup(self._INDEX_FRAMES[0], port_index)
+    
+    def build_usb_by_mask(self, port_mask, on):
+        """
+        Build frame to switch several ports at once.
+        
+        Args:
+            port_mask (int): Ports to switch, bit n-1 for port n
+            on (bool): Turn the ports on (True) or off (False)
+        
+        Returns:
+            bytes: Frame bytes
+        
+        Raises:
+            ValueError: If the mask is empty or has ports above MAX_MASK_PORTS
+        """
+        if not 0 < port_mask < 1 << self.MAX_MASK_PORTS:
+            raise ValueError(f'Port mask out of range: {port_mask:#x}')
+        
+        frame = [
+            self.FRAME_HEAD, self.MASK_FRAME_LENGTH, self.CMD_MASK,
+            port_mask & 0xFF, port_mask >> 8, self.CMD_ON if on else self.CMD_OFF
+        ]
+        frame.append(self.calculate_xor(frame))
+        frame.append(self.FRAME_END)
+        return bytes(frame)
     
     def build_success_response(self, param):
         """
@@ -172,9 +264,9 @@ class ProtocolFrameBuilder:
         Build frame to query all port states.
         
         Returns:
-            list: Frame byte list
+            bytes: Frame bytes
         """
-        return [self.FRAME_HEAD, self.FRAME_LENGTH, 6, 0, 0, 127, self.FRAME_END]
+        return self._GET_PORT_STATES
     
     def build_set_port_state(self, port_index, value):
         """
@@ -185,10 +277,206 @@ class ProtocolFrameBuilder:
             value (int): Hub ID value to bind
         
         Returns:
-            list: Frame byte list
+            bytes: Frame bytes
         """
         frame = [self.FRAME_HEAD, self.FRAME_LENGTH, 32, port_index, value]
         frame.append(self.calculate_xor(frame))
         frame.append(self.FRAME_END)
-        return frame
+        return bytes(frame)
+
+
+ProtocolFrameBuilder._build_frame_tables()
+
+
+class Ack(namedtuple('Ack', 'param status frame')):
+    """Acknowledgement of a successful command."""
+    __slots__ = ()
 
+
+class ErrorResponse(namedtuple('ErrorResponse', 'param status frame')):
+    """Response reporting a failed command (non-zero status)."""
+    __slots__ = ()
+
+
+class PortStates(namedtuple('PortStates', 'param states frame')):
+    """Port state vector: the hub ID value bound to each port."""
+    __slots__ = ()
+    
+    def hex_states(self):
+        """
+        Format the states like the server reports them.
+        
+        Returns:
+            list: Two-digit hex string per port
+        """
+        return ['%02x' % state for state in self.states]
+
+
+def decode_response(frame):
+    """
+    Turn a validated response frame into a typed response.
+    
+    Args:
+        frame (bytes): Complete response frame
+    
+    Returns:
+        Ack, ErrorResponse or PortStates
+    """
+    param = frame[3]
+    
+    if len(frame) == ProtocolFrameBuilder.FRAME_LENGTH:
+        status = frame[4]
+        if status == ProtocolFrameBuilder.FRAME_SUCCESS:
+            return Ack(param, status, frame)
+        return ErrorResponse(param, status, frame)
+    
+    return PortStates(param, frame[4:-2], frame)
+
+
+class FrameDecoder(object):
+    """
+    Incremental decoder for relay response frames.
+    
+    Bytes are fed as they arrive, in chunks of any size; frames split
+    across reads are reassembled and several frames in one read are all
+    returned. Bytes that do not start a response are skipped, and frames
+    failing the length or XOR check are dropped and counted. The decoder
+    resynchronizes on the next frame head, and never waits for a frame
+    with a corrupt length byte while a valid frame is already buffered
+    behind it.
+    
+    Attributes:
+        frames (int): Valid frames decoded
+        corrupt_frames (int): Frames dropped for a bad length or checksum
+        discarded_bytes (int): Bytes skipped while resynchronizing
+    """
+    
+    def __init__(self):
+        """Initialize an empty decoder."""
+        self._buffer = bytearray()
+        self.frames = 0
+        self.corrupt_frames = 0
+        self.discarded_bytes = 0
+    
+    @property
+    def pending(self):
+        """Number of buffered bytes not yet decoded."""
+        return len(self._buffer)
+    
+    def reset(self):
+        """Drop all buffered bytes."""
+        self.discarded_bytes += len(self._buffer)
+        del self._buffer[:]
+    
+    def feed(self, data):
+        """
+        Add received bytes.
+        
+        Args:
+            data (bytes): Bytes read from the serial port
+        """
+        self._buffer += data
+    
+    def needed(self):
+        """
+        Number of bytes to read before another frame can complete.
+        
+        Returns:
+            int: Byte count (at least 1)
+        """
+        builder = ProtocolFrameBuilder
+        buffer = self._buffer
+        
+        if len(buffer) < builder.RESPONSE_HEADER_SIZE:
+            return builder.RESPONSE_HEADER_SIZE - len(buffer)
+        return max(buffer[2] - len(buffer), 1)
+    
+    def next_response(self):
+        """
+        Decode the next complete frame.
+        
+        Returns:
+            Ack, ErrorResponse or PortStates, or None if no complete frame
+            is buffered
+        """
+        frame = self._next_frame()
+        return decode_response(frame) if frame is not None else None
+    
+    def decode(self, data):
+        """
+        Feed bytes and decode every frame completed by them.
+        
+        Args:
+            data (bytes): Bytes read from the serial port
+        
+        Returns:
+            list: Typed responses, in arrival order
+        """
+        self.feed(data)
+        
+        responses = []
+        while True:
+            response = self.next_response()
+            if response is None:
+                return responses
+            responses.append(response)
+    
+    def _discard(self, count):
+        """Skip count bytes at the start of the buffer."""
+        self.discarded_bytes += count
+        del self._buffer[:count]
+    
+    def _next_frame(self):
+        """Extract the next valid frame, or None if none is complete."""
+        builder = ProtocolFrameBuilder
+        buffer = self._buffer
+        
+        while True:
+            head = buffer.find(builder.FRAME_HEAD)
+            if head < 0:
+                self._discard(len(buffer))
+                return None
+            if head:
+                self._discard(head)
+            
+            if len(buffer) < builder.RESPONSE_HEADER_SIZE:
+                return None
+            
+            length = buffer[2]
+            if (buffer[1] != builder.FRAME_RESPONSE
+                    or not builder.MIN_RESPONSE_LENGTH <= length <= builder.MAX_RESPONSE_LENGTH):
+                self._discard(1)
+                continue
+            
+            if len(buffer) < length:
+                # A corrupt length must not hide a complete frame behind it
+                later = self._find_buffered_frame(1)
+                if later is None:
+                    return None
+                self.corrupt_frames += 1
+                self._discard(later)
+                continue
+            
+            frame = bytes(buffer[:length])
+            if builder.is_valid_response(frame):
+                del buffer[:length]
+                self.frames += 1
+                return frame
+            
+            self.corrupt_frames += 1
+            self._discard(1)
+    
+    def _find_buffered_frame(self, start):
+        """Offset of the first complete valid frame at or after start."""
+        builder = ProtocolFrameBuilder
+        buffer = self._buffer
+        
+        offset = buffer.find(builder.FRAME_HEAD, start)
+        while offset >= 0:
+            if len(buffer) - offset >= builder.RESPONSE_HEADER_SIZE:
+                length = buffer[offset + 2]
+                candidate = bytes(buffer[offset:offset + length])
+                if len(candidate) == length and builder.is_valid_response(candidate):
+                    return offset
+            offset = buffer.find(builder.FRAME_HEAD, offset + 1)
+        return None
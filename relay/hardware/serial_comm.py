@@ -5,16 +5,31 @@ Serial Communication Module
 Provides high-level serial communication interface for USB relay hardware.
 """
 
-import array
 import time
 import logging
-from typing import List, Optional
+from collections import namedtuple
+from typing import Dict, List, Optional, Sequence, Union
 from contextlib import contextmanager
 
 import serial
 from serial.tools.list_ports import comports
 
-from relay.hardware.protocol import ProtocolFrameBuilder
+from relay.hardware.protocol import (
+    ProtocolFrameBuilder,
+    FrameDecoder,
+    Ack,
+    ErrorResponse,
+    PortStates,
+)
+from relay.hardware.trace import UartTraceRecorder, TRACE_TX, TRACE_RX
+from relay.hardware.pacing import CommandPacing
+
+Response = Union[Ack, ErrorResponse, PortStates]
+
+
+class PortIdentity(namedtuple('PortIdentity', 'vid pid serial_number location')):
+    """USB identity of a serial adapter, independent of its port name."""
+    __slots__ = ()
 
 
 class SerialCommunicator:
@@ -25,6 +40,10 @@ class SerialCommunicator:
     including port detection, data transmission, and command execution.
     """
     
+    # Seconds a read may outlast the response deadline before the port
+    # timeout is changed; every change reconfigures the port
+    TIMEOUT_SLACK = 0.01
+    
     def __init__(
         self,
         name: str,
@@ -33,7 +52,15 @@ class SerialCommunicator:
         parity: str = 'N',
         stopbits: int = 1,
         timeout: float = 0,
-        auto_connect: bool = True
+        auto_connect: bool = True,
+        response_timeout: float = 0.5,
+        port: Optional[str] = None,
+        recorder: Optional[UartTraceRecorder] = None,
+        trace_channel: int = 0,
+        identity: Optional[PortIdentity] = None,
+        mask_frames: bool = False,
+        pipeline_window: int = 4,
+        pacing: Optional[CommandPacing] = None
     ):
         """
         Initialize serial communicator.
@@ -46,32 +73,76 @@ class SerialCommunicator:
             stopbits: Number of stop bits (default: 1)
             timeout: Read timeout in seconds (default: 0)
             auto_connect: Auto-connect to first available port
+            response_timeout: Default deadline for a command's response
+            port: Serial port to open instead of auto-detecting one
+            recorder: UART trace recorder for sent and received frames
+            trace_channel: Board number recorded with each frame
+            identity: USB identity of the port, if already known
+            mask_frames: The board's firmware accepts multi-port mask
+                frames (see ProtocolFrameBuilder.build_usb_by_mask)
+            pipeline_window: Frames sent ahead of their responses when
+                switching several ports without mask frames
+            pacing: Learns the response deadline and the gap between
+                commands from measured latency (default: fixed
+                response_timeout, no gap)
         
         Raises:
             ValueError: If no serial ports found
         """
         self.logger = logging.getLogger(f'relay.serial.{name}')
         self.protocol = ProtocolFrameBuilder()
+        self.response_timeout = response_timeout
+        self._decoder = FrameDecoder()
+        self.recorder = recorder
+        self.trace_channel = trace_channel
+        self.mask_frames = mask_frames
+        self.pipeline_window = max(pipeline_window, 1)
+        self.pacing = pacing
         self._serial: Optional[serial.Serial] = None
+        self._settings = dict(
+            baudrate=baudrate,
+            bytesize=bytesize,
+            parity=parity,
+            stopbits=stopbits,
+            xonxoff=False,
+            timeout=timeout
+        )
         
-        if auto_connect:
+        self.port: Optional[str] = None
+        self.identity = identity
+        
+        if port is None and auto_connect:
             ports = self.find_serial_ports()
             if not ports:
                 raise ValueError('No serial ports found for relay communication')
             
             port = ports[-1]  # Use last detected port
-            self.logger.info(f'Connecting to serial port: {port}')
-            
-            self._serial = serial.Serial(
-                port=port,
-                baudrate=baudrate,
-                bytesize=bytesize,
-                parity=parity,
-                stopbits=stopbits,
-                xonxoff=False,
-                timeout=timeout
-            )
-            self.logger.info(f'Serial port opened: {port}')
+        
+        if port is not None:
+            self.open(port, identity)
+    
+    def open(self, port: Optional[str] = None, identity: Optional[PortIdentity] = None) -> None:
+        """
+        Open (or reopen) the serial port.
+        
+        Args:
+            port: Port name (default: the port opened last)
+            identity: USB identity of the port (default: looked up)
+        
+        Raises:
+            serial.SerialException: If the port cannot be opened
+        """
+        port = port or self.port
+        if self._serial is not None:
+            self.close()
+        
+        self.logger.info(f'Connecting to serial port: {port}')
+        self._serial = serial.Serial(port=port, **self._settings)
+        self._decoder.reset()
+        
+        self.port = port
+        self.identity = identity or self.port_identity(port) or self.identity
+        self.logger.info(f'Serial port opened: {port}')
     
     @staticmethod
     def find_serial_ports(identifier: str = 'Serial') -> List[str]:
@@ -89,17 +160,107 @@ class SerialCommunicator:
             if identifier in desc
         ]
     
+    @staticmethod
+    def port_identity(port: str) -> Optional[PortIdentity]:
+        """
+        Look up the USB identity of a serial port.
+        
+        Args:
+            port: Port name
+        
+        Returns:
+            PortIdentity, or None if the port is not a USB adapter
+        """
+        for info in comports():
+            if info.device == port and info.vid is not None:
+                return PortIdentity(info.vid, info.pid, info.serial_number, info.location)
+        return None
+    
+    @staticmethod
+    def find_port_by_identity(identity: PortIdentity) -> Optional[str]:
+        """
+        Find the current port name of a USB adapter.
+        
+        The adapter is matched by VID, PID and USB serial number; adapters
+        without a serial number are matched by their USB location.
+        
+        Args:
+            identity: Identity recorded when the adapter was opened
+        
+        Returns:
+            Port name, or None if the adapter is not connected
+        """
+        for info in comports():
+            if (info.vid, info.pid) != (identity.vid, identity.pid):
+                continue
+            if identity.serial_number:
+                if info.serial_number == identity.serial_number:
+                    return info.device
+            elif info.location == identity.location:
+                return info.device
+        return None
+    
     @property
     def is_open(self) -> bool:
         """Check if serial port is open."""
         return self._serial is not None and self._serial.isOpen()
     
-    def send_data(self, frame_data: List[int]) -> None:
+    def fileno(self) -> Optional[int]:
+        """
+        Get the file descriptor of the open port.
+        
+        Returns:
+            File descriptor, or None if the port is closed or the
+            platform has none for serial ports (Windows)
+        """
+        if not self.is_open:
+            return None
+        try:
+            return self._serial.fileno()
+        except (AttributeError, NotImplementedError):
+            return None
+    
+    def deadline(self, timeout: Optional[float] = None) -> float:
+        """
+        Get the response deadline of a command.
+        
+        Args:
+            timeout: Explicit deadline in seconds
+        
+        Returns:
+            timeout if given, else the learned deadline with pacing, else
+            response_timeout
+        """
+        if timeout is not None:
+            return timeout
+        if self.pacing is not None:
+            return self.pacing.response_timeout
+        return self.response_timeout
+    
+    def send_data(self, frame_data: Union[bytes, bytearray, memoryview, List[int]]) -> None:
         """
         Send frame data to relay.
         
+        Bytes-like frames, such as the builder's precomputed frames, are
+        written as they are without copying.
+        
         Args:
-            frame_data: List of byte values to send
+            frame_data: Frame bytes, or list of byte values to send
+        
+        Raises:
+            RuntimeError: If port is not open
+        """
+        if not isinstance(frame_data, (bytes, bytearray, memoryview)):
+            frame_data = bytes(frame_data)
+        
+        self.send_frames([frame_data])
+    
+    def send_frames(self, frames: Sequence[bytes]) -> None:
+        """
+        Send several frames in a single write.
+        
+        Args:
+            frames: Frames to send, in order
         
         Raises:
             RuntimeError: If port is not open
@@ -107,18 +268,51 @@ class SerialCommunicator:
         if not self.is_open:
             raise RuntimeError('Serial port is not open')
         
-        hex_string = self.protocol.bytes_to_hex_string(frame_data)
-        self.logger.debug(f'[TX] {hex_string}')
-        
-        self._serial.write(array.array('B', frame_data))
+        self._serial.write(frames[0] if len(frames) == 1 else b''.join(frames))
         self._serial.flush()
+        self.trace_sent(frames)
+    
+    def trace_sent(self, frames: Sequence[bytes]) -> None:
+        """
+        Log and record frames written to the port.
+        
+        Args:
+            frames: Frames sent, in order
+        """
+        if self.logger.isEnabledFor(logging.DEBUG):
+            for frame in frames:
+                self.logger.debug(f'[TX] {self.protocol.bytes_to_hex_string(frame)}')
+        
+        if self.recorder is not None:
+            for frame in frames:
+                self.recorder.record(TRACE_TX, frame, self.trace_channel)
+    
+    def trace_received(self, response: Response) -> None:
+        """
+        Record a response read from the port.
+        
+        Args:
+            response: Decoded response
+        """
+        if self.recorder is not None:
+            self.recorder.record(TRACE_RX, response.frame, self.trace_channel)
     
-    def receive_data(self) -> str:
+    def read_response(self, timeout: Optional[float] = None) -> Optional[Response]:
         """
-        Receive data from relay.
+        Read one response from the relay.
+        
+        Returns as soon as a complete frame has arrived. Bytes that do not
+        start a response, and frames failing the length or XOR check, are
+        skipped. The port's read timeout is only changed when it differs
+        from the time left by more than TIMEOUT_SLACK, so a read ends at
+        most that long after the deadline.
+        
+        Args:
+            timeout: Deadline in seconds (default: see deadline())
         
         Returns:
-            Hex string representation of received data
+            Ack, ErrorResponse or PortStates, or None if no frame arrived
+            in time
         
         Raises:
             RuntimeError: If port is not open
@@ -126,29 +320,119 @@ class SerialCommunicator:
         if not self.is_open:
             raise RuntimeError('Serial port is not open')
         
-        output = self._serial.readall()
-        result = self.protocol.bytes_to_hex_string(output) if len(output) > 1 else ''
+        decoder = self._decoder
+        corrupt = decoder.corrupt_frames
+        budget = self.deadline(timeout)
+        deadline = time.monotonic() + budget
+        
+        # Each read waits up to the port timeout
+        port_timeout = self._serial.timeout
+        if port_timeout is None or abs(port_timeout - budget) > self.TIMEOUT_SLACK:
+            self._serial.timeout = port_timeout = budget
+        
+        response = decoder.next_response()
+        while response is None:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            
+            if port_timeout > remaining + self.TIMEOUT_SLACK:
+                self._serial.timeout = port_timeout = remaining
+            decoder.feed(self._serial.read(decoder.needed()))
+            response = decoder.next_response()
+        
+        if decoder.corrupt_frames != corrupt:
+            self.logger.warning(f'[RX] Dropped {decoder.corrupt_frames - corrupt} corrupt frame(s)')
+        if response is None and decoder.pending:
+            self.logger.warning(f'[RX] Incomplete frame ({decoder.pending} bytes)')
         
-        if result:
-            self.logger.debug(f'[RX] {result}')
+        if response is not None:
+            self.trace_received(response)
         
-        return result
+        return response
     
-    def execute_command(self, frame_data: List[int]) -> str:
+    def transact(
+        self,
+        frame_data: Union[bytes, bytearray, memoryview, List[int]],
+        timeout: Optional[float] = None
+    ) -> Optional[Response]:
         """
-        Execute command by sending frame and receiving response.
+        Send a command frame and wait for its response.
+        
+        With pacing, the command is held back until the learned gap after
+        the previous one has passed, and its latency is recorded.
         
         Args:
             frame_data: Command frame to send
+            timeout: Response deadline in seconds (default: see deadline())
         
         Returns:
-            Response hex string
+            Ack, ErrorResponse or PortStates, or None if the relay did not
+            answer in time
         """
+        pacing = self.pacing
+        if pacing is not None:
+            pacing.wait_for_gap()
+        
+        if self.is_open:
+            # Drop late replies to earlier commands
+            self._serial.reset_input_buffer()
+            self._decoder.reset()
+        
+        started = time.monotonic()
         self.send_data(frame_data)
-        time.sleep(0.1)  # Wait for relay to process
-        return self.receive_data()
+        response = self.read_response(timeout)
+        
+        if pacing is not None:
+            if response is None:
+                pacing.record_timeout()
+            else:
+                pacing.record(time.monotonic() - started)
+        
+        if response is None:
+            self.logger.warning('[RX] No response from relay')
+        elif isinstance(response, ErrorResponse):
+            self.logger.warning(f'[RX] Relay reported error status {response.status}')
+        elif self.logger.isEnabledFor(logging.DEBUG):
+            self.logger.debug(f'[RX] {self.protocol.bytes_to_hex_string(response.frame)}')
+        
+        return response
     
-    def usb_on(self, port_index: int) -> str:
+    def receive_data(self, timeout: Optional[float] = None) -> str:
+        """
+        Receive a response frame from relay.
+        
+        Args:
+            timeout: Deadline in seconds (default: see deadline())
+        
+        Returns:
+            Hex string representation of the frame, '' if none arrived
+        
+        Raises:
+            RuntimeError: If port is not open
+        """
+        response = self.read_response(timeout)
+        return self.protocol.bytes_to_hex_string(response.frame) if response else ''
+    
+    def execute_command(
+        self,
+        frame_data: Union[bytes, bytearray, memoryview, List[int]],
+        timeout: Optional[float] = None
+    ) -> str:
+        """
+        Execute command by sending frame and receiving response.
+        
+        Args:
+            frame_data: Command frame to send
+            timeout: Response deadline in seconds (default: see deadline())
+        
+        Returns:
+            Response hex string ('' if the relay did not answer in time)
+        """
+        response = self.transact(frame_data, timeout)
+        return self.protocol.bytes_to_hex_string(response.frame) if response else ''
+    
+    def usb_on(self, port_index: int) -> Optional[Response]:
         """
         Turn USB power ON for specific port.
         
@@ -156,13 +440,13 @@ class SerialCommunicator:
             port_index: Relay port index (1-based)
         
         Returns:
-            Response from relay
+            Ack or ErrorResponse from relay, None if it did not answer
         """
         self.logger.info(f'Power ON relay port [{port_index}]')
         frame = self.protocol.build_usb_on_by_index(port_index)
-        return self.execute_command(frame)
+        return self.transact(frame)
     
-    def usb_off(self, port_index: int) -> str:
+    def usb_off(self, port_index: int) -> Optional[Response]:
         """
         Turn USB power OFF for specific port.
         
@@ -170,13 +454,13 @@ class SerialCommunicator:
             port_index: Relay port index (1-based)
         
         Returns:
-            Response from relay
+            Ack or ErrorResponse from relay, None if it did not answer
         """
         self.logger.info(f'Power OFF relay port [{port_index}]')
         frame = self.protocol.build_usb_off_by_index(port_index)
-        return self.execute_command(frame)
+        return self.transact(frame)
     
-    def usb_on_by_value(self, hub_value: int) -> str:
+    def usb_on_by_value(self, hub_value: int) -> Optional[Response]:
         """
         Connect USB cable by hub value.
         
@@ -184,13 +468,13 @@ class SerialCommunicator:
             hub_value: USB hub ID value
         
         Returns:
-            Response from relay
+            Ack or ErrorResponse from relay, None if it did not answer
         """
         self.logger.info(f'Connect USB cable [0x{hub_value:02x}]')
         frame = self.protocol.build_usb_on_by_value(hub_value)
-        return self.execute_command(frame)
+        return self.transact(frame)
     
-    def usb_off_by_value(self, hub_value: int) -> str:
+    def usb_off_by_value(self, hub_value: int) -> Optional[Response]:
         """
         Disconnect USB cable by hub value.
         
@@ -198,11 +482,79 @@ class SerialCommunicator:
             hub_value: USB hub ID value
         
         Returns:
-            Response from relay
+            Ack or ErrorResponse from relay, None if it did not answer
         """
         self.logger.info(f'Disconnect USB cable [0x{hub_value:02x}]')
         frame = self.protocol.build_usb_off_by_value(hub_value)
-        return self.execute_command(frame)
+        return self.transact(frame)
+    
+    def switch_ports(self, port_mask: int, on: bool) -> Dict[int, Optional[Response]]:
+        """
+        Turn USB power ON or OFF for several ports with as few frames as possible.
+        
+        Boards with mask frame support switch all ports with one frame.
+        Otherwise the per-port frames are pipelined: up to
+        ``pipeline_window`` frames are written ahead, each response
+        (matched to its port by the echoed param) releases the next frame,
+        so the board never idles waiting for the host's turnaround.
+        
+        Args:
+            port_mask: Ports to switch, bit n-1 for port n
+            on: Turn the ports on (True) or off (False)
+        
+        Returns:
+            Ack, ErrorResponse or None (no answer) per port, in port order
+        """
+        ports = [port for port in range(1, port_mask.bit_length() + 1) if port_mask >> (port - 1) & 1]
+        if not ports:
+            return {}
+        
+        self.logger.info(f'Power {"ON" if on else "OFF"} relay ports {ports}')
+        
+        if self.mask_frames and ports[-1] <= self.protocol.MAX_MASK_PORTS:
+            response = self.transact(self.protocol.build_usb_by_mask(port_mask, on))
+            return {port: response for port in ports}
+        
+        build = self.protocol.build_usb_on_by_index if on else self.protocol.build_usb_off_by_index
+        if len(ports) == 1:
+            return {ports[0]: self.transact(build(ports[0]))}
+        
+        if self.pacing is not None:
+            self.pacing.wait_for_gap()
+        
+        if self.is_open:
+            # Drop late replies to earlier commands
+            self._serial.reset_input_buffer()
+            self._decoder.reset()
+        
+        responses: Dict[int, Optional[Response]] = {}
+        queued = list(ports)
+        outstanding: List[int] = []
+        
+        while queued or outstanding:
+            if queued and len(outstanding) < self.pipeline_window:
+                burst = queued[:self.pipeline_window - len(outstanding)]
+                del queued[:len(burst)]
+                self.send_frames([build(port) for port in burst])
+                outstanding.extend(burst)
+            
+            response = self.read_response()
+            if response is None:
+                # The oldest frame went unanswered; free its window slot
+                port = outstanding.pop(0)
+                self.logger.warning(f'[RX] No response from relay for port [{port}]')
+                responses[port] = None
+                continue
+            
+            # Responses come in order; one not echoing its port answers the oldest frame
+            port = response.param if response.param in outstanding else outstanding[0]
+            outstanding.remove(port)
+            responses[port] = response
+            if isinstance(response, ErrorResponse):
+                self.logger.warning(f'[RX] Relay reported error status {response.status} '
+                                    f'for port [{port}]')
+        
+        return {port: responses[port] for port in ports}
     
     def get_all_port_states(self) -> List[str]:
         """
@@ -212,13 +564,13 @@ class SerialCommunicator:
             List of hex strings representing each port's state
         """
         self.logger.info('Reading all relay port states')
-        frame = self.protocol.build_get_port_states()
-        response = self.execute_command(frame)
+        response = self.transact(self.protocol.build_get_port_states())
         
-        # Extract port states from response (bytes 4-8)
-        return response.split(' ')[4:9] if response else []
+        if not isinstance(response, PortStates):
+            return []
+        return response.hex_states()
     
-    def set_port_state(self, port_index: int, hub_value: int) -> str:
+    def set_port_state(self, port_index: int, hub_value: int) -> Optional[Response]:
         """
         Set port state (bind device to port).
         
@@ -227,18 +579,25 @@ class SerialCommunicator:
             hub_value: USB hub ID value to bind
         
         Returns:
-            Response from relay
+            Ack or ErrorResponse from relay, None if it did not answer
         """
         self.logger.info(f'Bind port [{port_index}] to hub ID [0x{hub_value:02x}]')
         frame = self.protocol.build_set_port_state(port_index, hub_value)
-        return self.execute_command(frame)
+        return self.transact(frame)
     
     def close(self) -> None:
         """Close serial connection."""
-        if self._serial and self._serial.isOpen():
-            self.logger.info(f'Closing serial port: {self._serial.port}')
-            self._serial.close()
-            self._serial = None
+        if self._serial is None:
+            return
+        
+        try:
+            if self._serial.isOpen():
+                self.logger.info(f'Closing serial port: {self._serial.port}')
+                self._serial.close()
+        except (OSError, serial.SerialException) as e:
+            # The adapter may already be gone
+            self.logger.warning(f'Error closing serial port: {e}')
+        self._serial = None
     
     def __enter__(self):
         """Context manager entry."""
@@ -0,0 +1,375 @@
+# -*- coding: utf-8 -*-
+"""
+UART Trace Recorder
+
+Records the raw frames exchanged with the relay boards in a bounded ring
+buffer and flushes them to a compact binary trace file, instead of
+formatting every frame as a hex log line. The trace is decoded offline
+(see ``relay-trace``).
+
+File Format: one or more sessions, each [HEADER][RECORD...]
+
+    Header: [MAGIC(4)][VERSION(1)][ORIGIN(8)]
+            ORIGIN is the wall-clock time of monotonic time zero
+    Record: [TIMESTAMP(8)][DIRECTION(1)][CHANNEL(1)][LENGTH(2)][FRAME]
+            TIMESTAMP is monotonic seconds, CHANNEL the board number
+"""
+
+import logging
+import math
+import struct
+import threading
+import time
+from collections import deque, namedtuple
+from typing import Dict, Iterator, List, Optional
+
+from relay.hardware.protocol import (
+    ProtocolFrameBuilder,
+    Ack,
+    PortStates,
+    decode_response,
+)
+
+
+TRACE_MAGIC = b'RTRC'
+TRACE_VERSION = 1
+
+TRACE_TX = 0
+TRACE_RX = 1
+
+_HEADER = struct.Struct('!4sBd')
+_RECORD = struct.Struct('!dBBH')
+
+
+class TraceRecord(namedtuple('TraceRecord', 'timestamp direction channel frame')):
+    """One recorded frame; timestamp is wall-clock seconds."""
+    __slots__ = ()
+
+
+class UartTraceRecorder:
+    """
+    Bounded recorder of UART frames.
+    
+    Recording appends a reference to the (immutable) frame with a
+    monotonic timestamp; nothing is formatted or written on the serial
+    path. A background thread moves the buffered records to the trace
+    file every ``flush_interval`` seconds. If the writer falls behind,
+    the oldest records are overwritten and counted as dropped.
+    
+    Without a path the recorder keeps only the most recent ``capacity``
+    frames in memory, for inspection with snapshot().
+    """
+    
+    def __init__(
+        self,
+        path: Optional[str] = None,
+        capacity: int = 4096,
+        flush_interval: float = 1.0,
+        logger: Optional[logging.Logger] = None
+    ):
+        """
+        Initialize trace recorder.
+        
+        Args:
+            path: Trace file to append to (default: memory only)
+            capacity: Maximum number of buffered records
+            flush_interval: Seconds between background flushes
+            logger: Logger for recorder events
+        """
+        self.path = path
+        self.capacity = capacity
+        self.flush_interval = flush_interval
+        self.logger = logger or logging.getLogger('relay.trace')
+        
+        self._ring: deque = deque(maxlen=capacity)
+        self._lock = threading.Lock()
+        self._write_lock = threading.Lock()
+        self._origin = time.time() - time.monotonic()
+        self._file = None
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        
+        self.recorded = 0
+        self.dropped = 0
+        self.written = 0
+    
+    def record(self, direction: int, frame: bytes, channel: int = 0) -> None:
+        """
+        Record one frame.
+        
+        Args:
+            direction: TRACE_TX or TRACE_RX
+            frame: Frame bytes as sent or received
+            channel: Board number
+        """
+        if not isinstance(frame, bytes):
+            frame = bytes(frame)
+        
+        entry = (time.monotonic(), direction, channel, frame)
+        with self._lock:
+            if len(self._ring) == self.capacity:
+                self.dropped += 1
+            self._ring.append(entry)
+            self.recorded += 1
+    
+    def snapshot(self) -> List[TraceRecord]:
+        """
+        Get the buffered records without removing them.
+        
+        Returns:
+            Records not yet flushed, oldest first
+        """
+        with self._lock:
+            entries = list(self._ring)
+        return [TraceRecord(self._origin + t, d, c, f) for t, d, c, f in entries]
+    
+    def flush(self) -> int:
+        """
+        Write the buffered records to the trace file.
+        
+        Returns:
+            Number of records written
+        """
+        if self.path is None:
+            return 0
+        
+        with self._write_lock:
+            with self._lock:
+                entries = list(self._ring)
+                self._ring.clear()
+            if not entries:
+                return 0
+            
+            if self._file is None:
+                self._file = open(self.path, 'ab')
+                self._file.write(_HEADER.pack(TRACE_MAGIC, TRACE_VERSION, self._origin))
+            
+            parts = []
+            for timestamp, direction, channel, frame in entries:
+                parts.append(_RECORD.pack(timestamp, direction, channel, len(frame)))
+                parts.append(frame)
+            self._file.write(b''.join(parts))
+            self._file.flush()
+            
+            self.written += len(entries)
+            return len(entries)
+    
+    def start(self) -> None:
+        """Start the background flush thread."""
+        if self.path is None or self._thread is not None:
+            return
+        
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._flush_loop, name='relay-trace', daemon=True)
+        self._thread.start()
+        self.logger.info(f'Recording UART trace to {self.path}')
+    
+    def close(self) -> None:
+        """Stop the flush thread, write the remaining records and close the file."""
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(self.flush_interval + 1.0)
+            self._thread = None
+        
+        self.flush()
+        with self._write_lock:
+            if self._file is not None:
+                self._file.close()
+                self._file = None
+        
+        if self.dropped:
+            self.logger.warning(f'UART trace dropped {self.dropped} record(s)')
+    
+    def _flush_loop(self) -> None:
+        """Flush periodically until closed."""
+        while not self._stop.wait(self.flush_interval):
+            try:
+                self.flush()
+            except Exception as e:
+                self.logger.error(f'Failed to write UART trace: {e}')
+    
+    def __repr__(self):
+        """String representation."""
+        return (f'UartTraceRecorder(path={self.path!r}, recorded={self.recorded}, '
+                f'dropped={self.dropped}, written={self.written})')
+
+
+def read_trace(path: str) -> Iterator[TraceRecord]:
+    """
+    Read the records of a trace file.
+    
+    Args:
+        path: Trace file
+    
+    Yields:
+        Records with wall-clock timestamps, in file order
+    
+    Raises:
+        ValueError: If the file is not a trace or is truncated
+    """
+    with open(path, 'rb') as f:
+        data = f.read()
+    
+    offset = 0
+    origin = None
+    while offset < len(data):
+        if data.startswith(TRACE_MAGIC, offset):
+            _, version, origin = _HEADER.unpack_from(data, offset)
+            if version != TRACE_VERSION:
+                raise ValueError(f'Unsupported trace version: {version}')
+            offset += _HEADER.size
+            continue
+        
+        if origin is None:
+            raise ValueError(f'{path} is not a UART trace file')
+        if len(data) - offset < _RECORD.size:
+            raise ValueError(f'Truncated trace record at offset {offset}')
+        
+        timestamp, direction, channel, length = _RECORD.unpack_from(data, offset)
+        offset += _RECORD.size
+        frame = data[offset:offset + length]
+        if len(frame) != length:
+            raise ValueError(f'Truncated trace record at offset {offset}')
+        offset += length
+        
+        yield TraceRecord(origin + timestamp, direction, channel, frame)
+
+
+def describe_frame(record: TraceRecord) -> str:
+    """
+    Name the command or response carried by a frame.
+    
+    Args:
+        record: Trace record
+    
+    Returns:
+        Command type for sent frames ('on', 'off', 'on_value',
+        'off_value', 'on_mask', 'off_mask', 'set_state', 'get_states'),
+        response type for received ones ('ack', 'error', 'states'), or
+        'unknown'
+    """
+    P = ProtocolFrameBuilder
+    frame = record.frame
+    
+    if record.direction == TRACE_RX:
+        if not P.is_valid_response(frame):
+            return 'unknown'
+        response = decode_response(frame)
+        if isinstance(response, Ack):
+            return 'ack'
+        return 'states' if isinstance(response, PortStates) else 'error'
+    
+    if frame == P().build_get_port_states():
+        return 'get_states'
+    if len(frame) == P.FRAME_LENGTH and frame[3] == P.CMD_ALL:
+        return 'on' if frame[4] == P.CMD_ON else 'off'
+    if len(frame) == P.FRAME_LENGTH and frame[2] == 32:
+        return 'set_state'
+    if len(frame) == 8 and frame[2] == P.CMD_CONTROL:
+        return 'on_value' if frame[5] == P.CMD_ON else 'off_value'
+    if len(frame) == P.MASK_FRAME_LENGTH and frame[2] == P.CMD_MASK:
+        return 'on_mask' if frame[5] == P.CMD_ON else 'off_mask'
+    return 'unknown'
+
+
+def _response_param(frame: bytes) -> Optional[int]:
+    """Param byte the board echoes in its response to a command frame."""
+    P = ProtocolFrameBuilder
+    
+    if frame == P().build_get_port_states():
+        return 0
+    if len(frame) == P.FRAME_LENGTH:
+        return frame[3] if frame[2] == 32 else frame[2]
+    if len(frame) == 8:
+        return frame[3]
+    return None
+
+
+def round_trips(records: Iterator[TraceRecord]) -> Iterator[tuple]:
+    """
+    Pair every sent command with the response that answers it.
+    
+    Several commands may be outstanding at once when frames are
+    pipelined. The board answers in order, so a response belongs to the
+    oldest outstanding command whose param it echoes (else to the oldest
+    one); older commands still waiting went unanswered.
+    
+    Args:
+        records: Trace records in time order
+    
+    Yields:
+        (command type, latency in seconds or None if unanswered) per
+        sent frame
+    """
+    outstanding: Dict[int, deque] = {}
+    
+    for record in records:
+        pending = outstanding.setdefault(record.channel, deque())
+        if record.direction == TRACE_TX:
+            pending.append(record)
+            continue
+        
+        if not pending:
+            continue
+        
+        param = record.frame[3] if len(record.frame) > 3 else None
+        for position, command in enumerate(pending):
+            expected = _response_param(command.frame)
+            if expected is None or expected == param:
+                break
+        else:
+            # Param not echoed as expected; assume the oldest command
+            position = 0
+        
+        for _ in range(position):
+            yield describe_frame(pending.popleft()), None
+        command = pending.popleft()
+        yield describe_frame(command), record.timestamp - command.timestamp
+    
+    for pending in outstanding.values():
+        for command in pending:
+            yield describe_frame(command), None
+
+
+def latency_summary(records: Iterator[TraceRecord]) -> Dict[str, Dict[str, float]]:
+    """
+    Compute round-trip latency per command type.
+    
+    Args:
+        records: Trace records in time order
+    
+    Returns:
+        Dictionary of command type to count, unanswered count and
+        mean/p50/p95/p99/max latency in seconds
+    """
+    latencies: Dict[str, List[float]] = {}
+    unanswered: Dict[str, int] = {}
+    
+    for command, latency in round_trips(records):
+        latencies.setdefault(command, [])
+        if latency is None:
+            unanswered[command] = unanswered.get(command, 0) + 1
+        else:
+            latencies[command].append(latency)
+    
+    summary = {}
+    for command, values in sorted(latencies.items()):
+        values.sort()
+        summary[command] = {
+            'count': len(values),
+            'unanswered': unanswered.get(command, 0),
+            'mean': sum(values) / len(values) if values else 0.0,
+            'p50': _percentile(values, 50),
+            'p95': _percentile(values, 95),
+            'p99': _percentile(values, 99),
+            'max': values[-1] if values else 0.0,
+        }
+    return summary
+
+
+def _percentile(values: List[float], percent: float) -> float:
+    """Nearest-rank percentile of sorted values."""
+    if not values:
+        return 0.0
+    rank = max(int(math.ceil(percent / 100.0 * len(values))), 1)
+    return values[rank - 1]
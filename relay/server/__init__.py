@@ -5,9 +5,17 @@ Server Module
 Provides server implementation for relay control.
 """
 
+from relay.server.engine import RelayEngine, get_shared_engine
 from relay.server.task_manager import RelayTaskManager
+from relay.server.scheduler import TaskScheduler
+from relay.server.board import BoardWorker
+from relay.server.async_server import AsyncRelayServer
 
 __all__ = [
+    'RelayEngine',
+    'get_shared_engine',
     'RelayTaskManager',
+    'TaskScheduler',
+    'BoardWorker',
+    'AsyncRelayServer',
 ]
-
@@ -0,0 +1,341 @@
+# -*- coding: utf-8 -*-
+"""
+Asyncio Relay Server
+
+Event-loop front end for RelayTaskManager. Network I/O, decoding and
+response writing for all clients overlap on one loop, while serial
+transactions are run one at a time by the manager's task scheduler.
+"""
+
+import asyncio
+import pickle
+import threading
+from typing import Optional, Any, Dict, List, Set
+
+from relay.utils.relay_utils import Task
+from relay.utils.framing import (
+    FRAME_MAGIC,
+    CODEC_PICKLE,
+    CODEC_BINARY,
+    FramingError,
+    encode_frame,
+    encode_payload,
+    decode_payload,
+    is_framed,
+    read_frame_async,
+    read_legacy_message_async,
+)
+from relay.utils.codec import CodecError
+from relay.constants import RELAY_SUBSCRIBE_MSG
+
+
+class AsyncRelayServer:
+    """
+    Asyncio server mode for RelayTaskManager.
+    
+    Every client connection is handled by its own coroutine. Decoded tasks
+    are handed to the manager's priority scheduler, whose single worker
+    thread owns the serial link, so the port never sees two commands at
+    once and a slow client cannot stall the others.
+    """
+    
+    def __init__(self, manager, read_timeout: float = 10.0):
+        """
+        Initialize asyncio server.
+        
+        Args:
+            manager: RelayTaskManager owning the socket and serial link
+            read_timeout: Seconds to wait for a client to send its task
+        """
+        self.manager = manager
+        self.logger = manager.logger
+        self.read_timeout = read_timeout
+        
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._servers: List[asyncio.AbstractServer] = []
+        self._started = threading.Event()
+        self._stopped = threading.Event()
+    
+    async def submit(self, task: Task) -> Any:
+        """
+        Schedule a task and wait for its response.
+        
+        Args:
+            task: Task to execute
+        
+        Returns:
+            Response from the task manager
+        """
+        return await asyncio.wrap_future(self.manager.submit(task))
+    
+    async def _handle_client(
+        self,
+        reader: asyncio.StreamReader,
+        writer: asyncio.StreamWriter
+    ) -> None:
+        """
+        Handle a client connection.
+        
+        Args:
+            reader: Client stream reader
+            writer: Client stream writer
+        """
+        address = writer.get_extra_info('peername') or 'unix'
+        self.logger.info(f'[IN_TASK] - Connection from {address}')
+        
+        try:
+            try:
+                prefix = await asyncio.wait_for(
+                    reader.readexactly(len(FRAME_MAGIC)), self.read_timeout
+                )
+            except asyncio.IncompleteReadError as e:
+                prefix = e.partial
+            if not prefix:
+                return
+            
+            if is_framed(prefix):
+                await self._serve_framed(reader, writer, address, prefix)
+                return
+            
+            if not self.manager.accepts_codec(CODEC_PICKLE):
+                self.logger.warning(f'[IN_TASK] - Rejected pickle request from {address}')
+                return
+            
+            task = await asyncio.wait_for(
+                read_legacy_message_async(reader, prefix), self.read_timeout
+            )
+            if task is None:
+                return
+            
+            self.logger.info(f'[IN_TASK] - Received task: {task}')
+            
+            response = await self.submit(task)
+            
+            writer.write(pickle.dumps(response))
+            await writer.drain()
+            
+            self.logger.info(f'[IN_TASK] - Sent response: {response}')
+        
+        except asyncio.TimeoutError:
+            self.logger.warning(f'[IN_TASK] - Client {address} sent no task')
+        except asyncio.CancelledError:
+            # Server shutting down with this connection still open
+            pass
+        except pickle.PickleError as e:
+            self.logger.error(f'Pickle error: {e}')
+        except Exception as e:
+            self.logger.error(f'Connection handling error: {e}', exc_info=True)
+        finally:
+            writer.close()
+    
+    async def _serve_framed(
+        self,
+        reader: asyncio.StreamReader,
+        writer: asyncio.StreamWriter,
+        address: Any,
+        prefix: bytes
+    ) -> None:
+        """
+        Serve a persistent framed connection.
+        
+        Each request gets its own coroutine, so many requests from one
+        connection can be in flight and answered out of order.
+        
+        Args:
+            reader: Client stream reader
+            writer: Client stream writer
+            address: Client address
+            prefix: Header bytes already read from the stream
+        """
+        pending: Set[asyncio.Task] = set()
+        subscriptions: Set[asyncio.Task] = set()
+        
+        try:
+            while True:
+                frame = await read_frame_async(reader, prefix)
+                prefix = b''
+                if frame is None:
+                    break
+                
+                request = asyncio.ensure_future(self._respond_framed(writer, *frame, subscriptions))
+                pending.add(request)
+                request.add_done_callback(pending.discard)
+        
+        except FramingError as e:
+            self.logger.error(f'[IN_TASK] - Framing error from {address}: {e}')
+        except ConnectionError as e:
+            self.logger.warning(f'[IN_TASK] - Connection from {address} lost: {e}')
+        finally:
+            # Event streams only end with the connection
+            for subscription in subscriptions:
+                subscription.cancel()
+            if pending:
+                await asyncio.wait(pending, timeout=30)
+            self.logger.info(f'[IN_TASK] - Connection from {address} closed')
+    
+    async def _respond_framed(
+        self,
+        writer: asyncio.StreamWriter,
+        request_id: int,
+        codec: int,
+        payload: bytes,
+        subscriptions: Set[asyncio.Task]
+    ) -> None:
+        """
+        Run one framed request and write its response frame.
+        
+        Args:
+            writer: Client stream writer
+            request_id: Request identifier to echo
+            codec: Payload codec used by the request
+            payload: Serialized task
+            subscriptions: Event streams of the connection; a subscription
+                request adds itself while it streams
+        """
+        response: Any = 'KO'
+        
+        if not self.manager.accepts_codec(codec):
+            # Answering in the binary codec tells the client to switch
+            self.logger.warning(f'[IN_TASK] - Request #{request_id} in codec {codec} rejected')
+            codec = CODEC_BINARY
+        else:
+            try:
+                task = decode_payload(payload, codec)
+                self.logger.info(f'[IN_TASK] - Received task #{request_id}: {task}')
+                
+                if task.message == RELAY_SUBSCRIBE_MSG:
+                    subscription = asyncio.current_task()
+                    subscriptions.add(subscription)
+                    try:
+                        await self._stream_events(writer, request_id, codec)
+                    finally:
+                        subscriptions.discard(subscription)
+                    return
+                
+                response = await self.submit(task)
+            except Exception as e:
+                self.logger.error(f'[IN_TASK] - Request #{request_id} failed: {e}')
+        
+        try:
+            frame = encode_frame(request_id, encode_payload(response, codec), codec)
+        except (FramingError, CodecError):
+            frame = encode_frame(request_id, encode_payload('KO', codec), codec)
+        
+        if writer.is_closing():
+            return
+        
+        writer.write(frame)
+        try:
+            await writer.drain()
+            self.logger.info(f'[IN_TASK] - Sent response #{request_id}: {response}')
+        except ConnectionError as e:
+            self.logger.warning(f'[IN_TASK] - Failed to send response #{request_id}: {e}')
+    
+    async def _stream_events(self, writer: asyncio.StreamWriter, request_id: int, codec: int) -> None:
+        """
+        Write port state events to a subscriber until its connection closes.
+        
+        A subscriber that falls MAX_QUEUED_EVENTS behind is disconnected;
+        it starts again from a snapshot when it resubscribes.
+        
+        Args:
+            writer: Client stream writer
+            request_id: Request identifier every event frame echoes
+            codec: Payload codec used by the request
+        """
+        loop = asyncio.get_running_loop()
+        events: asyncio.Queue = asyncio.Queue(self.manager.MAX_QUEUED_EVENTS)
+        
+        def enqueue(event: Dict[str, Any]) -> None:
+            try:
+                events.put_nowait(event)
+            except asyncio.QueueFull:
+                if not writer.is_closing():
+                    self.logger.warning('[OUT_TASK] - Event subscriber fell behind, disconnecting')
+                    writer.close()
+        
+        # Published on board threads; hand over to the loop
+        token = self.manager.events.subscribe(
+            lambda event: loop.call_soon_threadsafe(enqueue, event)
+        )
+        try:
+            event = self.manager.event_snapshot()
+            while not writer.is_closing():
+                writer.write(encode_frame(request_id, encode_payload(event, codec), codec))
+                await writer.drain()
+                event = await events.get()
+        except ConnectionError:
+            pass
+        finally:
+            self.manager.events.unsubscribe(token)
+    
+    async def serve(self) -> None:
+        """Serve clients on the manager's listening sockets until stopped."""
+        self._loop = asyncio.get_running_loop()
+        
+        servers = []
+        if self.manager.socket:
+            self.manager.socket.setblocking(False)
+            servers.append(await asyncio.start_server(
+                self._handle_client,
+                sock=self.manager.socket,
+                backlog=self.manager.backlog
+            ))
+        if self.manager.unix_socket:
+            self.manager.unix_socket.setblocking(False)
+            servers.append(await asyncio.start_unix_server(
+                self._handle_client,
+                sock=self.manager.unix_socket,
+                backlog=self.manager.backlog
+            ))
+        self._servers = servers
+        self._started.set()
+        
+        try:
+            await asyncio.gather(*(server.serve_forever() for server in servers))
+        except asyncio.CancelledError:
+            pass
+        finally:
+            self._close_servers()
+    
+    def _close_servers(self) -> None:
+        """Stop accepting on every listening socket."""
+        for server in self._servers:
+            server.close()
+    
+    def run(self) -> None:
+        """Run the event loop in the calling thread until stopped."""
+        try:
+            asyncio.run(self.serve())
+        finally:
+            self._stopped.set()
+    
+    def wait_started(self, timeout: Optional[float] = None) -> bool:
+        """
+        Block until the server is accepting connections.
+        
+        Args:
+            timeout: Maximum wait time in seconds
+        
+        Returns:
+            True if the server started within timeout
+        """
+        return self._started.wait(timeout)
+    
+    def stop(self, timeout: float = 5.0) -> None:
+        """
+        Stop serving; safe to call from any thread.
+        
+        Args:
+            timeout: Maximum time to wait for the event loop to finish
+        """
+        loop = self._loop
+        if loop is None or not self._servers or self._stopped.is_set():
+            return
+        
+        try:
+            loop.call_soon_threadsafe(self._close_servers)
+        except RuntimeError:
+            return
+        
+        self._stopped.wait(timeout)
@@ -0,0 +1,508 @@
+# -*- coding: utf-8 -*-
+"""
+Relay Board Worker
+
+Per-board part of the server: one serial link, the priority scheduler in
+front of it and the model of the board's port state.
+"""
+
+import threading
+import time
+from concurrent.futures import Future
+from typing import Optional, Any, Dict
+
+from relay.hardware.serial_comm import SerialCommunicator, Response
+from relay.hardware.protocol import ErrorResponse
+from relay.hardware.link import SerialLinkSupervisor
+from relay.utils.relay_utils import Task, TaskBatch, Device, mask_ports
+from relay.constants import (
+    RELAY_DISCONNECT_MSG,
+    RELAY_CONNECT_MSG,
+    RELAY_DISCONNECT_MSG_SEC,
+    RELAY_CONNECT_MSG_SEC,
+    RELAY_GET_STATE_MSG,
+    RELAY_SET_STATE_MSG,
+    RELAY_GET_STATS_MSG,
+    RELAY_POWER_CYCLE_MSG,
+    RELAY_POWER_CYCLE_MSG_SEC,
+    RELAY_BATCH_MSG,
+    RELAY_DISCONNECT_MASK_MSG,
+    RELAY_CONNECT_MASK_MSG,
+    TASK_PRIORITY_LOW,
+)
+from relay.server.scheduler import TaskScheduler
+from relay.server.port_state import PortStateCache
+from relay.server.events import EventBus
+
+
+def _confirmed(response: Optional[Response]) -> bool:
+    """Whether the board acknowledged a command (no error status, no timeout)."""
+    return response is not None and not isinstance(response, ErrorResponse)
+
+
+class BoardWorker:
+    """
+    Serial worker for one relay board.
+    
+    Owns the board's serial link and the scheduler whose single worker
+    thread is the only one talking to it, so every board runs its
+    commands in parallel with the others. Port indexes in the tasks it
+    runs are local to the board.
+    """
+    
+    def __init__(
+        self,
+        board_id: int,
+        serial: SerialCommunicator,
+        config,
+        logger,
+        events: Optional[EventBus] = None
+    ):
+        """
+        Initialize board worker.
+        
+        Args:
+            board_id: Board number (0-based, in detection order)
+            serial: Open serial communicator for the board
+            config: Relay configuration
+            logger: Server logger
+            events: Bus to publish port state changes on
+        """
+        self.board_id = board_id
+        self.serial = serial
+        self.config = config
+        self.logger = logger
+        
+        # Priority scheduler in front of the serial link
+        self.scheduler = TaskScheduler(
+            self._execute_task,
+            aging_interval=config.server.aging_interval,
+            name=f'relay-board-{board_id}',
+            logger=logger
+        )
+        
+        # Single-flight state query shared by concurrent callers
+        self._state_query: Optional[Future] = None
+        self._state_query_priority = TASK_PRIORITY_LOW
+        self._state_query_lock = threading.Lock()
+        self._coalesced_queries = 0
+        
+        # Write-through port state model
+        self.events = events
+        self.port_states = PortStateCache(on_change=self._publish if events else None)
+        
+        # Reopens the adapter when the link drops
+        self.link = SerialLinkSupervisor(
+            serial,
+            max_backoff=config.server.link_max_backoff,
+            on_recover=self.resync_port_states,
+            logger=logger
+        )
+    
+    def submit(self, task: Task) -> Future:
+        """
+        Submit a task for execution on this board.
+        
+        State queries are answered from the port state cache while it is fresh; otherwise
+        they share any read of the same or higher priority already queued
+        or running instead of adding another one. Power cycles are split into an OFF and a delayed ON
+        command. A batch is queued as one scheduler entry. Every other task
+        is queued on the scheduler by priority.
+        
+        Args:
+            task: Task to run
+        
+        Returns:
+            Future resolved with the response
+        """
+        if task.message == RELAY_GET_STATE_MSG:
+            bindings = self.port_states.get_bindings(self.config.server.state_cache_max_age)
+            if bindings is not None:
+                future: Future = Future()
+                future.set_result(str(bindings))
+                return future
+            
+            return self._submit_state_query(task)
+        
+        if task.message in (RELAY_POWER_CYCLE_MSG, RELAY_POWER_CYCLE_MSG_SEC):
+            return self._submit_power_cycle(task)
+        
+        if task.message == RELAY_BATCH_MSG:
+            return self._submit_batch(task)
+        
+        return self.scheduler.submit(task)
+    
+    def _submit_power_cycle(self, task: Task) -> Future:
+        """
+        Run a power cycle as one scheduled unit.
+        
+        The OFF command is scheduled at the task's priority; once it
+        succeeds, the ON command is put on the scheduler's timer for the
+        requested off time. The serial link is free in between, so other
+        ports' commands keep running.
+        
+        Args:
+            task: RELAY_POWER_CYCLE_MSG or RELAY_POWER_CYCLE_MSG_SEC task
+        
+        Returns:
+            Future resolved with 'OK' once power is back on, else 'KO'
+        """
+        if task.message == RELAY_POWER_CYCLE_MSG:
+            off_message, on_message = RELAY_DISCONNECT_MSG, RELAY_CONNECT_MSG
+        else:
+            off_message, on_message = RELAY_DISCONNECT_MSG_SEC, RELAY_CONNECT_MSG_SEC
+        
+        off_time = min(max(getattr(task, 'off_time', 1.0), 0.0), self.config.server.max_off_time)
+        result: Future = Future()
+        
+        def on_done(future: Future) -> None:
+            ok = future.exception() is None and future.result() == 'OK'
+            result.set_result('OK' if ok else 'KO')
+        
+        def off_done(future: Future) -> None:
+            if future.exception() is not None or future.result() != 'OK':
+                result.set_result('KO')
+                return
+            
+            on_task = Task(task.device, on_message, task.priority)
+            self.scheduler.submit(on_task, delay=off_time).add_done_callback(on_done)
+        
+        off_task = Task(task.device, off_message, task.priority)
+        self.scheduler.submit(off_task).add_done_callback(off_done)
+        
+        return result
+    
+    def _submit_batch(self, batch: TaskBatch) -> Future:
+        """
+        Queue a batch as a single scheduler entry.
+        
+        A non-atomic batch gives up the serial link between tasks when a
+        more urgent task is waiting; its remaining tasks are then queued
+        again at the batch priority. An atomic batch keeps the link until
+        its last task has run.
+        
+        Args:
+            batch: TaskBatch to run
+        
+        Returns:
+            Future resolved with the list of per-task responses, in order;
+            tasks skipped after a failure get None
+        """
+        result: Future = Future()
+        responses: list = []
+        
+        def step_done(future: Future) -> None:
+            if future.exception() is not None:
+                responses.extend([None] * (len(batch) - len(responses)))
+            else:
+                responses.extend(future.result())
+            
+            if len(responses) < len(batch):
+                rest = TaskBatch(
+                    batch.tasks[len(responses):],
+                    batch.stop_on_failure,
+                    batch.atomic,
+                    batch.priority
+                )
+                self.scheduler.submit(rest).add_done_callback(step_done)
+            else:
+                result.set_result(responses)
+        
+        self.scheduler.submit(batch).add_done_callback(step_done)
+        return result
+    
+    def _submit_state_query(self, task: Task) -> Future:
+        """
+        Submit a state query, joining one already in flight.
+        
+        Only an in-flight query of the same or a more urgent priority is
+        joined; a more urgent query is queued on its own and later
+        queries join it instead.
+        
+        Args:
+            task: RELAY_GET_STATE_MSG task
+        
+        Returns:
+            Future of the (possibly shared) state read
+        """
+        with self._state_query_lock:
+            if (
+                self._state_query is not None
+                and not self._state_query.done()
+                and self._state_query_priority <= task.priority
+            ):
+                self._coalesced_queries += 1
+                self.logger.debug(f'[IN_TASK] - Joined in-flight state query: {task}')
+                return self._state_query
+            
+            self._state_query = self.scheduler.submit(task)
+            self._state_query_priority = task.priority
+            return self._state_query
+    
+    def get_stats(self) -> Dict[str, Any]:
+        """
+        Get board statistics.
+        
+        Returns:
+            Scheduler queue depth, per-priority wait times, the number of
+            state queries served by an in-flight read, the port state
+            cache snapshot, link state and command pacing
+        """
+        stats = self.scheduler.stats()
+        stats['coalesced_state_queries'] = self._coalesced_queries
+        stats['port_states'] = self.port_states.snapshot()
+        stats['link'] = self.link.stats()
+        stats['pacing'] = self.serial.pacing.stats() if self.serial.pacing else None
+        return stats
+    
+    def resync_port_states(self) -> Future:
+        """
+        Schedule a low priority state read to refresh the port state cache.
+        
+        Returns:
+            Future of the state read
+        """
+        task = Task(Device('server'), RELAY_GET_STATE_MSG, TASK_PRIORITY_LOW)
+        return self._submit_state_query(task)
+    
+    def _execute_task(self, task: Task) -> str:
+        """
+        Execute a single task on the serial link.
+        
+        Args:
+            task: Task to execute
+        
+        Returns:
+            Response string ('OK', 'KO' or state data)
+        """
+        if task.message == RELAY_BATCH_MSG:
+            return self._execute_batch(task)
+        
+        first_failure = None
+        
+        while True:
+            if not self._wait_for_link():
+                self.logger.error(f'[OUT_TASK] - Serial link down, failing task "{task}"')
+                return 'KO'
+            
+            try:
+                response = self._process_task(task)
+                self.logger.info(f'[OUT_TASK] - Finished task "{task}"')
+                return response
+            except OSError as e:
+                # Adapter gone: reopen it and replay the task once it is back
+                self.port_states.invalidate()
+                self.link.link_lost(e)
+                
+                first_failure = first_failure or time.monotonic()
+                if time.monotonic() - first_failure > self.config.server.link_retry_deadline:
+                    self.logger.error(f'[OUT_TASK] - Giving up on task "{task}": {e}')
+                    return 'KO'
+            except Exception as e:
+                self.logger.error(f'[OUT_TASK] - Task failed: {e}', exc_info=True)
+                
+                # The board may not be in the state we think; read it back
+                self.port_states.invalidate()
+                if task.message != RELAY_GET_STATE_MSG:
+                    self.resync_port_states()
+                
+                return 'KO'
+    
+    def _wait_for_link(self) -> bool:
+        """
+        Make sure the serial link is up before running a task.
+        
+        While the link is down, tasks wait for the reconnect until
+        ``link_retry_deadline`` seconds after the link was lost; later
+        tasks fail at once until the link is back.
+        
+        Returns:
+            True if the link is up
+        """
+        if self.link.is_up and self.serial.is_open:
+            return True
+        
+        if self.link.is_up:
+            self.link.link_lost(RuntimeError('Serial port closed'))
+        elif not self.link.down_for:
+            self.link.link_lost()
+        
+        return self.link.wait_until_up(self.config.server.link_retry_deadline - self.link.down_for)
+    
+    def _execute_batch(self, batch: TaskBatch) -> list:
+        """
+        Run the tasks of a batch back to back on the serial link.
+        
+        Args:
+            batch: TaskBatch to run
+        
+        Returns:
+            Responses of the tasks run so far; shorter than the batch if a
+            non-atomic batch yielded to a more urgent task
+        """
+        responses: list = []
+        
+        for position, task in enumerate(batch.tasks):
+            if position and not batch.atomic and self.scheduler.has_waiting(batch.priority):
+                self.logger.debug(f'[OUT_TASK] - Batch yielding after {position} tasks')
+                break
+            
+            response = self._execute_batch_task(task)
+            responses.append(response)
+            
+            if batch.stop_on_failure and response == 'KO':
+                self.logger.warning(f'[OUT_TASK] - Batch stopped at task "{task}"')
+                responses.extend([None] * (len(batch) - len(responses)))
+                break
+        
+        return responses
+    
+    def _execute_batch_task(self, task: Task) -> Any:
+        """
+        Run one task of a batch on the worker thread.
+        
+        Args:
+            task: Task to run
+        
+        Returns:
+            Response of the task
+        """
+        message = task.message
+        
+        if message == RELAY_GET_STATS_MSG:
+            return self.get_stats()
+        
+        if message == RELAY_GET_STATE_MSG:
+            bindings = self.port_states.get_bindings(self.config.server.state_cache_max_age)
+            if bindings is not None:
+                return str(bindings)
+        
+        elif message in (RELAY_POWER_CYCLE_MSG, RELAY_POWER_CYCLE_MSG_SEC):
+            # Inside a batch the link is held for the whole off time
+            if message == RELAY_POWER_CYCLE_MSG:
+                off_message, on_message = RELAY_DISCONNECT_MSG, RELAY_CONNECT_MSG
+            else:
+                off_message, on_message = RELAY_DISCONNECT_MSG_SEC, RELAY_CONNECT_MSG_SEC
+            
+            if self._execute_task(Task(task.device, off_message, task.priority)) != 'OK':
+                return 'KO'
+            time.sleep(min(max(getattr(task, 'off_time', 1.0), 0.0), self.config.server.max_off_time))
+            return self._execute_task(Task(task.device, on_message, task.priority))
+        
+        elif message == RELAY_BATCH_MSG:
+            self.logger.warning('Nested batches are not supported')
+            return 'KO'
+        
+        return self._execute_task(task)
+    
+    def _process_task(self, task: Task) -> str:
+        """
+        Process a relay control task.
+        
+        Successful commands are written through to the port state cache.
+        A command the board answers with an error status, or does not
+        answer before the deadline, fails and the affected port's state
+        is forgotten.
+        
+        Args:
+            task: Task to process
+        
+        Returns:
+            Response string ('OK' or state data)
+        """
+        message = task.message
+        index = task.index
+        value = task.value
+        
+        self.logger.debug(f'Processing task: message={message}, index={index}, value={value}')
+        
+        # Handle different message types
+        if message == RELAY_DISCONNECT_MSG:
+            if not _confirmed(self.serial.usb_off(index)):
+                self.port_states.invalidate(port_index=index)
+                return 'KO'
+            self.port_states.set_power(index, False)
+            return 'OK'
+        
+        elif message == RELAY_CONNECT_MSG:
+            if not _confirmed(self.serial.usb_on(index)):
+                self.port_states.invalidate(port_index=index)
+                return 'KO'
+            self.port_states.set_power(index, True)
+            return 'OK'
+        
+        elif message == RELAY_SET_STATE_MSG:
+            if not _confirmed(self.serial.set_port_state(index, value)):
+                self.port_states.invalidate()
+                return 'KO'
+            self.port_states.set_binding(index, value)
+            return 'OK'
+        
+        elif message == RELAY_GET_STATE_MSG:
+            states = self.serial.get_all_port_states()
+            if states:
+                self.port_states.update_from_board(states)
+            return str(states)
+        
+        elif message in (RELAY_CONNECT_MASK_MSG, RELAY_DISCONNECT_MASK_MSG):
+            on = message == RELAY_CONNECT_MASK_MSG
+            
+            # The port mask travels in the hub value field
+            mask = value
+            if self.config.server.mask_skip_known:
+                mask = self.port_states.ports_to_switch(value, on)
+                if mask != value:
+                    self.logger.debug(f'Skipping ports already {"on" if on else "off"}: '
+                                      f'{mask_ports(value & ~mask)}')
+            
+            ok = True
+            for port, response in self.serial.switch_ports(mask, on).items():
+                if not _confirmed(response):
+                    ok = False
+                    self.port_states.invalidate(port_index=port)
+                else:
+                    self.port_states.set_power(port, on)
+            return 'OK' if ok else 'KO'
+        
+        elif message == RELAY_DISCONNECT_MSG_SEC:
+            if not _confirmed(self.serial.usb_off_by_value(value)):
+                self.port_states.invalidate(hub_value=value)
+                return 'KO'
+            self.port_states.set_hub_power(value, False)
+            return 'OK'
+        
+        elif message == RELAY_CONNECT_MSG_SEC:
+            if not _confirmed(self.serial.usb_on_by_value(value)):
+                self.port_states.invalidate(hub_value=value)
+                return 'KO'
+            self.port_states.set_hub_power(value, True)
+            return 'OK'
+        
+        else:
+            self.logger.warning(f'Unknown message type: {message}')
+            return 'KO'
+    
+    def _publish(self, event: Dict[str, Any]) -> None:
+        """Publish a port state change of this board."""
+        event['board'] = self.board_id
+        self.events.publish(event)
+    
+    def start(self) -> None:
+        """Start the scheduler and read the board's port states."""
+        self.link.start()
+        self.scheduler.start()
+        self.resync_port_states()
+    
+    def stop(self) -> None:
+        """Stop reconnecting, stop the scheduler and fail all waiting tasks."""
+        self.link.stop()
+        self.scheduler.stop()
+    
+    def close(self) -> None:
+        """Close the serial link."""
+        if self.serial:
+            self.serial.close()
+    
+    def __repr__(self):
+        """String representation."""
+        return f'BoardWorker(board_id={self.board_id}, serial={self.serial})'
@@ -0,0 +1,788 @@
+# -*- coding: utf-8 -*-
+"""
+Relay Engine
+
+Runs relay tasks on the relay boards attached to this host: opens the
+boards, routes every task to its board's serial worker and keeps the
+port state models, command pacing and UART trace. The relay server
+serves it over sockets; on a machine without a server it can also run
+embedded in the process that needs the relays (see get_shared_engine).
+"""
+
+import atexit
+import functools
+import logging
+import os
+import threading
+import time
+from concurrent.futures import Future, TimeoutError as FutureTimeoutError
+from typing import Optional, Any, Dict, List, Tuple, Union
+
+from relay.hardware.serial_comm import SerialCommunicator, PortIdentity
+from relay.hardware.trace import UartTraceRecorder
+from relay.hardware.discovery import BoardDiscovery
+from relay.hardware.board_lock import BoardLock, BoardLockError, board_lock_path
+from relay.hardware.pacing import CommandPacing, pacing_key, load_pacing, save_pacing
+from relay.utils.relay_utils import Task, TaskBatch, Device, parse_port_states, task_off_time
+from relay.constants import (
+    RELAY_DISCONNECT_MSG_SEC,
+    RELAY_CONNECT_MSG_SEC,
+    RELAY_GET_STATE_MSG,
+    RELAY_GET_STATS_MSG,
+    RELAY_POWER_CYCLE_MSG_SEC,
+    RELAY_BATCH_MSG,
+    RELAY_DISCONNECT_MASK_MSG,
+    RELAY_CONNECT_MASK_MSG,
+    RELAY_SUBSCRIBE_MSG,
+)
+from relay.core.config import ConfigManager, LoggerFactory
+from relay.server.board import BoardWorker
+from relay.server.events import EventBus
+from relay.server.port_state import PortStateCache
+from relay.server.scheduler import TaskScheduler
+
+
+class RelayEngine:
+    """
+    Relay task execution for the boards attached to this host.
+    
+    Every board has its own serial link behind its own priority
+    scheduler, so boards run in parallel while each serial port only
+    sees one command at a time.
+    
+    Tasks are routed by ``Task.board`` when set, else by global port
+    number: with ``ServerConfig.ports_per_board`` ports per board, global
+    port ``n`` is local port ``(n - 1) % ports_per_board + 1`` of board
+    ``(n - 1) // ports_per_board``. Commands by hub value go to the board
+    the hub is bound on, mask commands are split into one command per
+    board. With a single board no mapping is applied.
+    
+    Boards the engine opens itself are locked against other processes
+    for as long as it runs (``ServerConfig.board_lock``), so a relay
+    server and an embedded engine never drive the same board. If any
+    board is locked elsewhere the engine does not start.
+    """
+    
+    def __init__(
+        self,
+        serial: Union[SerialCommunicator, List[SerialCommunicator], None] = None,
+        trace_file: Optional[str] = None,
+        logger: Optional[logging.Logger] = None
+    ):
+        """
+        Initialize relay engine.
+        
+        Args:
+            serial: Pre-opened serial communicator, or one per board
+                (default: open and lock every detected board)
+            trace_file: Binary UART trace file (default: from config,
+                disabled if empty)
+            logger: Logger (default: console logger 'relay.engine')
+        
+        Raises:
+            ValueError: If no board could be opened
+            BoardLockError: If a board is in use by another process
+        """
+        self.config_manager = ConfigManager()
+        self.config = self.config_manager.config
+        
+        self.logger = logger or LoggerFactory.get_logger('relay.engine')
+        self.timeout = 5.0
+        self._running = False
+        self._stopped = False
+        self._stop_lock = threading.Lock()
+        
+        # Cross-process locks of the boards opened here
+        self._board_locks: List[BoardLock] = []
+        
+        # One worker per relay board
+        if serial is None:
+            serials = self._open_boards()
+        elif isinstance(serial, (list, tuple)):
+            serials = list(serial)
+        else:
+            serials = [serial]
+        
+        if self.config.server.mask_frames:
+            for board_serial in serials:
+                board_serial.mask_frames = True
+        
+        # Adaptive command pacing, starting from what earlier runs learned
+        learned = load_pacing(self.config.serial.pacing_file)
+        for board_serial in serials:
+            if board_serial.pacing is None:
+                board_serial.pacing = CommandPacing.from_config(self.config.serial)
+                board_serial.pacing.load(
+                    learned.get(pacing_key(board_serial.port, board_serial.identity), [])
+                )
+        
+        # Port state changes of all boards, for subscribers
+        self.events = EventBus(self.logger)
+        
+        self.boards: List[BoardWorker] = [
+            BoardWorker(board_id, board_serial, self.config, self.logger, self.events)
+            for board_id, board_serial in enumerate(serials)
+        ]
+        
+        # Raw frame trace shared by all boards, one channel per board
+        self.uart_trace: Optional[UartTraceRecorder] = None
+        trace_file = trace_file or self.config.server.uart_trace_file
+        if trace_file:
+            self.uart_trace = UartTraceRecorder(
+                trace_file,
+                capacity=self.config.server.uart_trace_capacity,
+                logger=self.logger
+            )
+            for board_id, board_serial in enumerate(serials):
+                board_serial.recorder = self.uart_trace
+                board_serial.trace_channel = board_id
+        
+        # Periodic resync of the port state models
+        self._resync_stop = threading.Event()
+        self._resync_thread: Optional[threading.Thread] = None
+    
+    def _open_boards(self) -> List[SerialCommunicator]:
+        """
+        Lock and open every detected relay board.
+        
+        Boards known from the discovery cache are reopened without a port
+        scan; a stale cache falls back to scanning. Every board is locked
+        before its port is opened.
+        
+        Returns:
+            Serial communicators, in stable board order
+        
+        Raises:
+            ValueError: If no board could be opened
+            BoardLockError: If a board is in use by another process
+        """
+        def open_port(port_name: str, identity: Optional[PortIdentity]) -> SerialCommunicator:
+            lock = self._lock_board(port_name, identity)
+            try:
+                return SerialCommunicator(
+                    f'server.{os.path.basename(port_name)}', port=port_name, identity=identity
+                )
+            except Exception:
+                self._release_board(lock)
+                raise
+        
+        discovery = BoardDiscovery(self.config.server.board_cache_file or None, logger=self.logger)
+        try:
+            # A partial set of boards would number the ports differently,
+            # so one board in use elsewhere keeps the engine from starting
+            serials = discovery.open_boards(open_port)
+        except BoardLockError as e:
+            self._release_boards()
+            self.logger.error(f'Failed to initialize serial: {e}')
+            raise
+        except Exception:
+            self._release_boards()
+            raise
+        
+        if not serials:
+            self._release_boards()
+            self.logger.error('Failed to initialize serial: no relay board found')
+            raise ValueError('No serial ports found for relay communication')
+        
+        self.logger.info(f'Opened {len(serials)} relay board(s)')
+        return serials
+    
+    def _lock_board(self, port_name: str, identity: Optional[PortIdentity]) -> Optional[BoardLock]:
+        """
+        Take the cross-process lock of a board, if locking is enabled.
+        
+        Args:
+            port_name: Port name of the board
+            identity: USB identity of the board's adapter
+        
+        Returns:
+            Lock held, or None if locking is disabled
+        
+        Raises:
+            BoardLockError: If another process holds the lock
+        """
+        path = board_lock_path(self.config.server.board_lock, pacing_key(port_name, identity))
+        if path is None:
+            return None
+        
+        lock = BoardLock(path)
+        lock.acquire()
+        self._board_locks.append(lock)
+        return lock
+    
+    def _release_board(self, lock: Optional[BoardLock]) -> None:
+        """Release one board lock taken by _lock_board."""
+        if lock is None:
+            return
+        lock.release()
+        if lock in self._board_locks:
+            self._board_locks.remove(lock)
+    
+    def _release_boards(self) -> None:
+        """Release every board lock."""
+        locks, self._board_locks = self._board_locks, []
+        for lock in locks:
+            lock.release()
+    
+    @property
+    def serial(self) -> SerialCommunicator:
+        """Serial communicator of the first board."""
+        return self.boards[0].serial
+    
+    @property
+    def scheduler(self) -> TaskScheduler:
+        """Task scheduler of the first board."""
+        return self.boards[0].scheduler
+    
+    @property
+    def port_states(self) -> PortStateCache:
+        """Port state cache of the first board."""
+        return self.boards[0].port_states
+    
+    def submit(self, task: Task) -> Future:
+        """
+        Submit a task for execution.
+        
+        Statistics requests are answered immediately. A state query
+        without a board reads every board and returns the port states of
+        all of them in global port order; a mask command without a board
+        switches the ports of every board it covers in parallel. Every
+        other task is routed to its board (see BoardWorker.submit).
+        
+        Args:
+            task: Task to run
+        
+        Returns:
+            Future resolved with the response
+        """
+        if task.message == RELAY_GET_STATS_MSG:
+            future: Future = Future()
+            future.set_result(self.get_stats())
+            return future
+        
+        if task.message == RELAY_SUBSCRIBE_MSG:
+            # Only a framed connection can carry the event stream
+            self.logger.warning(f'[IN_TASK] - Subscription outside a framed connection: {task}')
+            future = Future()
+            future.set_result('KO')
+            return future
+        
+        if len(self.boards) == 1:
+            return self.boards[0].submit(task)
+        
+        if task.message == RELAY_GET_STATE_MSG and getattr(task, 'board', None) is None:
+            return self._submit_state_query_all(task)
+        
+        if task.message == RELAY_BATCH_MSG:
+            return self._submit_batch(task)
+        
+        if (task.message in (RELAY_CONNECT_MASK_MSG, RELAY_DISCONNECT_MASK_MSG)
+                and getattr(task, 'board', None) is None):
+            return self._submit_mask(task)
+        
+        board, routed = self._route(task)
+        if board is None:
+            future = Future()
+            future.set_result('KO')
+            return future
+        
+        return board.submit(routed)
+    
+    def _route(self, task: Task) -> Tuple[Optional[BoardWorker], Task]:
+        """
+        Find the board for a task.
+        
+        Args:
+            task: Task addressed by board id, global port, hub value or
+                port mask
+        
+        Returns:
+            Tuple of (board, task with a board-local port index or mask);
+            board is None if the task cannot be routed, such as a mask
+            spanning several boards
+        """
+        board_id = getattr(task, 'board', None)
+        index = task.index
+        value = task.value
+        
+        if board_id is None:
+            if task.message in (RELAY_CONNECT_MASK_MSG, RELAY_DISCONNECT_MASK_MSG):
+                masks = self._split_mask(task.value)
+                if len(masks) == 1:
+                    (board_id, value), = masks.items()
+            elif task.message in (
+                RELAY_CONNECT_MSG_SEC, RELAY_DISCONNECT_MSG_SEC, RELAY_POWER_CYCLE_MSG_SEC
+            ):
+                board_id = self._find_hub_board(task.value)
+            elif task.message == RELAY_GET_STATE_MSG:
+                board_id = None
+            else:
+                board_id, local = divmod(index - 1, self.config.server.ports_per_board)
+                index = local + 1
+        
+        if board_id is None or not 0 <= board_id < len(self.boards):
+            self.logger.warning(f'[IN_TASK] - No relay board for task "{task}"')
+            return None, task
+        
+        if index == task.index and value == task.value:
+            return self.boards[board_id], task
+        
+        device = Device(task.device.serial_no, index, value)
+        routed = Task(device, task.message, task.priority, getattr(task, 'off_time', 1.0), board_id)
+        return self.boards[board_id], routed
+    
+    def _split_mask(self, port_mask: int) -> Dict[int, int]:
+        """
+        Split a mask of global ports into board-local masks.
+        
+        Args:
+            port_mask: Global ports, bit n-1 for port n
+        
+        Returns:
+            Dictionary of board id to local port mask
+        """
+        ports_per_board = self.config.server.ports_per_board
+        board_mask = (1 << ports_per_board) - 1
+        
+        masks = {}
+        board_id = 0
+        while port_mask:
+            if port_mask & board_mask:
+                masks[board_id] = port_mask & board_mask
+            port_mask >>= ports_per_board
+            board_id += 1
+        return masks
+    
+    def _submit_mask(self, task: Task) -> Future:
+        """
+        Split a mask command by board and run the parts in parallel.
+        
+        Args:
+            task: RELAY_CONNECT_MASK_MSG or RELAY_DISCONNECT_MASK_MSG task
+                with a mask of global ports
+        
+        Returns:
+            Future resolved with 'OK' if every board switched its ports,
+            else 'KO'
+        """
+        masks = self._split_mask(task.value)
+        result: Future = Future()
+        
+        if not masks or max(masks) >= len(self.boards):
+            self.logger.warning(f'[IN_TASK] - No relay board for task "{task}"')
+            result.set_result('KO')
+            return result
+        
+        futures = [
+            self.boards[board_id].submit(Task(
+                Device(task.device.serial_no, task.index, mask),
+                task.message,
+                task.priority,
+                getattr(task, 'off_time', 1.0),
+                board_id
+            ))
+            for board_id, mask in masks.items()
+        ]
+        remaining = [len(futures)]
+        lock = threading.Lock()
+        
+        def board_done(_: Future) -> None:
+            with lock:
+                remaining[0] -= 1
+                if remaining[0]:
+                    return
+            
+            ok = all(future.exception() is None and future.result() == 'OK' for future in futures)
+            result.set_result('OK' if ok else 'KO')
+        
+        for future in futures:
+            future.add_done_callback(board_done)
+        return result
+    
+    def _find_hub_board(self, hub_value: int) -> int:
+        """
+        Find the board a hub value is bound on.
+        
+        Args:
+            hub_value: USB hub ID value
+        
+        Returns:
+            Board id; the first board if no cached binding matches
+        """
+        wanted = f'{hub_value:02x}'
+        
+        for board in self.boards:
+            bindings = board.port_states.get_bindings(self.config.server.state_resync_interval)
+            if bindings and wanted in bindings:
+                return board.board_id
+        
+        self.logger.warning(f'Hub [0x{hub_value:02x}] not bound on any board, using board 0')
+        return 0
+    
+    def _submit_state_query_all(self, task: Task) -> Future:
+        """
+        Query the port states of every board.
+        
+        Args:
+            task: RELAY_GET_STATE_MSG task without a board
+        
+        Returns:
+            Future resolved with the states of all ports in global order,
+            or 'KO' if any board failed
+        """
+        futures = [board.submit(task) for board in self.boards]
+        result: Future = Future()
+        remaining = [len(futures)]
+        lock = threading.Lock()
+        
+        def board_done(_: Future) -> None:
+            with lock:
+                remaining[0] -= 1
+                if remaining[0]:
+                    return
+            
+            states: List[str] = []
+            for future in futures:
+                response = future.result() if future.exception() is None else 'KO'
+                board_states = parse_port_states(response)
+                if not board_states:
+                    result.set_result('KO')
+                    return
+                states.extend(board_states)
+            result.set_result(str(states))
+        
+        for future in futures:
+            future.add_done_callback(board_done)
+        return result
+    
+    def _submit_batch(self, batch: TaskBatch) -> Future:
+        """
+        Split a batch by board and run the parts in parallel.
+        
+        Stop-on-failure and atomicity apply within each board. Tasks that
+        cannot be routed to a single board, such as state queries without
+        a board id or masks spanning several boards, are answered with 'KO'.
+        
+        Args:
+            batch: TaskBatch to run
+        
+        Returns:
+            Future resolved with the list of per-task responses, in order
+        """
+        responses: List[Any] = ['KO'] * len(batch)
+        parts: Dict[int, List[Tuple[int, Task]]] = {}
+        
+        for position, task in enumerate(batch.tasks):
+            board, routed = self._route(task)
+            if board is not None:
+                parts.setdefault(board.board_id, []).append((position, routed))
+        
+        result: Future = Future()
+        if not parts:
+            result.set_result(responses)
+            return result
+        
+        remaining = [len(parts)]
+        lock = threading.Lock()
+        
+        def part_done(positions: List[int], future: Future) -> None:
+            if future.exception() is None:
+                for position, response in zip(positions, future.result()):
+                    responses[position] = response
+            
+            with lock:
+                remaining[0] -= 1
+                if remaining[0]:
+                    return
+            result.set_result(responses)
+        
+        for board_id, part in parts.items():
+            positions = [position for position, _ in part]
+            sub_batch = TaskBatch(
+                [task for _, task in part],
+                batch.stop_on_failure,
+                batch.atomic,
+                batch.priority
+            )
+            future = self.boards[board_id].submit(sub_batch)
+            future.add_done_callback(functools.partial(part_done, positions))
+        
+        return result
+    
+    def get_stats(self) -> Dict[str, Any]:
+        """
+        Get server statistics.
+        
+        Returns:
+            Scheduler queue depth, per-priority wait times, the number of
+            state queries served by an in-flight read and the port state
+            cache snapshot. With several boards the counters are summed
+            over all boards and 'boards' holds the statistics of each.
+        """
+        boards = [board.get_stats() for board in self.boards]
+        if len(boards) == 1:
+            return boards[0]
+        
+        waiting: Dict[int, int] = {}
+        wait_times: Dict[int, Dict[str, float]] = {}
+        for stats in boards:
+            for priority, count in stats['waiting'].items():
+                waiting[priority] = waiting.get(priority, 0) + count
+            
+            for priority, wait in stats['wait_times'].items():
+                merged = wait_times.setdefault(
+                    priority, {'count': 0, 'avg_wait': 0.0, 'max_wait': 0.0, 'last_wait': 0.0}
+                )
+                count = merged['count'] + wait['count']
+                merged['avg_wait'] = (
+                    merged['avg_wait'] * merged['count'] + wait['avg_wait'] * wait['count']
+                ) / count
+                merged['count'] = count
+                merged['max_wait'] = max(merged['max_wait'], wait['max_wait'])
+                merged['last_wait'] = wait['last_wait']
+        
+        return {
+            'depth': sum(stats['depth'] for stats in boards),
+            'delayed': sum(stats['delayed'] for stats in boards),
+            'max_depth': max(stats['max_depth'] for stats in boards),
+            'dispatched': sum(stats['dispatched'] for stats in boards),
+            'waiting': dict(sorted(waiting.items())),
+            'wait_times': dict(sorted(wait_times.items())),
+            'coalesced_state_queries': sum(stats['coalesced_state_queries'] for stats in boards),
+            'boards': boards,
+        }
+    
+    def event_snapshot(self) -> Dict[str, Any]:
+        """
+        Get the first event of a subscription.
+        
+        Returns:
+            'snapshot' event with the bindings and known port power of
+            every board, and the sequence number of the last event
+            published before it
+        """
+        return {
+            'event': 'snapshot',
+            'boards': [dict(board.port_states.state(), board=board.board_id) for board in self.boards],
+            'seq': self.events.published,
+            'time': time.time(),
+        }
+    
+    def resync_port_states(self) -> List[Future]:
+        """
+        Schedule a low priority state read on every board.
+        
+        Returns:
+            Futures of the state reads, one per board
+        """
+        return [board.resync_port_states() for board in self.boards]
+    
+    def _resync_loop(self) -> None:
+        """Refresh the port state caches every state_resync_interval seconds."""
+        interval = self.config.server.state_resync_interval
+        
+        while not self._resync_stop.wait(interval):
+            self.logger.debug('Resyncing port states from boards')
+            self.resync_port_states()
+    
+    def _start_workers(self) -> None:
+        """Start the board workers, the periodic resync and the UART trace."""
+        if self.uart_trace:
+            self.uart_trace.start()
+        
+        for board in self.boards:
+            board.start()
+        
+        if self.config.server.state_resync_interval > 0:
+            self._resync_stop.clear()
+            self._resync_thread = threading.Thread(
+                target=self._resync_loop,
+                name='relay-resync',
+                daemon=True
+            )
+            self._resync_thread.start()
+    
+    def _stop_workers(self) -> None:
+        """Stop the periodic resync and the board schedulers."""
+        self._resync_stop.set()
+        self._resync_thread = None
+        for board in self.boards:
+            board.stop()
+    
+    def start(self) -> None:
+        """Start the board workers; tasks can be submitted from now on."""
+        if self._running:
+            return
+        
+        self._running = True
+        self._start_workers()
+        self.logger.info(f'Relay engine started with {len(self.boards)} board(s)')
+    
+    def send_request(self, task: Task, timeout: Optional[float] = None) -> Optional[Any]:
+        """
+        Run a task and wait for its response.
+        
+        Same interface as RelayClient.send_request, so callers can use
+        an embedded engine in place of a client. The engine is started
+        on first use.
+        
+        Args:
+            task: Task to run
+            timeout: Timeout in seconds (default: 5.0 seconds, plus the
+                off time of power cycles)
+        
+        Returns:
+            Response of the task or None if failed or timed out
+        """
+        if not self._running:
+            self.start()
+        
+        self.logger.info(f'[OUT_TASK] - Running task in process: {task}')
+        future = self.submit(task)
+        try:
+            response = future.result((timeout or self.timeout) + task_off_time(task))
+        except FutureTimeoutError:
+            self.logger.error(f'[OUT_TASK] - Task timed out: {task}')
+            return None
+        except Exception as e:
+            self.logger.error(f'[OUT_TASK] - Task failed: {e}')
+            return None
+        
+        self.logger.info(f'[OUT_TASK] - Response: {response}')
+        return response
+    
+    def stop(self) -> None:
+        """
+        Stop the board workers, close the boards and release their locks.
+        
+        Only the first call does anything, so stop(), the shared engine's
+        exit hook and garbage collection save the learned pacing once.
+        """
+        if self._claim_stop():
+            self._release()
+    
+    def _claim_stop(self) -> bool:
+        """
+        Mark the engine stopped.
+        
+        Returns:
+            True for the one caller that gets to run the shutdown; False if
+            the engine was already stopped or never finished __init__
+        """
+        lock = getattr(self, '_stop_lock', None)
+        if lock is None:
+            return False
+        
+        with lock:
+            if self._stopped:
+                return False
+            self._stopped = True
+        
+        self._running = False
+        return True
+    
+    def _release(self) -> None:
+        """Stop the board workers, close the boards and release their locks."""
+        if hasattr(self, '_resync_stop'):
+            self._stop_workers()
+        
+        self._save_pacing()
+        
+        for board in getattr(self, 'boards', []):
+            board.close()
+        
+        if getattr(self, 'uart_trace', None):
+            self.uart_trace.close()
+        
+        if getattr(self, '_board_locks', None):
+            self._release_boards()
+    
+    def _save_pacing(self) -> None:
+        """Persist the latencies learned by every board's pacing."""
+        learned = {
+            pacing_key(board.serial.port, board.serial.identity): board.serial.pacing.samples()
+            for board in getattr(self, 'boards', [])
+            if board.serial.pacing is not None
+        }
+        if learned:
+            save_pacing(self.config.serial.pacing_file, learned)
+    
+    def __enter__(self):
+        """Context manager entry."""
+        self.start()
+        return self
+    
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        """Context manager exit."""
+        self.stop()
+        return False
+    
+    def __del__(self):
+        """Cleanup on deletion."""
+        self.stop()
+    
+    def __repr__(self):
+        """String representation."""
+        return f'RelayEngine(boards={len(getattr(self, "boards", []))}, running={self._running})'
+
+
+# Seconds before a process whose boards were in use tries again
+ENGINE_RETRY_INTERVAL = 30.0
+
+_shared_engine: Optional[RelayEngine] = None
+_shared_retry_at = 0.0
+_shared_lock = threading.Lock()
+
+
+def get_shared_engine() -> Optional[RelayEngine]:
+    """
+    Get the process-wide embedded engine, starting it on first use.
+    
+    The engine runs in the calling process and is stopped at exit. If
+    the boards are in use by a relay server (or another process's
+    engine), or none is attached, None is returned and the attempt is
+    repeated at most every ENGINE_RETRY_INTERVAL seconds.
+    
+    Returns:
+        Running RelayEngine, or None if the boards are not available
+    """
+    global _shared_engine, _shared_retry_at
+    
+    with _shared_lock:
+        if _shared_engine is not None or time.monotonic() < _shared_retry_at:
+            return _shared_engine
+        
+        try:
+            engine = RelayEngine()
+        except (BoardLockError, ValueError, OSError) as e:
+            logging.getLogger('relay.engine').info(f'Relay boards not available in process: {e}')
+            _shared_retry_at = time.monotonic() + ENGINE_RETRY_INTERVAL
+            return None
+        
+        engine.start()
+        _shared_engine = engine
+        return engine
+
+
+def close_shared_engine() -> None:
+    """Stop the embedded engine, if running, and release its boards."""
+    global _shared_engine
+    
+    with _shared_lock:
+        engine, _shared_engine = _shared_engine, None
+    
+    if engine is not None:
+        engine.stop()
+
+
+def _forget_shared_engine() -> None:
+    """Drop the parent's engine in a forked child; its boards stay the parent's."""
+    global _shared_engine, _shared_lock
+    _shared_lock = threading.Lock()
+    _shared_engine = None
+
+
+atexit.register(close_shared_engine)
+
+if hasattr(os, 'register_at_fork'):
+    os.register_at_fork(after_in_child=_forget_shared_engine)
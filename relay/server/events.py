@@ -0,0 +1,122 @@
+# -*- coding: utf-8 -*-
+"""
+Port State Events
+
+Fan-out of port state changes to subscribed clients. The port state
+caches of all boards publish here; every event is a dictionary with at
+least these keys:
+
+    event   - 'power', 'hub_power', 'binding', 'resync' or 'invalidated'
+    board   - Board number (port numbers in the event are local to it)
+    seq     - Sequence number, increasing by one per published event
+    time    - Wall clock time of the change (seconds since the epoch)
+
+plus the fields of the change:
+
+    power       port, on            - Port switched on or off
+    hub_power   value, on, ports    - Hub value switched; ports bound to it
+    binding     port, value         - Hub value bound to a port
+    resync      bindings            - Bindings read back from the board
+    invalidated [port] [value]      - Board state unknown (link lost or
+                                      command failed); a resync follows.
+                                      With port or value, only the power
+                                      of that port or hub is unknown
+
+Dictionaries have string keys only, so events look the same in every
+wire codec.
+"""
+
+import itertools
+import logging
+import threading
+import time
+from typing import Any, Callable, Dict, Optional
+
+
+Event = Dict[str, Any]
+
+
+class EventBus:
+    """
+    Publish/subscribe hub for server events.
+    
+    Subscribers are called on the publishing thread (a board's serial
+    worker) with the bus locked, so they must only hand the event off,
+    never block or publish. A subscriber that raises is removed.
+    """
+    
+    def __init__(self, logger: Optional[logging.Logger] = None):
+        """
+        Initialize event bus.
+        
+        Args:
+            logger: Logger for subscriber failures
+        """
+        self.logger = logger or logging.getLogger('relay.events')
+        
+        self._lock = threading.Lock()
+        self._subscribers: Dict[int, Callable[[Event], None]] = {}
+        self._tokens = itertools.count(1)
+        self._sequence = itertools.count(1)
+        self.published = 0
+    
+    @property
+    def subscribers(self) -> int:
+        """Number of current subscribers."""
+        return len(self._subscribers)
+    
+    def subscribe(self, callback: Callable[[Event], None]) -> int:
+        """
+        Register a subscriber.
+        
+        Args:
+            callback: Called with every event published from now on
+        
+        Returns:
+            Token for unsubscribe()
+        """
+        with self._lock:
+            token = next(self._tokens)
+            self._subscribers[token] = callback
+            return token
+    
+    def unsubscribe(self, token: int) -> None:
+        """
+        Remove a subscriber.
+        
+        Args:
+            token: Token returned by subscribe()
+        """
+        with self._lock:
+            self._subscribers.pop(token, None)
+    
+    def publish(self, event: Event) -> None:
+        """
+        Number, timestamp and deliver an event to every subscriber.
+        
+        Args:
+            event: Event dictionary; 'seq' and 'time' are added
+        """
+        failed = []
+        
+        # Delivered under the lock, so every subscriber sees events in order
+        with self._lock:
+            event['seq'] = next(self._sequence)
+            event['time'] = time.time()
+            self.published += 1
+            
+            for token, callback in self._subscribers.items():
+                try:
+                    callback(event)
+                except Exception as e:
+                    failed.append((token, e))
+            
+            for token, error in failed:
+                del self._subscribers[token]
+        
+        for token, error in failed:
+            self.logger.warning(f'Dropped event subscriber {token}: {error}')
+    
+    def __repr__(self):
+        """String representation."""
+        return f'EventBus(subscribers={self.subscribers}, published={self.published})'
@@ -0,0 +1,249 @@
+# -*- coding: utf-8 -*-
+"""
+Port State Cache
+
+In-memory model of the relay board kept by the server.
+"""
+
+import threading
+import time
+from typing import Any, Callable, Dict, List, Optional
+
+
+class PortStateCache:
+    """
+    Write-through model of relay port state.
+    
+    Holds the port bindings last read from the board (as returned by
+    ``get_all_port_states``), updated by every successful bind command,
+    plus the power state of every port and hub value the server has
+    switched. Bindings are only served while younger than the staleness
+    bound. Power states cannot be read back from the board; besides
+    reporting, they let mask commands skip ports already in the target
+    state when ``ServerConfig.mask_skip_known`` is set, so port power is
+    forgotten whenever the board state is in doubt.
+    
+    Changes are reported to ``on_change`` as event dictionaries (see
+    relay.server.events), after the cache has been updated.
+    """
+    
+    def __init__(self, on_change: Optional[Callable[[Dict[str, Any]], None]] = None):
+        """
+        Initialize an empty (stale) cache.
+        
+        Args:
+            on_change: Called with an event for every state change
+        """
+        self.on_change = on_change
+        self._lock = threading.Lock()
+        self._bindings: Optional[List[str]] = None
+        self._synced_at: Optional[float] = None
+        self._power: Dict[int, bool] = {}
+        self._hub_power: Dict[int, bool] = {}
+        self._hits = 0
+        self._misses = 0
+        self._resyncs = 0
+    
+    def get_bindings(self, max_age: float) -> Optional[List[str]]:
+        """
+        Get cached port bindings if fresh enough.
+        
+        Args:
+            max_age: Staleness bound in seconds (0 disables the cache)
+        
+        Returns:
+            List of hex strings per port, or None if stale or unknown
+        """
+        with self._lock:
+            fresh = (
+                self._bindings is not None
+                and max_age > 0
+                and time.monotonic() - self._synced_at <= max_age
+            )
+            
+            if not fresh:
+                self._misses += 1
+                return None
+            
+            self._hits += 1
+            return list(self._bindings)
+    
+    def update_from_board(self, states: List[str]) -> None:
+        """
+        Replace bindings with a fresh read from the board.
+        
+        Args:
+            states: Port states as returned by get_all_port_states
+        """
+        with self._lock:
+            self._bindings = list(states)
+            self._synced_at = time.monotonic()
+            self._resyncs += 1
+        
+        self._emit({'event': 'resync', 'bindings': list(states)})
+    
+    def set_binding(self, port_index: int, hub_value: int) -> None:
+        """
+        Record a successful bind command.
+        
+        Args:
+            port_index: Relay port index (1-based)
+            hub_value: Hub ID value bound to the port
+        """
+        bound = f'{hub_value:02x}'
+        
+        with self._lock:
+            changed = True
+            if self._bindings is not None and 1 <= port_index <= len(self._bindings):
+                changed = self._bindings[port_index - 1] != bound
+                self._bindings[port_index - 1] = bound
+        
+        if changed:
+            self._emit({'event': 'binding', 'port': port_index, 'value': hub_value})
+    
+    def set_power(self, port_index: int, on: bool) -> None:
+        """
+        Record a successful power command by port index.
+        
+        Args:
+            port_index: Relay port index (1-based)
+            on: New power state
+        """
+        with self._lock:
+            changed = self._power.get(port_index) != on
+            self._power[port_index] = on
+        
+        if changed:
+            self._emit({'event': 'power', 'port': port_index, 'on': on})
+    
+    def set_hub_power(self, hub_value: int, on: bool) -> None:
+        """
+        Record a successful power command by hub value.
+        
+        The ports the hub is bound to are updated too; without known
+        bindings the power of every port becomes unknown.
+        
+        Args:
+            hub_value: USB hub ID value
+            on: New power state
+        """
+        ports = []
+        
+        with self._lock:
+            changed = self._hub_power.get(hub_value) != on
+            self._hub_power[hub_value] = on
+            
+            if self._bindings is None:
+                self._power.clear()
+            else:
+                wanted = f'{hub_value:02x}'
+                for port, bound in enumerate(self._bindings, 1):
+                    if bound == wanted:
+                        changed = changed or self._power.get(port) != on
+                        self._power[port] = on
+                        ports.append(port)
+        
+        if changed:
+            self._emit({'event': 'hub_power', 'value': hub_value, 'on': on, 'ports': ports})
+    
+    def ports_to_switch(self, port_mask: int, on: bool) -> int:
+        """
+        Drop the ports known to be in the target state from a port mask.
+        
+        Args:
+            port_mask: Ports to switch, bit n-1 for port n
+            on: Target power state
+        
+        Returns:
+            Mask of the ports whose power is unknown or different
+        """
+        with self._lock:
+            for port, powered in self._power.items():
+                if powered == on:
+                    port_mask &= ~(1 << (port - 1))
+            return port_mask
+    
+    def invalidate(self, port_index: Optional[int] = None, hub_value: Optional[int] = None) -> None:
+        """
+        Mark the board state unknown after a failed or unconfirmed command.
+        
+        Without arguments, bindings become stale so the next query reads
+        the board, and all port power is forgotten. With a port index or
+        hub value only the power of that port, or of the hub and the ports
+        bound to it, is forgotten.
+        
+        Args:
+            port_index: Relay port index (1-based) whose power is unknown
+            hub_value: USB hub ID value whose power is unknown
+        """
+        event: Dict[str, Any] = {'event': 'invalidated'}
+        
+        with self._lock:
+            if port_index is None and hub_value is None:
+                known = self._bindings is not None or bool(self._power)
+                self._synced_at = None
+                self._bindings = None
+                self._power.clear()
+            else:
+                known = False
+                ports = [port_index] if port_index is not None else []
+                
+                if hub_value is not None:
+                    known = self._hub_power.pop(hub_value, None) is not None
+                    if self._bindings is None:
+                        ports = list(self._power)
+                    else:
+                        wanted = f'{hub_value:02x}'
+                        ports += [port for port, bound in enumerate(self._bindings, 1) if bound == wanted]
+                    event['value'] = hub_value
+                
+                for port in ports:
+                    known = self._power.pop(port, None) is not None or known
+                if port_index is not None:
+                    event['port'] = port_index
+        
+        if known:
+            self._emit(event)
+    
+    def snapshot(self) -> Dict[str, Any]:
+        """
+        Get a copy of the cached model.
+        
+        Returns:
+            Dictionary with bindings, power states, age and hit counters
+        """
+        with self._lock:
+            age = time.monotonic() - self._synced_at if self._synced_at is not None else None
+            return {
+                'bindings': list(self._bindings) if self._bindings is not None else None,
+                'age': age,
+                'power': dict(sorted(self._power.items())),
+                'hub_power': dict(sorted(self._hub_power.items())),
+                'hits': self._hits,
+                'misses': self._misses,
+                'resyncs': self._resyncs,
+            }
+    
+    def state(self) -> Dict[str, Any]:
+        """
+        Get the bindings and the known port power, for event subscribers.
+        
+        Returns:
+            Dictionary with the bindings (None if unknown) and the lists
+            of ports known to be on and off
+        """
+        with self._lock:
+            return {
+                'bindings': list(self._bindings) if self._bindings is not None else None,
+                'on': sorted(port for port, powered in self._power.items() if powered),
+                'off': sorted(port for port, powered in self._power.items() if not powered),
+            }
+    
+    def _emit(self, event: Dict[str, Any]) -> None:
+        """Report a state change."""
+        if self.on_change is not None:
+            self.on_change(event)
+    
+    def __repr__(self):
+        """String representation."""
+        return f'PortStateCache(bindings={self._bindings})'
@@ -0,0 +1,249 @@
+# -*- coding: utf-8 -*-
+"""
+Task Scheduler
+
+Priority queue between the request handlers and the serial link.
+"""
+
+import heapq
+import itertools
+import logging
+import threading
+import time
+from concurrent.futures import Future
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from relay.utils.relay_utils import Task
+
+
+class TaskScheduler:
+    """
+    Priority scheduler feeding a single serial worker thread.
+    
+    Tasks are ordered by priority (lower runs first) and FIFO within the
+    same priority. Waiting tasks age: every ``aging_interval`` seconds in
+    the queue counts as one priority level, so low priority work is never
+    starved by a steady stream of urgent commands.
+    
+    Because aging is linear in the enqueue time, the effective key
+    ``priority + enqueued_at / aging_interval`` never changes while a task
+    waits, and a plain heap stays valid.
+    
+    Tasks may also be submitted with a delay. They wait on a separate
+    timer heap, without holding the worker, and join the run queue when
+    they become due.
+    """
+    
+    def __init__(
+        self,
+        executor: Callable[[Task], Any],
+        aging_interval: float = 1.0,
+        name: str = 'relay-scheduler',
+        logger: Optional[logging.Logger] = None
+    ):
+        """
+        Initialize task scheduler.
+        
+        Args:
+            executor: Callable that runs one task on the serial link
+            aging_interval: Seconds of waiting worth one priority level
+            name: Worker thread name
+            logger: Logger for scheduler events
+        
+        Raises:
+            ValueError: If aging_interval is not positive
+        """
+        if not aging_interval > 0:
+            raise ValueError(f'aging_interval must be positive, got {aging_interval}')
+        
+        self.executor = executor
+        self.aging_interval = aging_interval
+        self.name = name
+        self.logger = logger or logging.getLogger('relay.scheduler')
+        
+        self._heap: List[Tuple[float, int, float, Task, Future]] = []
+        self._delayed: List[Tuple[float, int, Task, Future]] = []
+        self._counter = itertools.count()
+        self._condition = threading.Condition()
+        self._epoch = time.monotonic()
+        self._thread: Optional[threading.Thread] = None
+        self._running = False
+        
+        self._wait_stats: Dict[int, Dict[str, float]] = {}
+        self._dispatched = 0
+        self._max_depth = 0
+    
+    @property
+    def depth(self) -> int:
+        """Number of tasks waiting to run."""
+        with self._condition:
+            return len(self._heap)
+    
+    @property
+    def is_running(self) -> bool:
+        """Check if the worker thread is running."""
+        return self._thread is not None and self._thread.is_alive()
+    
+    def start(self) -> None:
+        """Start the worker thread."""
+        with self._condition:
+            if self._running:
+                return
+            self._running = True
+            
+            # Started under the lock so stop() never joins an unstarted thread
+            self._thread = threading.Thread(target=self._worker, name=self.name, daemon=True)
+            self._thread.start()
+    
+    def stop(self, timeout: float = 5.0) -> None:
+        """
+        Stop the worker thread and fail all waiting tasks.
+        
+        Args:
+            timeout: Maximum time to wait for the running task to finish
+        """
+        with self._condition:
+            self._running = False
+            pending = [entry[-1] for entry in self._heap + self._delayed]
+            self._heap, self._delayed = [], []
+            self._condition.notify_all()
+        
+        for future in pending:
+            if future.set_running_or_notify_cancel():
+                future.set_exception(RuntimeError('Scheduler stopped'))
+        
+        if self._thread and self._thread is not threading.current_thread():
+            self._thread.join(timeout)
+        self._thread = None
+    
+    def has_waiting(self, priority: int) -> bool:
+        """
+        Check whether a more urgent task is waiting to run.
+        
+        Args:
+            priority: Priority of the task currently running
+        
+        Returns:
+            True if a queued task has a strictly higher priority
+        """
+        with self._condition:
+            return any(entry[3].priority < priority for entry in self._heap)
+    
+    def submit(self, task: Task, delay: float = 0.0) -> Future:
+        """
+        Queue a task for execution.
+        
+        Args:
+            task: Task to run
+            delay: Seconds to wait before the task joins the run queue
+        
+        Returns:
+            Future resolved with the executor's response
+        """
+        future: Future = Future()
+        now = time.monotonic() - self._epoch
+        
+        with self._condition:
+            if not self._running:
+                future.set_exception(RuntimeError('Scheduler is not running'))
+                return future
+            
+            if delay > 0:
+                heapq.heappush(self._delayed, (now + delay, next(self._counter), task, future))
+            else:
+                self._enqueue(now, task, future)
+            self._condition.notify()
+        
+        return future
+    
+    def _enqueue(self, enqueued_at: float, task: Task, future: Future) -> None:
+        """Push a task on the run queue; caller holds the condition."""
+        key = task.priority + enqueued_at / self.aging_interval
+        heapq.heappush(self._heap, (key, next(self._counter), enqueued_at, task, future))
+        self._max_depth = max(self._max_depth, len(self._heap))
+    
+    def _next(self) -> Optional[Tuple[float, int, float, Task, Future]]:
+        """Block until a task is available or the scheduler stops."""
+        with self._condition:
+            while True:
+                if not self._running:
+                    return None
+                
+                # Move due delayed tasks onto the run queue
+                now = time.monotonic() - self._epoch
+                while self._delayed and self._delayed[0][0] <= now:
+                    due, _, task, future = heapq.heappop(self._delayed)
+                    self._enqueue(due, task, future)
+                
+                if self._heap:
+                    return heapq.heappop(self._heap)
+                
+                timeout = self._delayed[0][0] - now if self._delayed else None
+                self._condition.wait(timeout)
+    
+    def _worker(self) -> None:
+        """Run queued tasks one at a time."""
+        while True:
+            entry = self._next()
+            if entry is None:
+                break
+            
+            _, _, enqueued_at, task, future = entry
+            if not future.set_running_or_notify_cancel():
+                continue
+            
+            self._record_wait(task.priority, time.monotonic() - self._epoch - enqueued_at)
+            
+            try:
+                future.set_result(self.executor(task))
+            except Exception as e:
+                self.logger.error(f'Scheduled task failed: {e}', exc_info=True)
+                future.set_exception(e)
+    
+    def _record_wait(self, priority: int, wait: float) -> None:
+        """Accumulate queue wait time for a priority level."""
+        with self._condition:
+            stats = self._wait_stats.setdefault(
+                priority, {'count': 0, 'total_wait': 0.0, 'max_wait': 0.0, 'last_wait': 0.0}
+            )
+            stats['count'] += 1
+            stats['total_wait'] += wait
+            stats['max_wait'] = max(stats['max_wait'], wait)
+            stats['last_wait'] = wait
+            self._dispatched += 1
+    
+    def stats(self) -> Dict[str, Any]:
+        """
+        Get scheduler statistics.
+        
+        Returns:
+            Dictionary with queue depth, waiting tasks per priority and
+            wait times (seconds) per priority level
+        """
+        with self._condition:
+            waiting: Dict[int, int] = {}
+            for _, _, _, task, _ in self._heap:
+                waiting[task.priority] = waiting.get(task.priority, 0) + 1
+            
+            wait_times = {
+                priority: {
+                    'count': int(s['count']),
+                    'avg_wait': s['total_wait'] / s['count'],
+                    'max_wait': s['max_wait'],
+                    'last_wait': s['last_wait'],
+                }
+                for priority, s in sorted(self._wait_stats.items())
+            }
+            
+            return {
+                'depth': len(self._heap),
+                'delayed': len(self._delayed),
+                'max_depth': self._max_depth,
+                'dispatched': self._dispatched,
+                'waiting': dict(sorted(waiting.items())),
+                'wait_times': wait_times,
+            }
+    
+    def __repr__(self):
+        """String representation."""
+        return f'TaskScheduler(depth={self.depth}, running={self.is_running})'
@@ -5,39 +5,62 @@ Relay Task Manager
 Server implementation for handling relay control requests via socket.
 """
 
+import os
+import queue
 import socket
 import pickle
-import time
 import sys
-from typing import Optional, Generator, Any
-from contextlib import contextmanager
+import threading
+import functools
+from concurrent.futures import Future, wait
+from typing import Optional, Any, Callable, Dict, List, Set, Union
 
 from relay.hardware.serial_comm import SerialCommunicator
-from relay.utils.relay_utils import Task, Device
-from relay.constants import (
-    RELAY_DISCONNECT_MSG,
-    RELAY_CONNECT_MSG,
-    RELAY_DISCONNECT_MSG_SEC,
-    RELAY_CONNECT_MSG_SEC,
-    RELAY_GET_STATE_MSG,
-    RELAY_SET_STATE_MSG,
+from relay.utils.framing import (
+    FRAME_MAGIC,
+    CODEC_PICKLE,
+    CODEC_BINARY,
+    SUPPORTED_CODECS,
+    FramingError,
+    encode_frame,
+    encode_payload,
+    decode_payload,
+    is_framed,
+    read_frame,
+    read_legacy_message,
+    recv_exact,
+    unix_socket_path,
 )
+from relay.utils.codec import CodecError
+from relay.constants import RELAY_SUBSCRIBE_MSG
 from relay.core.config import ConfigManager, LoggerFactory
+from relay.server.engine import RelayEngine
 
 
-class RelayTaskManager:
+class RelayTaskManager(RelayEngine):
     """
     Task manager for relay control server.
     
-    Handles incoming socket connections and processes relay control tasks
-    using a generator-based task queue.
+    Handles incoming socket connections and hands the relay control
+    tasks to the relay engine (see RelayEngine for how tasks are routed
+    to the boards). Accepting and decoding requests happens on
+    connection threads.
+    
+    A RELAY_SUBSCRIBE_MSG request on a framed connection is answered with
+    a stream of port state events (see relay.server.events), starting
+    with a snapshot of every board, until the connection closes.
     """
     
+    # Events buffered per subscriber before a slow one is disconnected
+    MAX_QUEUED_EVENTS = 1024
+    
     def __init__(
         self,
         host: Optional[str] = None,
         port: Optional[int] = None,
-        backlog: int = 5
+        backlog: int = 5,
+        serial: Union[SerialCommunicator, List[SerialCommunicator], None] = None,
+        trace_file: Optional[str] = None
     ):
         """
         Initialize task manager.
@@ -46,28 +69,38 @@ class RelayTaskManager:
             host: Server host address (default: from config)
             port: Server port number (default: from config)
             backlog: Maximum queued connections
+            serial: Pre-opened serial communicator, or one per board
+                (default: open and lock every detected board)
+            trace_file: Binary UART trace file (default: from config,
+                disabled if empty)
+        
+        Raises:
+            ValueError: If no board could be opened
+            BoardLockError: If a board is in use by another process
         """
-        self.config_manager = ConfigManager()
-        self.config = self.config_manager.config
+        config = ConfigManager().config
         
-        self.host = host or self.config.server.host
-        self.port = port or self.config.server.port
+        self.host = host or config.server.host
+        self.port = port or config.server.port
         self.backlog = backlog
         
-        self.logger = LoggerFactory.get_server_logger()
+        # Initialize sockets
+        self.socket: Optional[socket.socket] = None
+        self.unix_socket: Optional[socket.socket] = None
+        self.unix_socket_path = unix_socket_path(config.server.unix_socket, self.port)
+        self._async_server = None
         
-        # Initialize serial communicator
-        try:
-            self.serial = SerialCommunicator('server')
-        except ValueError as e:
-            self.logger.error(f'Failed to initialize serial: {e}')
-            raise
+        # Open framed connections, closed on stop so clients reconnect
+        self._connections: Set[socket.socket] = set()
+        self._connections_lock = threading.Lock()
         
-        # Initialize socket
-        self.socket: Optional[socket.socket] = None
-        self._task_generator: Optional[Generator[str, Task, None]] = None
-        self._running = False
+        super().__init__(serial, trace_file, LoggerFactory.get_server_logger())
+        
+        if config.server.allow_pickle:
+            self.logger.warning('Accepting pickled requests (ServerConfig.allow_pickle): '
+                                'any client that can connect can run code on this server')
         
+        self._setup_unix_socket()
         self._setup_socket()
     
     def _setup_socket(self) -> None:
@@ -79,74 +112,59 @@ class RelayTaskManager:
             self.socket.listen(self.backlog)
             self.logger.info(f'Socket server initialized on {self.host}:{self.port}')
         except socket.error as e:
-            self.logger.error(f'Socket setup failed: {e}')
-            raise
+            if self.socket:
+                self.socket.close()
+                self.socket = None
+            if self.unix_socket is None:
+                self.logger.error(f'Socket setup failed: {e}')
+                raise
+            # Same-host clients still reach the server
+            self.logger.error(f'Socket setup failed: {e}; serving {self.unix_socket_path} only')
     
-    def _task_handler(self) -> Generator[str, Task, None]:
-        """
-        Task handler generator.
-        
-        Yields:
-            Response string ('OK' or 'KO')
-        
-        Receives:
-            Task objects to process
-        """
-        response = 'KO'
+    def _setup_unix_socket(self) -> None:
+        """Setup the Unix domain socket for same-host clients, if enabled."""
+        path = self.unix_socket_path
+        if not path:
+            return
         
-        while self.serial.is_open:
-            task = yield response
+        if os.path.exists(path):
+            probe = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
             try:
-                response = self._process_task(task)
-                self.logger.info(f'[OUT_TASK] - Finished task "{task}"')
-            except Exception as e:
-                self.logger.error(f'[OUT_TASK] - Task failed: {e}', exc_info=True)
-                response = 'KO'
+                probe.connect(path)
+                self.logger.error(f'Another server is listening on {path}; not using it')
+                self.unix_socket_path = None
+                return
+            except socket.error:
+                # Left behind by a server that did not stop cleanly
+                os.unlink(path)
+            finally:
+                probe.close()
+        
+        try:
+            self.unix_socket = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+            self.unix_socket.bind(path)
+            self.unix_socket.listen(self.backlog)
+            self.logger.info(f'Socket server initialized on {path}')
+        except socket.error as e:
+            self.logger.warning(f'Unix socket setup failed: {e}')
+            self.unix_socket.close()
+            self.unix_socket = None
+            self.unix_socket_path = None
     
-    def _process_task(self, task: Task) -> str:
+    def accepts_codec(self, codec: int) -> bool:
         """
-        Process a relay control task.
+        Check whether requests in a payload codec are accepted.
         
         Args:
-            task: Task to process
+            codec: Payload codec identifier
         
         Returns:
-            Response string ('OK' or state data)
+            False for unknown codecs, and for pickle when
+            ServerConfig.allow_pickle is off
         """
-        message = task.message
-        index = task.index
-        value = task.value
-        
-        self.logger.debug(f'Processing task: message={message}, index={index}, value={value}')
-        
-        # Handle different message types
-        if message == RELAY_DISCONNECT_MSG:
-            self.serial.usb_off(index)
-            return 'OK'
-        
-        elif message == RELAY_CONNECT_MSG:
-            self.serial.usb_on(index)
-            return 'OK'
-        
-        elif message == RELAY_SET_STATE_MSG:
-            self.serial.set_port_state(index, value)
-            return 'OK'
-        
-        elif message == RELAY_GET_STATE_MSG:
-            states = self.serial.get_all_port_states()
-            return str(states)
-        
-        elif message == RELAY_DISCONNECT_MSG_SEC:
-            self.serial.usb_off_by_value(value)
-            return 'OK'
-        
-        elif message == RELAY_CONNECT_MSG_SEC:
-            self.serial.usb_on_by_value(value)
-            return 'OK'
-        
-        else:
-            self.logger.warning(f'Unknown message type: {message}')
-            return 'KO'
+        if codec == CODEC_PICKLE:
+            return self.config.server.allow_pickle
+        return codec in SUPPORTED_CODECS
     
     def _handle_connection(self, connection: socket.socket, address: tuple) -> None:
         """
@@ -159,26 +177,32 @@ class RelayTaskManager:
         self.logger.info(f'[IN_TASK] - Connection from {address}')
         
         try:
-            # Receive task data
-            data = connection.recv(4096)
-            if not data:
+            # Framed clients keep the connection open for many requests
+            prefix = recv_exact(connection, len(FRAME_MAGIC))
+            if not prefix:
                 return
             
-            # Deserialize task
-            task = pickle.loads(data)
-            self.logger.info(f'[IN_TASK] - Received task: {task}')
+            if is_framed(prefix):
+                self._serve_framed(connection, address, prefix)
+                return
+            
+            # Legacy one-shot client: a single bare pickle
+            if not self.accepts_codec(CODEC_PICKLE):
+                self.logger.warning(f'[IN_TASK] - Rejected pickle request from {address}')
+                return
             
-            # Process task through generator
-            if self._task_generator is None:
-                self._task_generator = self._task_handler()
-                next(self._task_generator)  # Initialize generator
+            task = read_legacy_message(connection.recv, prefix)
+            if task is None:
+                return
+            
+            self.logger.info(f'[IN_TASK] - Received task: {task}')
             
-            # Send task and get response
-            response = self._task_generator.send(task)
+            # Queue task and wait for the scheduler to run it
+            response = self.submit(task).result()
             
             # Send response back to client
             response_data = pickle.dumps(response)
-            connection.send(response_data)
+            connection.sendall(response_data)
             
             self.logger.info(f'[IN_TASK] - Sent response: {response}')
             
@@ -189,6 +213,176 @@ class RelayTaskManager:
         finally:
             connection.close()
     
+    def _serve_framed(self, connection: socket.socket, address: tuple, prefix: bytes) -> None:
+        """
+        Serve a persistent framed connection.
+        
+        Every request is submitted as soon as it is read; responses are
+        written back as tasks complete, possibly out of order.
+        
+        Args:
+            connection: Client socket connection
+            address: Client address tuple
+            prefix: Header bytes already read from the connection
+        """
+        write_lock = threading.Lock()
+        pending: Set[Future] = set()
+        subscriptions = []
+        with self._connections_lock:
+            self._connections.add(connection)
+        
+        try:
+            while True:
+                frame = read_frame(connection, prefix)
+                prefix = b''
+                if frame is None:
+                    break
+                
+                request_id, codec, payload = frame
+                if not self.accepts_codec(codec):
+                    # Answering in the binary codec tells the client to switch
+                    self.logger.warning(
+                        f'[IN_TASK] - Request #{request_id} from {address} in codec {codec} rejected'
+                    )
+                    self._reply_framed(connection, write_lock, request_id, CODEC_BINARY, None)
+                    continue
+                
+                reply = functools.partial(
+                    self._reply_framed, connection, write_lock, request_id, codec
+                )
+                
+                try:
+                    task = decode_payload(payload, codec)
+                except Exception as e:
+                    self.logger.error(f'[IN_TASK] - Bad request #{request_id} from {address}: {e}')
+                    reply(None)
+                    continue
+                
+                self.logger.info(f'[IN_TASK] - Received task #{request_id}: {task}')
+                
+                if task.message == RELAY_SUBSCRIBE_MSG:
+                    subscriptions.append(
+                        self._subscribe(connection, write_lock, request_id, codec, address)
+                    )
+                    continue
+                
+                future = self.submit(task)
+                pending.add(future)
+                future.add_done_callback(reply)
+        
+        except FramingError as e:
+            self.logger.error(f'[IN_TASK] - Framing error from {address}: {e}')
+        except socket.error as e:
+            self.logger.warning(f'[IN_TASK] - Connection from {address} lost: {e}')
+        finally:
+            for unsubscribe in subscriptions:
+                unsubscribe()
+            
+            # Let in-flight requests answer before the socket is closed
+            wait(pending, timeout=30)
+            with self._connections_lock:
+                self._connections.discard(connection)
+            self.logger.info(f'[IN_TASK] - Connection from {address} closed')
+    
+    def _subscribe(
+        self,
+        connection: socket.socket,
+        write_lock: threading.Lock,
+        request_id: int,
+        codec: int,
+        address: tuple
+    ) -> Callable[[], None]:
+        """
+        Start streaming port state events for one framed request.
+        
+        Events are queued by the publishing board thread and written by a
+        sender thread. A subscriber that falls MAX_QUEUED_EVENTS behind is
+        disconnected; it starts again from a snapshot when it resubscribes.
+        
+        Args:
+            connection: Client socket connection
+            write_lock: Lock serializing writes on the connection
+            request_id: Request identifier every event frame echoes
+            codec: Payload codec used by the request
+            address: Client address tuple
+        
+        Returns:
+            Function that ends the subscription
+        """
+        events: queue.Queue = queue.Queue(self.MAX_QUEUED_EVENTS)
+        
+        def deliver(event: Dict[str, Any]) -> None:
+            try:
+                events.put_nowait(event)
+            except queue.Full:
+                try:
+                    connection.shutdown(socket.SHUT_RDWR)
+                except socket.error:
+                    pass
+                # The bus drops and logs the subscriber
+                raise ConnectionError(f'{address} fell behind, disconnected') from None
+        
+        def send() -> None:
+            event = self.event_snapshot()
+            while event is not None:
+                frame = encode_frame(request_id, encode_payload(event, codec), codec)
+                try:
+                    with write_lock:
+                        connection.sendall(frame)
+                except socket.error:
+                    return
+                event = events.get()
+        
+        token = self.events.subscribe(deliver)
+        threading.Thread(target=send, name='relay-subscriber', daemon=True).start()
+        self.logger.info(f'[IN_TASK] - {address} subscribed to port state events')
+        
+        def unsubscribe() -> None:
+            # No more deliveries after this, so the sentinel always fits
+            self.events.unsubscribe(token)
+            while True:
+                try:
+                    events.get_nowait()
+                except queue.Empty:
+                    break
+            events.put_nowait(None)
+        
+        return unsubscribe
+    
+    def _reply_framed(
+        self,
+        connection: socket.socket,
+        write_lock: threading.Lock,
+        request_id: int,
+        codec: int,
+        future: Optional[Future]
+    ) -> None:
+        """
+        Send the response for one framed request.
+        
+        Args:
+            connection: Client socket connection
+            write_lock: Lock serializing writes on the connection
+            request_id: Request identifier to echo
+            codec: Payload codec used by the request
+            future: Completed task future (None if the request was invalid)
+        """
+        response = 'KO'
+        if future is not None and future.exception() is None:
+            response = future.result()
+        
+        try:
+            frame = encode_frame(request_id, encode_payload(response, codec), codec)
+        except (FramingError, CodecError):
+            frame = encode_frame(request_id, encode_payload('KO', codec), codec)
+        
+        try:
+            with write_lock:
+                connection.sendall(frame)
+            self.logger.info(f'[IN_TASK] - Sent response #{request_id}: {response}')
+        except socket.error as e:
+            self.logger.warning(f'[IN_TASK] - Failed to send response #{request_id}: {e}')
+    
     def start(self) -> None:
         """Start the server and begin accepting connections."""
         if self._running:
@@ -199,62 +393,142 @@ class RelayTaskManager:
         self.logger.info('=' * 60)
         self.logger.info('USB Relay Server Started'.center(60))
         self.logger.info('=' * 60)
-        self.logger.info(f'Listening on {self.host}:{self.port}')
+        self._log_listeners()
         self.logger.info('Press Ctrl+C to stop')
         self.logger.info('-' * 60)
         
+        self._start_workers()
+        
+        listeners = [listener for listener in (self.socket, self.unix_socket) if listener]
+        for listener in listeners[1:]:
+            threading.Thread(
+                target=self._accept_connections,
+                args=(listener,),
+                name='relay-unix-accept',
+                daemon=True
+            ).start()
+        
         try:
-            while self._running:
-                self.logger.info('[IN_TASK] - Waiting for connection...')
-                
-                try:
-                    connection, address = self.socket.accept()
-                    self._handle_connection(connection, address)
-                except socket.error as e:
-                    if self._running:
-                        self.logger.error(f'Socket error: {e}')
-                        break
-                        
+            self._accept_connections(listeners[0])
+        except KeyboardInterrupt:
+            self.logger.info('Received interrupt signal')
+        finally:
+            self.stop()
+    
+    def _accept_connections(self, listener: socket.socket) -> None:
+        """
+        Accept connections on a listening socket until the server stops.
+        
+        Args:
+            listener: TCP or Unix domain listening socket
+        """
+        while self._running:
+            self.logger.info('[IN_TASK] - Waiting for connection...')
+            
+            try:
+                connection, address = listener.accept()
+                if listener is self.socket:
+                    # Pipelined replies are small writes; don't let Nagle hold them
+                    connection.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+                threading.Thread(
+                    target=self._handle_connection,
+                    args=(connection, address or 'unix'),
+                    daemon=True
+                ).start()
+            except socket.error as e:
+                if self._running:
+                    self.logger.error(f'Socket error: {e}')
+                    break
+    
+    def _log_listeners(self) -> None:
+        """Log the addresses the server listens on."""
+        if self.socket:
+            self.logger.info(f'Listening on {self.host}:{self.port}')
+        if self.unix_socket:
+            self.logger.info(f'Listening on {self.unix_socket_path}')
+    
+    def start_async(self) -> None:
+        """
+        Start the server in asyncio mode.
+        
+        Client I/O for many connections is overlapped on one event loop
+        while serial transactions still run one at a time.
+        """
+        from relay.server.async_server import AsyncRelayServer
+        
+        if self._running:
+            self.logger.warning('Server is already running')
+            return
+        
+        self._running = True
+        self.logger.info('=' * 60)
+        self.logger.info('USB Relay Server Started (asyncio)'.center(60))
+        self.logger.info('=' * 60)
+        self._log_listeners()
+        self.logger.info('Press Ctrl+C to stop')
+        self.logger.info('-' * 60)
+        
+        self._start_workers()
+        self._async_server = AsyncRelayServer(self)
+        try:
+            self._async_server.run()
         except KeyboardInterrupt:
             self.logger.info('Received interrupt signal')
         finally:
             self.stop()
     
     def stop(self) -> None:
-        """Stop the server and cleanup resources."""
-        self._running = False
+        """
+        Stop the server and cleanup resources.
+        
+        Only the first call does anything, also when the accept loop's exit
+        and the caller stop the server at the same time.
+        """
+        if not self._claim_stop():
+            return
+        
+        if self._async_server:
+            self._async_server.stop()
+            self._async_server = None
         
-        if self._task_generator:
+        unix_socket = self.unix_socket
+        for listener in (self.socket, unix_socket):
+            if listener is None:
+                continue
+            try:
+                # Wake up a thread blocked in accept()
+                listener.shutdown(socket.SHUT_RDWR)
+            except Exception:
+                pass
             try:
-                self._task_generator.close()
+                listener.close()
             except Exception:
                 pass
-            self._task_generator = None
+        self.socket = self.unix_socket = None
         
-        if self.socket:
+        if unix_socket:
             try:
-                self.socket.close()
+                os.unlink(self.unix_socket_path)
+            except OSError:
+                pass
+        
+        # End framed connections; their readers see EOF and exit
+        with self._connections_lock:
+            connections = list(self._connections)
+        for connection in connections:
+            try:
+                connection.shutdown(socket.SHUT_RDWR)
             except Exception:
                 pass
-            self.socket = None
         
-        if self.serial:
-            self.serial.close()
+        # Stop the workers, close the boards and release their locks
+        self._release()
         
         self.logger.info('Server stopped')
     
     def __enter__(self):
-        """Context manager entry."""
+        """Context manager entry; the server starts with start()."""
         return self
-    
-    def __exit__(self, exc_type, exc_val, exc_tb):
-        """Context manager exit."""
-        self.stop()
-        return False
-    
-    def __del__(self):
-        """Cleanup on deletion."""
-        self.stop()
 
 
 def main():
@@ -265,12 +539,16 @@ def main():
     parser.add_argument('--host', type=str, help='Server host')
     parser.add_argument('--port', type=int, help='Server port')
     parser.add_argument('--log-level', type=str, default='INFO')
+    parser.add_argument('--asyncio', action='store_true', help='Use asyncio server mode')
     
     args = parser.parse_args()
     
     try:
         with RelayTaskManager(host=args.host, port=args.port) as manager:
-            manager.start()
+            if args.asyncio:
+                manager.start_async()
+            else:
+                manager.start()
     except Exception as e:
         print(f'Server error: {e}')
         sys.exit(1)
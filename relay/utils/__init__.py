@@ -9,13 +9,26 @@ This package contains utility classes for:
 - Serial communication
 """
 
-from relay.utils.relay_utils import Device, Task
+from relay.utils.relay_utils import (
+    Device,
+    Task,
+    TaskBatch,
+    task_off_time,
+    port_mask,
+    mask_ports,
+    parse_port_states,
+)
 from relay.utils.database import DatabaseManager
 from relay.utils.usb_info import USBDeviceInfo
 
 __all__ = [
     'Device',
     'Task',
+    'TaskBatch',
+    'task_off_time',
+    'port_mask',
+    'mask_ports',
+    'parse_port_states',
     'DatabaseManager',
     'USBDeviceInfo',
 ]
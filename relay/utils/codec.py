@@ -0,0 +1,254 @@
+# -*- coding: utf-8 -*-
+"""
+Binary Wire Codec
+
+Fixed-layout struct encoding of tasks and responses for framed
+client/server connections. Unlike pickle, decoding never constructs
+arbitrary objects, so it is safe to accept from untrusted clients.
+
+Message Format: [VERSION(1)][ITEM]
+
+Item Formats:
+    Task:   [KIND(1)][MESSAGE(1)][PRIORITY(2)][INDEX(4)][VALUE(8)][OFF_TIME(8)]
+            [BOARD(2)][SERIAL_LEN(2)][SERIAL]     (BOARD -1: route by port)
+    Batch:  [KIND(1)][FLAGS(1)][PRIORITY(2)][COUNT(2)][TASK ITEMS...]
+    Text:   [KIND(1)][LENGTH(4)][UTF-8]
+    None:   [KIND(1)]
+    List:   [KIND(1)][COUNT(2)][ITEMS...]
+    JSON:   [KIND(1)][LENGTH(4)][UTF-8 JSON]
+    Dict:   [KIND(1)][COUNT(2)][KEY ITEM][VALUE ITEM]...
+
+Responses are text ('OK', 'KO', port states), None, lists of responses
+(batches) or dictionaries such as server statistics. Dictionary keys and
+values are items themselves, so integer keys (priorities, port numbers)
+decode as integers, as they do with pickle; numbers are JSON.
+
+Hub values are unsigned 64-bit and off times doubles, so tasks decode
+exactly as they were sent, as with pickle.
+"""
+
+import json
+import struct
+from typing import Any, Tuple
+
+from relay.utils.relay_utils import Device, Task, TaskBatch
+
+
+CODEC_VERSION = 3
+
+KIND_TASK = 1
+KIND_BATCH = 2
+KIND_TEXT = 3
+KIND_NONE = 4
+KIND_LIST = 5
+KIND_JSON = 6
+KIND_DICT = 7
+
+BATCH_STOP_ON_FAILURE = 0x01
+BATCH_ATOMIC = 0x02
+
+_BYTE = struct.Struct('!B')
+_TASK = struct.Struct('!BhiQdhH')
+_BATCH = struct.Struct('!BhH')
+_LENGTH = struct.Struct('!I')
+_COUNT = struct.Struct('!H')
+
+
+class CodecError(ValueError):
+    """Exception raised for messages the binary codec cannot handle."""
+    pass
+
+
+def encode_message(obj: Any) -> bytes:
+    """
+    Encode a task or response.
+    
+    Args:
+        obj: Task, TaskBatch or response
+    
+    Returns:
+        Encoded message
+    
+    Raises:
+        CodecError: If the object has no binary representation
+    """
+    parts = [_BYTE.pack(CODEC_VERSION)]
+    _encode_item(obj, parts)
+    return b''.join(parts)
+
+
+def decode_message(data: bytes) -> Any:
+    """
+    Decode a message produced by encode_message.
+    
+    Args:
+        data: Encoded message
+    
+    Returns:
+        Decoded task, batch or response
+    
+    Raises:
+        CodecError: If the message is malformed or of another version
+    """
+    try:
+        version, = _BYTE.unpack_from(data, 0)
+        if version != CODEC_VERSION:
+            raise CodecError(f'Unsupported codec version: {version}')
+        
+        obj, offset = _decode_item(data, 1)
+    except (struct.error, UnicodeDecodeError, json.JSONDecodeError, RecursionError) as e:
+        raise CodecError(f'Malformed message: {e}')
+    
+    if offset != len(data):
+        raise CodecError(f'{len(data) - offset} trailing bytes in message')
+    return obj
+
+
+def _encode_task(task: Task, parts: list) -> None:
+    """Append the encoding of a task."""
+    serial = task.device.serial_no.encode('utf-8')
+    
+    try:
+        parts.append(_BYTE.pack(KIND_TASK))
+        parts.append(_TASK.pack(
+            task.message,
+            task.priority,
+            task.index,
+            task.value,
+            getattr(task, 'off_time', 1.0),
+            -1 if getattr(task, 'board', None) is None else task.board,
+            len(serial)
+        ))
+    except struct.error as e:
+        raise CodecError(f'Task out of range: {e}')
+    parts.append(serial)
+
+
+def _encode_item(obj: Any, parts: list) -> None:
+    """Append the encoding of one item."""
+    if isinstance(obj, TaskBatch):
+        flags = ((BATCH_STOP_ON_FAILURE if obj.stop_on_failure else 0)
+                 | (BATCH_ATOMIC if obj.atomic else 0))
+        parts.append(_BYTE.pack(KIND_BATCH))
+        parts.append(_BATCH.pack(flags, obj.priority, len(obj.tasks)))
+        for task in obj.tasks:
+            if not isinstance(task, Task):
+                raise CodecError(f'Cannot encode batch item: {type(task).__name__}')
+            _encode_task(task, parts)
+    
+    elif isinstance(obj, Task):
+        _encode_task(obj, parts)
+    
+    elif isinstance(obj, str):
+        text = obj.encode('utf-8')
+        parts.append(_BYTE.pack(KIND_TEXT))
+        parts.append(_LENGTH.pack(len(text)))
+        parts.append(text)
+    
+    elif obj is None:
+        parts.append(_BYTE.pack(KIND_NONE))
+    
+    elif isinstance(obj, (list, tuple)):
+        parts.append(_BYTE.pack(KIND_LIST))
+        parts.append(_COUNT.pack(len(obj)))
+        for item in obj:
+            _encode_item(item, parts)
+    
+    elif isinstance(obj, dict):
+        parts.append(_BYTE.pack(KIND_DICT))
+        parts.append(_COUNT.pack(len(obj)))
+        for key, value in obj.items():
+            _encode_item(key, parts)
+            _encode_item(value, parts)
+    
+    elif isinstance(obj, (int, float, bool)):
+        text = json.dumps(obj).encode('utf-8')
+        parts.append(_BYTE.pack(KIND_JSON))
+        parts.append(_LENGTH.pack(len(text)))
+        parts.append(text)
+    
+    else:
+        raise CodecError(f'Cannot encode {type(obj).__name__}')
+
+
+def _decode_task(data: bytes, offset: int) -> Tuple[Task, int]:
+    """Decode a task body starting after its kind byte."""
+    message, priority, index, value, off_time, board, length = _TASK.unpack_from(data, offset)
+    offset += _TASK.size
+    
+    serial = data[offset:offset + length]
+    if len(serial) != length:
+        raise CodecError('Truncated serial number')
+    
+    device = Device(serial.decode('utf-8'), index, value)
+    board = None if board < 0 else board
+    return Task(device, message, priority, off_time, board), offset + length
+
+
+def _decode_item(data: bytes, offset: int) -> Tuple[Any, int]:
+    """Decode one item; returns the item and the offset after it."""
+    kind, = _BYTE.unpack_from(data, offset)
+    offset += 1
+    
+    if kind == KIND_TASK:
+        return _decode_task(data, offset)
+    
+    if kind == KIND_BATCH:
+        flags, priority, count = _BATCH.unpack_from(data, offset)
+        offset += _BATCH.size
+        
+        tasks = []
+        for _ in range(count):
+            kind, = _BYTE.unpack_from(data, offset)
+            if kind != KIND_TASK:
+                raise CodecError(f'Unexpected item kind in batch: {kind}')
+            task, offset = _decode_task(data, offset + 1)
+            tasks.append(task)
+        
+        batch = TaskBatch(
+            tasks,
+            stop_on_failure=bool(flags & BATCH_STOP_ON_FAILURE),
+            atomic=bool(flags & BATCH_ATOMIC),
+            priority=priority
+        )
+        return batch, offset
+    
+    if kind in (KIND_TEXT, KIND_JSON):
+        length, = _LENGTH.unpack_from(data, offset)
+        offset += _LENGTH.size
+        
+        raw = data[offset:offset + length]
+        if len(raw) != length:
+            raise CodecError('Truncated text')
+        
+        text = raw.decode('utf-8')
+        return (text if kind == KIND_TEXT else json.loads(text)), offset + length
+    
+    if kind == KIND_NONE:
+        return None, offset
+    
+    if kind == KIND_LIST:
+        count, = _COUNT.unpack_from(data, offset)
+        offset += _COUNT.size
+        
+        items = []
+        for _ in range(count):
+            item, offset = _decode_item(data, offset)
+            items.append(item)
+        return items, offset
+    
+    if kind == KIND_DICT:
+        count, = _COUNT.unpack_from(data, offset)
+        offset += _COUNT.size
+        
+        items = {}
+        for _ in range(count):
+            key, offset = _decode_item(data, offset)
+            value, offset = _decode_item(data, offset)
+            try:
+                items[key] = value
+            except TypeError:
+                raise CodecError(f'Unhashable dictionary key: {type(key).__name__}')
+        return items, offset
+    
+    raise CodecError(f'Unknown item kind: {kind}')
@@ -0,0 +1,317 @@
+# -*- coding: utf-8 -*-
+"""
+Client/Server Message Framing
+
+Length-prefixed frames for the relay client/server protocol. A framed
+connection stays open and carries many requests; every frame carries a
+request id so responses can come back in any order.
+
+Frame Format: [MAGIC(2)][VERSION(1)][CODEC(1)][REQUEST_ID(4)][LENGTH(4)][PAYLOAD]
+
+The codec byte says how the payload is serialized: pickle, or the
+fixed-layout binary codec from relay.utils.codec. A server answers each
+request in the codec it arrived in; a request in a codec the server does
+not accept is answered in the binary codec, which tells the client to
+switch and resend.
+
+Legacy one-shot clients send a bare pickle instead. Pickle streams never
+start with the frame magic, so the server tells the two apart from the
+first two bytes of a connection.
+"""
+
+import asyncio
+import pickle
+import socket
+import struct
+from typing import Any, Callable, Optional, Tuple
+
+from relay.utils.codec import encode_message, decode_message
+
+
+FRAME_MAGIC = b'RF'
+FRAME_VERSION = 1
+FRAME_HEADER = struct.Struct('!2sBBII')
+MAX_PAYLOAD_SIZE = 1024 * 1024
+
+CODEC_PICKLE = 0
+CODEC_BINARY = 1
+SUPPORTED_CODECS = (CODEC_PICKLE, CODEC_BINARY)
+
+
+class FramingError(ValueError):
+    """Exception raised for malformed or oversized frames."""
+    pass
+
+
+def encode_payload(obj: Any, codec: int = CODEC_PICKLE) -> bytes:
+    """
+    Serialize a message object.
+    
+    Args:
+        obj: Task or response to serialize
+        codec: Payload codec identifier
+    
+    Returns:
+        Serialized payload
+    
+    Raises:
+        FramingError: If the codec is unknown
+        CodecError: If the object has no binary representation
+    """
+    if codec == CODEC_PICKLE:
+        return pickle.dumps(obj)
+    if codec == CODEC_BINARY:
+        return encode_message(obj)
+    raise FramingError(f'Unknown codec: {codec}')
+
+
+def decode_payload(payload: bytes, codec: int = CODEC_PICKLE) -> Any:
+    """
+    Deserialize a message payload.
+    
+    Args:
+        payload: Serialized payload
+        codec: Payload codec identifier
+    
+    Returns:
+        Deserialized task or response
+    
+    Raises:
+        FramingError: If the codec is unknown
+        CodecError: If a binary payload is malformed
+    """
+    if codec == CODEC_PICKLE:
+        return pickle.loads(payload)
+    if codec == CODEC_BINARY:
+        return decode_message(payload)
+    raise FramingError(f'Unknown codec: {codec}')
+
+
+def encode_frame(request_id: int, payload: bytes, codec: int = CODEC_PICKLE) -> bytes:
+    """
+    Build a frame around a serialized payload.
+    
+    Args:
+        request_id: Request identifier echoed in the response
+        payload: Serialized message
+        codec: Payload codec identifier
+    
+    Returns:
+        Frame bytes ready to send
+    """
+    if len(payload) > MAX_PAYLOAD_SIZE:
+        raise FramingError(f'Payload too large: {len(payload)} bytes')
+    
+    header = FRAME_HEADER.pack(FRAME_MAGIC, FRAME_VERSION, codec, request_id, len(payload))
+    return header + payload
+
+
+def decode_header(header: bytes) -> Tuple[int, int, int]:
+    """
+    Parse and validate a frame header.
+    
+    Args:
+        header: FRAME_HEADER.size bytes
+    
+    Returns:
+        Tuple of (codec, request_id, payload length)
+    
+    Raises:
+        FramingError: If the header is invalid
+    """
+    magic, version, codec, request_id, length = FRAME_HEADER.unpack(header)
+    
+    if magic != FRAME_MAGIC:
+        raise FramingError(f'Bad frame magic: {magic!r}')
+    if version != FRAME_VERSION:
+        raise FramingError(f'Unsupported frame version: {version}')
+    if length > MAX_PAYLOAD_SIZE:
+        raise FramingError(f'Payload too large: {length} bytes')
+    
+    return codec, request_id, length
+
+
+def is_framed(prefix: bytes) -> bool:
+    """
+    Check whether a connection starts with a frame.
+    
+    Args:
+        prefix: First bytes received on the connection
+    
+    Returns:
+        True if the prefix matches the frame magic
+    """
+    return prefix[:len(FRAME_MAGIC)] == FRAME_MAGIC
+
+
+def unix_socket_path(template: str, port: int) -> Optional[str]:
+    """
+    Path of the Unix domain socket of the server on a TCP port.
+    
+    Args:
+        template: ServerConfig.unix_socket, '{port}' is replaced
+        port: Server TCP port
+    
+    Returns:
+        Socket path, or None if disabled or the platform has no Unix
+        domain sockets
+    """
+    if not template or not hasattr(socket, 'AF_UNIX'):
+        return None
+    return template.format(port=port)
+
+
+def recv_exact(connection: socket.socket, size: int) -> bytes:
+    """
+    Receive exactly size bytes from a socket.
+    
+    Args:
+        connection: Connected socket
+        size: Number of bytes to read
+    
+    Returns:
+        Received bytes; shorter than size only if the peer closed
+    """
+    chunks = []
+    remaining = size
+    
+    while remaining:
+        chunk = connection.recv(remaining)
+        if not chunk:
+            break
+        chunks.append(chunk)
+        remaining -= len(chunk)
+    
+    return b''.join(chunks)
+
+
+def read_frame(
+    connection: socket.socket,
+    prefix: bytes = b''
+) -> Optional[Tuple[int, int, bytes]]:
+    """
+    Read one frame from a socket.
+    
+    Args:
+        connection: Connected socket
+        prefix: Header bytes already consumed from the socket
+    
+    Returns:
+        Tuple of (request_id, codec, payload), or None on clean EOF
+    
+    Raises:
+        FramingError: If the frame is invalid or truncated
+    """
+    header = prefix + recv_exact(connection, FRAME_HEADER.size - len(prefix))
+    if not header:
+        return None
+    if len(header) < FRAME_HEADER.size:
+        raise FramingError('Connection closed inside frame header')
+    
+    codec, request_id, length = decode_header(header)
+    payload = recv_exact(connection, length)
+    if len(payload) < length:
+        raise FramingError('Connection closed inside frame payload')
+    
+    return request_id, codec, payload
+
+
+async def read_frame_async(reader, prefix: bytes = b'') -> Optional[Tuple[int, int, bytes]]:
+    """
+    Read one frame from an asyncio stream.
+    
+    Args:
+        reader: asyncio.StreamReader
+        prefix: Header bytes already consumed from the stream
+    
+    Returns:
+        Tuple of (request_id, codec, payload), or None on clean EOF
+    
+    Raises:
+        FramingError: If the frame is invalid or truncated
+    """
+    try:
+        header = prefix + await reader.readexactly(FRAME_HEADER.size - len(prefix))
+    except asyncio.IncompleteReadError as e:
+        if not prefix and not e.partial:
+            return None
+        raise FramingError('Connection closed inside frame header')
+    
+    codec, request_id, length = decode_header(header)
+    
+    try:
+        payload = await reader.readexactly(length)
+    except asyncio.IncompleteReadError:
+        raise FramingError('Connection closed inside frame payload')
+    
+    return request_id, codec, payload
+
+
+def _try_unpickle(data: bytes) -> Tuple[bool, Any]:
+    """Attempt to decode accumulated legacy bytes as one pickle."""
+    if len(data) > MAX_PAYLOAD_SIZE:
+        raise pickle.UnpicklingError(f'Message too large: {len(data)} bytes')
+    
+    try:
+        return True, pickle.loads(data)
+    except (EOFError, ValueError, pickle.UnpicklingError):
+        return False, None
+
+
+def read_legacy_message(recv: Callable[[int], bytes], data: bytes = b'') -> Optional[Any]:
+    """
+    Read a bare (unframed) pickle from a one-shot connection.
+    
+    Keeps receiving until the accumulated bytes form a complete pickle, so
+    a message split across several TCP segments is still decoded.
+    
+    Args:
+        recv: Function returning the next chunk (b'' on EOF)
+        data: Bytes already received
+    
+    Returns:
+        Decoded object, or None if the peer sent nothing
+    
+    Raises:
+        pickle.UnpicklingError: If the stream ends with an incomplete pickle
+    """
+    while True:
+        if data:
+            complete, message = _try_unpickle(data)
+            if complete:
+                return message
+        
+        chunk = recv(4096)
+        if not chunk:
+            if data:
+                raise pickle.UnpicklingError('Connection closed inside message')
+            return None
+        data += chunk
+
+
+async def read_legacy_message_async(reader, data: bytes = b'') -> Optional[Any]:
+    """
+    Read a bare (unframed) pickle from an asyncio stream.
+    
+    Args:
+        reader: asyncio.StreamReader
+        data: Bytes already received
+    
+    Returns:
+        Decoded object, or None if the peer sent nothing
+    
+    Raises:
+        pickle.UnpicklingError: If the stream ends with an incomplete pickle
+    """
+    while True:
+        if data:
+            complete, message = _try_unpickle(data)
+            if complete:
+                return message
+        
+        chunk = await reader.read(4096)
+        if not chunk:
+            if data:
+                raise pickle.UnpicklingError('Connection closed inside message')
+            return None
+        data += chunk
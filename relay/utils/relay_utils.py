@@ -5,6 +5,8 @@ Device and Task Wrapper Classes
 This module provides data structures for managing relay devices and tasks.
 """
 
+import ast
+
 
 class Device:
     """
@@ -79,9 +81,11 @@ class Task:
         priority (int): Task priority (lower is higher priority)
         index (int): Relay port index from device
         value (int): USB hub ID value from device
+        off_time (float): Power-off duration for power-cycle messages
+        board (int): Target relay board, or None to route by port
     """
     
-    def __init__(self, device, message, priority=0):
+    def __init__(self, device, message, priority=0, off_time=1.0, board=None):
         """
         Initialize a Task instance.
         
@@ -89,8 +93,14 @@ class Task:
             device (Device): Target device
             message (int): Command message type
             priority (int): Task priority (default: 0)
+            off_time (float): Seconds to keep power off when the message
+                is a power cycle (default: 1.0)
+            board (int): Relay board id; None routes by global port
+                number or hub value (default: None)
         """
         self.priority = priority
+        self.off_time = off_time
+        self.board = board
         self.device = device
         self.index = device.index
         self.value = device.value
@@ -117,3 +127,132 @@ class Task:
         """Human-readable string representation."""
         return f'[P{self.priority}, {self.device}, MSG={self.message}]'
 
+
+class TaskBatch:
+    """
+    Ordered group of tasks sent to the server in one request.
+    
+    Attributes:
+        tasks (list): Tasks to run, in order
+        message (int): Always RELAY_BATCH_MSG
+        priority (int): Scheduling priority of the batch
+        stop_on_failure (bool): Skip remaining tasks after a failure
+        atomic (bool): Run all tasks as one block on the serial link
+    """
+    
+    def __init__(self, tasks, stop_on_failure=False, atomic=False, priority=None):
+        """
+        Initialize a TaskBatch instance.
+        
+        Args:
+            tasks (list): Tasks to run, in order
+            stop_on_failure (bool): Skip remaining tasks after the first
+                task that does not succeed (default: False)
+            atomic (bool): Keep the serial link for the whole batch so no
+                other command runs in between (default: False)
+            priority (int): Batch priority (default: highest task priority)
+        """
+        from relay.constants import RELAY_BATCH_MSG
+        
+        self.tasks = list(tasks)
+        self.message = RELAY_BATCH_MSG
+        self.stop_on_failure = stop_on_failure
+        self.atomic = atomic
+        
+        if priority is None:
+            priority = min((task.priority for task in self.tasks), default=0)
+        self.priority = priority
+    
+    def __len__(self):
+        """Number of tasks in the batch."""
+        return len(self.tasks)
+    
+    def __lt__(self, other):
+        """Compare by priority (for priority queue)."""
+        return self.priority < other.priority
+    
+    def __repr__(self):
+        """String representation of batch."""
+        return (f'TaskBatch(priority={self.priority}, tasks={len(self.tasks)}, '
+                f'atomic={self.atomic}, stop_on_failure={self.stop_on_failure})')
+    
+    def __str__(self):
+        """Human-readable string representation."""
+        return f'[P{self.priority}, BATCH x{len(self.tasks)}]'
+
+
+def task_off_time(task):
+    """
+    Total power-off time the server waits out before replying to a task.
+    
+    Args:
+        task (Task): Task or TaskBatch sent to the server
+    
+    Returns:
+        float: Seconds of power cycle off time in the task, 0.0 if none
+    """
+    from relay.constants import RELAY_BATCH_MSG, RELAY_POWER_CYCLE_MSG, RELAY_POWER_CYCLE_MSG_SEC
+    
+    if task.message == RELAY_BATCH_MSG:
+        return sum(task_off_time(t) for t in task.tasks)
+    if task.message in (RELAY_POWER_CYCLE_MSG, RELAY_POWER_CYCLE_MSG_SEC):
+        return getattr(task, 'off_time', 0)
+    return 0.0
+
+
+def port_mask(ports):
+    """
+    Build the port bitmask of mask commands.
+    
+    Args:
+        ports (iterable): Relay port indexes (1-based)
+    
+    Returns:
+        int: Mask with bit n-1 set for every port n
+    
+    Raises:
+        ValueError: If a port index is below 1
+    """
+    mask = 0
+    for port in ports:
+        if port < 1:
+            raise ValueError(f'Invalid relay port index: {port}')
+        mask |= 1 << (port - 1)
+    return mask
+
+
+def mask_ports(mask):
+    """
+    List the ports of a port bitmask.
+    
+    Args:
+        mask (int): Port bitmask (bit n-1 for port n)
+    
+    Returns:
+        list: Relay port indexes (1-based), ascending
+    """
+    return [port for port in range(1, mask.bit_length() + 1) if mask >> (port - 1) & 1]
+
+
+def parse_port_states(response):
+    """
+    Parse a port state response from the relay server.
+    
+    Args:
+        response: Server response, either a list of hex strings or its
+            string form such as "['21', '00']"
+    
+    Returns:
+        list: Port states as two-digit hex strings, empty if the response
+        is not a port state vector
+    """
+    if isinstance(response, list):
+        return response
+    if not isinstance(response, str) or not response.startswith('['):
+        return []
+    
+    try:
+        states = ast.literal_eval(response)
+    except (ValueError, SyntaxError):
+        return []
+    return states if isinstance(states, list) else []
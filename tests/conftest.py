@@ -0,0 +1,146 @@
+# -*- coding: utf-8 -*-
+"""
+Shared Test Fixtures
+
+Every test runs in its own working directory with a fresh configuration
+that keeps the server's files (pacing, board cache, locks, Unix socket)
+out of the user's directories.
+"""
+
+import logging
+import pickle
+import socket
+import threading
+import time
+from typing import Any, Callable, List, Optional
+
+import pytest
+
+from relay.core.config import ConfigManager, RelayConfig
+from relay.client import close_shared_clients
+from relay.hardware.emulator import VirtualRelayBoard
+from relay.hardware.serial_comm import SerialCommunicator
+from relay.server.task_manager import RelayTaskManager
+from relay.utils.relay_utils import Task
+from relay.constants import RELAY_GET_STATE_MSG
+
+
+@pytest.fixture(autouse=True)
+def relay_config(tmp_path, monkeypatch):
+    """Fresh configuration for every test, with files under tmp_path."""
+    monkeypatch.chdir(tmp_path)
+    
+    config = RelayConfig()
+    config.server.unix_socket = ''
+    config.server.board_lock = ''
+    config.server.board_cache_file = ''
+    config.serial.pacing_file = ''
+    monkeypatch.setattr(ConfigManager(), '_config', config)
+    
+    yield config
+    
+    close_shared_clients()
+
+
+def free_port() -> int:
+    """Return an unused local TCP port."""
+    with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as s:
+        s.bind(('localhost', 0))
+        return s.getsockname()[1]
+
+
+def legacy_response(task: Task) -> Any:
+    """Answer of the original server: 'OK' for its six commands, else 'KO'."""
+    if task.message == RELAY_GET_STATE_MSG:
+        return str(['00'] * 5)
+    return 'OK' if 0 <= task.message <= 5 else 'KO'
+
+
+def wait_for_boards(engine) -> None:
+    """Wait until every board worker runs and has read its port states."""
+    while not all(
+        board.scheduler.is_running and board.port_states.snapshot()['resyncs']
+        for board in engine.boards
+    ):
+        time.sleep(0.01)
+
+
+class LegacyServer:
+    """
+    Relay server as shipped before framing: one bare pickle per
+    connection, answered with a bare pickle, then the connection closes.
+    Anything that does not unpickle is dropped without an answer.
+    """
+    
+    def __init__(self, respond: Callable[[Task], Any] = legacy_response):
+        self.respond = respond
+        self.tasks: List[Task] = []
+        self.rejected = 0
+        self.port = free_port()
+        self._socket = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        self._socket.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        self._socket.bind(('localhost', self.port))
+        self._socket.listen(5)
+        self._thread: Optional[threading.Thread] = None
+    
+    def start(self) -> 'LegacyServer':
+        self._thread = threading.Thread(target=self._serve, daemon=True)
+        self._thread.start()
+        return self
+    
+    def _serve(self) -> None:
+        while True:
+            try:
+                connection, _ = self._socket.accept()
+            except OSError:
+                return
+            
+            with connection:
+                data = connection.recv(4096)
+                try:
+                    task = pickle.loads(data)
+                except Exception:
+                    self.rejected += 1
+                    continue
+                self.tasks.append(task)
+                connection.sendall(pickle.dumps(self.respond(task)))
+    
+    def stop(self) -> None:
+        try:
+            self._socket.shutdown(socket.SHUT_RDWR)
+        except OSError:
+            pass
+        self._socket.close()
+
+
+@pytest.fixture
+def legacy_server():
+    """Pickle-only relay server on a free local port."""
+    server = LegacyServer().start()
+    yield server
+    server.stop()
+
+
+@pytest.fixture
+def board():
+    """Virtual relay board with five ports, replying without baud pacing."""
+    board = VirtualRelayBoard(ports=5, baudrate=None).start()
+    yield board
+    board.stop()
+
+
+@pytest.fixture
+def relay_server(board):
+    """Relay server driving the virtual board, serving on a free port."""
+    serial = SerialCommunicator('test', port=board.port)
+    manager = RelayTaskManager(port=free_port(), serial=serial)
+    manager.logger.setLevel(logging.WARNING)
+    
+    thread = threading.Thread(target=manager.start, daemon=True)
+    thread.start()
+    wait_for_boards(manager)
+    
+    yield manager
+    
+    manager.stop()
+    thread.join(5)
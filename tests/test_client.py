@@ -0,0 +1,133 @@
+# -*- coding: utf-8 -*-
+"""Tests for RelayClient against current and legacy relay servers."""
+
+import socket
+import threading
+
+from relay.client import RelayClient, get_relay_channel
+from relay.hardware.serial_comm import SerialCommunicator
+from relay.server.task_manager import RelayTaskManager
+from relay.utils.relay_utils import Device, Task
+from relay.constants import RELAY_CONNECT_MSG, RELAY_DISCONNECT_MSG
+
+from tests.conftest import free_port
+
+
+class DroppingServer:
+    """Server in the middle of a restart: closes every connection unanswered."""
+    
+    def __init__(self, port: int):
+        self._socket = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        self._socket.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        self._socket.bind(('localhost', port))
+        self._socket.listen(5)
+        threading.Thread(target=self._serve, daemon=True).start()
+    
+    def _serve(self) -> None:
+        while True:
+            try:
+                connection, _ = self._socket.accept()
+            except OSError:
+                return
+            connection.recv(4096)
+            connection.close()
+    
+    def stop(self) -> None:
+        try:
+            self._socket.shutdown(socket.SHUT_RDWR)
+        except OSError:
+            pass
+        self._socket.close()
+
+
+class SilentServer:
+    """Server that reads requests and never answers them."""
+    
+    def __init__(self, port: int):
+        self._socket = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        self._socket.bind(('localhost', port))
+        self._socket.listen(5)
+        threading.Thread(target=self._serve, daemon=True).start()
+    
+    def _serve(self) -> None:
+        connection, _ = self._socket.accept()
+        while connection.recv(4096):
+            pass
+    
+    def stop(self) -> None:
+        self._socket.close()
+
+
+def test_one_shot_client_falls_back_to_legacy_server(legacy_server):
+    client = RelayClient('localhost', legacy_server.port)
+    
+    assert client.send_request(Task(Device('SN', 1), RELAY_CONNECT_MSG)) == 'OK'
+    assert client.legacy_server
+    assert client.send_request(Task(Device('SN', 1), RELAY_DISCONNECT_MSG)) == 'OK'
+    
+    # One frame was refused, then both tasks arrived as bare pickles
+    assert legacy_server.rejected == 1
+    assert [task.message for task in legacy_server.tasks] == [RELAY_CONNECT_MSG, RELAY_DISCONNECT_MSG]
+
+
+def test_persistent_client_falls_back_to_legacy_server(legacy_server):
+    client = RelayClient('localhost', legacy_server.port, persistent=True)
+    
+    assert client.send_request(Task(Device('SN', 2), RELAY_CONNECT_MSG)) == 'OK'
+    assert client.send_request(Task(Device('SN', 2), RELAY_DISCONNECT_MSG)) == 'OK'
+    assert legacy_server.rejected == 1
+    client.close()
+
+
+def test_shared_channel_switches_relays_through_legacy_server(legacy_server, relay_config):
+    relay_config.server.port = legacy_server.port
+    channel = get_relay_channel()
+    
+    assert channel.send_request(Task(Device('SN', 3), RELAY_CONNECT_MSG)) == 'OK'
+    assert legacy_server.tasks[-1].index == 3
+
+
+def test_client_keeps_working_after_server_restart(board):
+    port = free_port()
+    dropping = DroppingServer(port)
+    client = RelayClient('localhost', port)
+    codec = client.codec
+    assert client.send_request(Task(Device('SN', 1), RELAY_CONNECT_MSG), timeout=1.0) is None
+    dropping.stop()
+    
+    # Nothing answered, so nothing about the server was learned
+    assert client.codec == codec
+    assert not client.legacy_server
+    
+    manager = RelayTaskManager(port=port, serial=SerialCommunicator('test', port=board.port))
+    thread = threading.Thread(target=manager.start, daemon=True)
+    thread.start()
+    try:
+        assert client.send_request(Task(Device('SN', 1), RELAY_CONNECT_MSG)) == 'OK'
+        assert board.powered[1]
+    finally:
+        manager.stop()
+        thread.join(5)
+
+
+def test_persistent_client_against_current_server(relay_server, board):
+    client = RelayClient('localhost', relay_server.port, persistent=True)
+    
+    assert client.send_request(Task(Device('SN', 4), RELAY_CONNECT_MSG)) == 'OK'
+    assert board.powered[4]
+    assert not client.legacy_server
+    client.close()
+
+
+def test_persistent_client_forgets_timed_out_requests():
+    port = free_port()
+    silent = SilentServer(port)
+    client = RelayClient('localhost', port, persistent=True)
+    
+    try:
+        for _ in range(3):
+            assert client.send_request(Task(Device('SN', 1), RELAY_CONNECT_MSG), timeout=0.1) is None
+        assert client._pending == {}
+    finally:
+        client.close()
+        silent.stop()
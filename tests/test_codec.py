@@ -0,0 +1,85 @@
+# -*- coding: utf-8 -*-
+"""Tests for the binary wire codec."""
+
+import pytest
+
+from relay.utils.codec import CODEC_VERSION, CodecError, decode_message, encode_message
+from relay.utils.relay_utils import Device, Task, TaskBatch
+from relay.constants import RELAY_CONNECT_MSG, RELAY_SET_STATE_MSG
+
+
+def round_trip(obj):
+    return decode_message(encode_message(obj))
+
+
+def task_fields(task):
+    return (task.device.serial_no, task.message, task.priority, task.index,
+            task.value, task.off_time, task.board)
+
+
+@pytest.mark.parametrize('value', [0, 0x21, 2 ** 32, 2 ** 64 - 1])
+def test_task_value_round_trip(value):
+    task = Task(Device('SN-1', 3, value), RELAY_SET_STATE_MSG)
+    assert task_fields(round_trip(task)) == task_fields(task)
+
+
+@pytest.mark.parametrize('off_time', [0.0, 0.1, 1.0, 2.5, 1e-9, 3600.123456789])
+def test_task_off_time_round_trip(off_time):
+    task = Task(Device('SN', 1), RELAY_CONNECT_MSG, off_time=off_time)
+    assert round_trip(task).off_time == off_time
+
+
+@pytest.mark.parametrize('field, value', [
+    ('value', -1),
+    ('value', 2 ** 64),
+    ('index', 2 ** 31),
+    ('priority', 2 ** 15),
+])
+def test_task_out_of_range_is_rejected(field, value):
+    task = Task(Device('SN', 1), RELAY_CONNECT_MSG)
+    setattr(task, field, value)
+    
+    with pytest.raises(CodecError):
+        encode_message(task)
+
+
+def test_task_board_and_serial_round_trip():
+    task = Task(Device('序列-1', -1, 7), RELAY_CONNECT_MSG, priority=-3, board=2)
+    assert task_fields(round_trip(task)) == task_fields(task)
+    assert round_trip(Task(Device('SN', 1), RELAY_CONNECT_MSG)).board is None
+
+
+def test_batch_round_trip():
+    tasks = [Task(Device('SN', i, 2 ** 40 + i), RELAY_CONNECT_MSG) for i in range(3)]
+    batch = round_trip(TaskBatch(tasks, stop_on_failure=True, atomic=True, priority=4))
+    
+    assert [task_fields(task) for task in batch.tasks] == [task_fields(task) for task in tasks]
+    assert batch.stop_on_failure and batch.atomic
+    assert batch.priority == 4
+
+
+@pytest.mark.parametrize('response', [
+    'OK', None, ['OK', 'KO', None], {'boards': {0: {'depth': 2, 'rate': 0.5}}, 'up': True},
+])
+def test_response_round_trip(response):
+    assert round_trip(response) == response
+
+
+def test_truncated_messages_are_rejected():
+    tasks = [Task(Device('SN', 1), RELAY_CONNECT_MSG), Task(Device('SN', 2), RELAY_CONNECT_MSG)]
+    data = encode_message(TaskBatch(tasks))
+    
+    for end in range(len(data)):
+        with pytest.raises(CodecError):
+            decode_message(data[:end])
+
+
+def test_trailing_bytes_and_other_versions_are_rejected():
+    data = encode_message('OK')
+    
+    with pytest.raises(CodecError):
+        decode_message(data + b'\x00')
+    with pytest.raises(CodecError, match='version'):
+        decode_message(bytes([CODEC_VERSION - 1]) + data[1:])
+    with pytest.raises(CodecError):
+        encode_message(object())
@@ -0,0 +1,39 @@
+# -*- coding: utf-8 -*-
+"""Tests for relay board discovery and the board cache."""
+
+import os
+
+from relay.core.config import ServerConfig
+from relay.hardware.discovery import BoardDiscovery
+from relay.hardware.serial_comm import PortIdentity
+
+
+def test_default_board_cache_is_per_user(tmp_path, monkeypatch):
+    monkeypatch.setenv('XDG_CACHE_HOME', str(tmp_path / 'cache'))
+    
+    path = ServerConfig().board_cache_file
+    assert os.path.isabs(path)
+    assert path == str(tmp_path / 'cache' / 'usb_relay' / 'relay_boards.json')
+
+
+def test_board_cache_round_trip(tmp_path):
+    discovery = BoardDiscovery(str(tmp_path / 'missing' / 'relay_boards.json'))
+    identity = PortIdentity(0x1a86, 0x7523, 'A1', '1-1.2')
+    
+    discovery.save_cache([('/dev/ttyUSB0', identity), ('/dev/ttyUSB1', None)])
+    boards, devices = discovery.load_cache()
+    
+    assert boards == [('/dev/ttyUSB0', identity), ('/dev/ttyUSB1', None)]
+    assert devices == discovery.usb_devices()
+
+
+def test_cached_boards_open_without_scan(tmp_path, board, monkeypatch):
+    discovery = BoardDiscovery(str(tmp_path / 'relay_boards.json'))
+    discovery.save_cache([(board.port, None)])
+    scans = []
+    monkeypatch.setattr(discovery, 'scan', lambda: scans.append(1) or [])
+    
+    opened = discovery.open_boards(lambda port, identity: port)
+    
+    assert opened == [board.port]
+    assert not scans
@@ -0,0 +1,60 @@
+# -*- coding: utf-8 -*-
+"""Tests for RelayEngine routing across several relay boards."""
+
+import pytest
+
+from relay.hardware.emulator import start_virtual_boards
+from relay.hardware.serial_comm import SerialCommunicator
+from relay.server.engine import RelayEngine
+from relay.utils.relay_utils import Device, Task
+from relay.constants import (
+    RELAY_CONNECT_MSG,
+    RELAY_CONNECT_MSG_SEC,
+    RELAY_SET_STATE_MSG,
+    RELAY_CONNECT_MASK_MSG,
+)
+
+from tests.conftest import wait_for_boards
+
+
+@pytest.fixture
+def boards():
+    boards = start_virtual_boards(2, ports=5, baudrate=None)
+    yield boards
+    for board in boards:
+        board.stop()
+
+
+@pytest.fixture
+def engine(boards):
+    engine = RelayEngine(serial=[SerialCommunicator('test', port=board.port) for board in boards])
+    engine.start()
+    wait_for_boards(engine)
+    yield engine
+    engine.stop()
+
+
+def test_global_ports_map_to_boards(engine, boards):
+    assert engine.send_request(Task(Device('SN', 2), RELAY_CONNECT_MSG)) == 'OK'
+    assert engine.send_request(Task(Device('SN', 7), RELAY_CONNECT_MSG)) == 'OK'
+    
+    assert [port for port, on in boards[0].powered.items() if on] == [2]
+    assert [port for port, on in boards[1].powered.items() if on] == [2]
+
+
+def test_hub_value_goes_to_the_board_it_is_bound_on(engine, boards):
+    assert engine.send_request(Task(Device('SN', 9, 0x35), RELAY_SET_STATE_MSG)) == 'OK'
+    assert boards[1].bindings[4] == 0x35
+    
+    assert engine.send_request(Task(Device('SN', 0, 0x35), RELAY_CONNECT_MSG_SEC)) == 'OK'
+    assert boards[1].powered[4] and not any(boards[0].powered.values())
+
+
+def test_mask_on_one_board_is_routed(engine, boards):
+    # Global ports 6 and 8: local ports 1 and 3 of the second board
+    assert engine.send_request(Task(Device('SN', 0, 0b10100000), RELAY_CONNECT_MASK_MSG)) == 'OK'
+    assert [port for port, on in boards[1].powered.items() if on] == [1, 3]
+
+
+def test_unknown_port_is_rejected(engine):
+    assert engine.send_request(Task(Device('SN', 11), RELAY_CONNECT_MSG)) == 'KO'
@@ -0,0 +1,74 @@
+# -*- coding: utf-8 -*-
+"""Tests for client/server message framing."""
+
+import pickle
+import socket
+
+import pytest
+
+from relay.utils.framing import (
+    CODEC_BINARY, CODEC_PICKLE, FRAME_HEADER, FRAME_MAGIC, MAX_PAYLOAD_SIZE, FramingError,
+    decode_header, decode_payload, encode_frame, encode_payload, is_framed, read_frame,
+    read_legacy_message
+)
+from relay.utils.relay_utils import Device, Task
+from relay.constants import RELAY_CONNECT_MSG
+
+
+def read_bytes(data: bytes):
+    """Read one frame from a socket the peer wrote data to and closed."""
+    reader, writer = socket.socketpair()
+    with reader, writer:
+        writer.sendall(data)
+        writer.close()
+        return read_frame(reader)
+
+
+@pytest.mark.parametrize('codec', [CODEC_PICKLE, CODEC_BINARY])
+def test_frame_round_trip(codec):
+    task = Task(Device('SN', 2, 0x21), RELAY_CONNECT_MSG, priority=1)
+    frame = encode_frame(0xFFFFFFFF, encode_payload(task, codec), codec)
+    
+    request_id, frame_codec, payload = read_bytes(frame)
+    decoded = decode_payload(payload, frame_codec)
+    
+    assert (request_id, frame_codec) == (0xFFFFFFFF, codec)
+    assert (decoded.device.serial_no, decoded.index, decoded.value) == ('SN', 2, 0x21)
+    assert is_framed(frame) and not is_framed(pickle.dumps(task))
+
+
+def test_clean_eof_reads_nothing():
+    assert read_bytes(b'') is None
+
+
+def test_truncated_frames_are_rejected():
+    frame = encode_frame(7, encode_payload('OK', CODEC_BINARY), CODEC_BINARY)
+    
+    for end in range(1, len(frame)):
+        with pytest.raises(FramingError):
+            read_bytes(frame[:end])
+
+
+def test_invalid_headers_are_rejected():
+    with pytest.raises(FramingError, match='magic'):
+        decode_header(FRAME_HEADER.pack(b'XX', 1, CODEC_PICKLE, 1, 0))
+    with pytest.raises(FramingError, match='version'):
+        decode_header(FRAME_HEADER.pack(FRAME_MAGIC, 99, CODEC_PICKLE, 1, 0))
+    with pytest.raises(FramingError, match='too large'):
+        decode_header(FRAME_HEADER.pack(FRAME_MAGIC, 1, CODEC_PICKLE, 1, MAX_PAYLOAD_SIZE + 1))
+    with pytest.raises(FramingError):
+        encode_frame(1, b'\x00' * (MAX_PAYLOAD_SIZE + 1))
+    with pytest.raises(FramingError):
+        encode_payload('OK', codec=9)
+
+
+def test_legacy_message_split_across_segments():
+    data = pickle.dumps(Task(Device('SN', 1), RELAY_CONNECT_MSG))
+    chunks = [data[i:i + 3] for i in range(0, len(data), 3)]
+    
+    task = read_legacy_message(lambda size: chunks.pop(0) if chunks else b'')
+    assert task.device.serial_no == 'SN'
+    
+    truncated = [data[:-1]]
+    with pytest.raises(pickle.UnpicklingError):
+        read_legacy_message(lambda size: truncated.pop(0) if truncated else b'')
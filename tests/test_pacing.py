@@ -0,0 +1,56 @@
+# -*- coding: utf-8 -*-
+"""Tests for adaptive command pacing and the pacing file."""
+
+import os
+
+import pytest
+
+from relay.core.config import SerialConfig
+from relay.hardware.pacing import CommandPacing, load_pacing, save_pacing
+
+
+def test_default_pacing_file_is_per_user(tmp_path, monkeypatch):
+    monkeypatch.setenv('XDG_CACHE_HOME', str(tmp_path / 'cache'))
+    
+    path = SerialConfig().pacing_file
+    assert os.path.isabs(path)
+    assert path == str(tmp_path / 'cache' / 'usb_relay' / 'relay_pacing.json')
+    
+    # Independent of the directory the server is started from
+    monkeypatch.chdir(tmp_path)
+    assert SerialConfig().pacing_file == path
+
+
+def test_save_pacing_creates_directory_and_merges(tmp_path):
+    path = str(tmp_path / 'missing' / 'relay_pacing.json')
+    
+    save_pacing(path, {'board-a': [0.01, 0.02]})
+    save_pacing(path, {'board-b': [0.03]})
+    
+    assert load_pacing(path) == {'board-a': [0.01, 0.02], 'board-b': [0.03]}
+
+
+def test_pacing_uses_caps_until_learned():
+    pacing = CommandPacing(timeout_cap=1.0, gap_cap=0.1, min_samples=5)
+    for _ in range(4):
+        pacing.record(0.01)
+    
+    assert not pacing.learned
+    assert pacing.response_timeout == 1.0
+    assert pacing.min_gap == 0.1
+
+
+def test_pacing_adapts_within_bounds():
+    pacing = CommandPacing(
+        timeout_floor=0.05, timeout_cap=1.0, timeout_factor=2.0,
+        gap_cap=0.1, gap_factor=0.1, min_samples=5
+    )
+    pacing.load([0.01] * 5)
+    
+    # 2 x 10 ms is below the floor; the gap is 10% of the median
+    assert pacing.response_timeout == 0.05
+    assert pacing.min_gap == pytest.approx(0.001)
+    
+    for _ in range(200):
+        pacing.record_timeout()
+    assert pacing.response_timeout == 1.0
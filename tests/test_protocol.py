@@ -0,0 +1,65 @@
+# -*- coding: utf-8 -*-
+"""Tests for the relay response frame decoder."""
+
+from relay.hardware.protocol import Ack, ErrorResponse, FrameDecoder, PortStates, ProtocolFrameBuilder
+
+
+def response(param: int, *data: int) -> bytes:
+    """Build a response frame: [HEAD][RESPONSE][LEN][PARAM][DATA...][XOR][END]."""
+    frame = [ProtocolFrameBuilder.FRAME_HEAD, ProtocolFrameBuilder.FRAME_RESPONSE, len(data) + 6, param]
+    frame += data
+    frame.append(ProtocolFrameBuilder.calculate_xor(frame))
+    frame.append(ProtocolFrameBuilder.FRAME_END)
+    return bytes(frame)
+
+
+def test_frame_split_into_single_bytes():
+    decoder = FrameDecoder()
+    frame = response(3, 0)
+    
+    responses = []
+    for i in range(len(frame)):
+        assert decoder.needed() >= 1
+        responses += decoder.decode(frame[i:i + 1])
+    
+    assert responses == [Ack(3, 0, frame)]
+    assert decoder.pending == 0
+
+
+def test_several_frames_in_one_read():
+    states = response(64, 0x21, 0x00, 0x35, 0x00, 0x00)
+    failed = response(2, 1)
+    
+    responses = FrameDecoder().decode(response(1, 0) + states + failed)
+    
+    assert [type(r) for r in responses] == [Ack, PortStates, ErrorResponse]
+    assert responses[1].hex_states() == ['21', '00', '35', '00', '00']
+    assert responses[2].status == 1
+
+
+def test_garbage_is_skipped():
+    decoder = FrameDecoder()
+    frame = response(1, 0)
+    
+    assert decoder.decode(b'\x00\xff\x7e\x10' + frame + b'\x55\x55') == [Ack(1, 0, frame)]
+    assert decoder.discarded_bytes == 6
+    assert decoder.frames == 1
+
+
+def test_bad_checksum_is_dropped():
+    decoder = FrameDecoder()
+    corrupt = bytearray(response(1, 0))
+    corrupt[-2] ^= 0xFF
+    
+    assert decoder.decode(bytes(corrupt) + response(2, 0)) == [Ack(2, 0, response(2, 0))]
+    assert decoder.corrupt_frames == 1
+
+
+def test_corrupt_length_does_not_hide_next_frame():
+    decoder = FrameDecoder()
+    # Claims 40 bytes, but a complete frame follows after four
+    corrupt = bytes([ProtocolFrameBuilder.FRAME_HEAD, ProtocolFrameBuilder.FRAME_RESPONSE, 40, 1])
+    
+    assert decoder.decode(corrupt + response(5, 0)) == [Ack(5, 0, response(5, 0))]
+    assert decoder.corrupt_frames == 1
+    assert decoder.pending == 0
@@ -0,0 +1,55 @@
+# -*- coding: utf-8 -*-
+"""Tests for the power cycle of DeviceRecoveryController."""
+
+import pytest
+
+from relay.controllers.recovery import DeviceRecoveryController
+from relay.utils.relay_utils import Device
+from relay.constants import (
+    RELAY_DISCONNECT_MSG,
+    RELAY_CONNECT_MSG,
+    RELAY_GET_STATS_MSG,
+    RELAY_POWER_CYCLE_MSG,
+)
+
+from tests.conftest import LegacyServer
+
+
+@pytest.fixture
+def controller(relay_config):
+    return DeviceRecoveryController('SN-RECOVERY')
+
+
+def test_power_cycle_toggles_port_on_legacy_server(controller, legacy_server, relay_config):
+    relay_config.server.port = legacy_server.port
+    
+    controller._power_cycle(Device('SN-RECOVERY', 2), by_value=False, off_time=0.0)
+    
+    assert [task.message for task in legacy_server.tasks] == [
+        RELAY_POWER_CYCLE_MSG, RELAY_GET_STATS_MSG, RELAY_DISCONNECT_MSG, RELAY_CONNECT_MSG
+    ]
+    assert controller.server_power_cycle is False
+
+
+def test_failed_power_cycle_is_not_repeated(controller, relay_config):
+    # A current server whose power cycle failed half way
+    server = LegacyServer(lambda task: {} if task.message == RELAY_GET_STATS_MSG else 'KO').start()
+    relay_config.server.port = server.port
+    try:
+        controller._power_cycle(Device('SN-RECOVERY', 2), by_value=False, off_time=0.0)
+    finally:
+        server.stop()
+    
+    assert [task.message for task in server.tasks] == [RELAY_POWER_CYCLE_MSG, RELAY_GET_STATS_MSG]
+    assert controller.server_power_cycle is True
+
+
+def test_power_cycle_runs_on_server(controller, relay_server, board, relay_config):
+    relay_config.server.port = relay_server.port
+    board.powered[3] = True
+    
+    controller._power_cycle(Device('SN-RECOVERY', 3), by_value=False, off_time=0.0)
+    
+    assert board.powered[3]
+    assert board.commands == 3  # initial state read, OFF, ON
+    assert controller.server_power_cycle is None
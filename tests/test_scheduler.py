@@ -0,0 +1,92 @@
+# -*- coding: utf-8 -*-
+"""Tests for the priority task scheduler."""
+
+import threading
+import time
+
+import pytest
+
+from relay.server.scheduler import TaskScheduler
+from relay.utils.relay_utils import Device, Task
+from relay.constants import RELAY_CONNECT_MSG
+
+
+class BlockedScheduler:
+    """Scheduler whose worker is held on a first task while others queue up."""
+    
+    def __init__(self, aging_interval: float = 1.0):
+        self.order = []
+        self.release = threading.Event()
+        self.scheduler = TaskScheduler(self._execute, aging_interval=aging_interval)
+        self.scheduler.start()
+        self.scheduler.submit(self.task('blocker', 0))
+        while not self.order:
+            time.sleep(0.001)
+    
+    def _execute(self, task: Task) -> str:
+        self.order.append(task.device.serial_no)
+        if task.device.serial_no == 'blocker':
+            self.release.wait(5)
+        return 'OK'
+    
+    @staticmethod
+    def task(name: str, priority: int) -> Task:
+        return Task(Device(name, 1), RELAY_CONNECT_MSG, priority)
+    
+    def submit(self, name: str, priority: int, delay: float = 0.0):
+        return self.scheduler.submit(self.task(name, priority), delay)
+    
+    def run(self, futures) -> list:
+        self.release.set()
+        for future in futures:
+            future.result(5)
+        self.scheduler.stop()
+        return self.order[1:]
+
+
+def test_runs_by_priority_then_fifo():
+    blocked = BlockedScheduler()
+    futures = [
+        blocked.submit('low', 5),
+        blocked.submit('urgent-1', 0),
+        blocked.submit('normal', 2),
+        blocked.submit('urgent-2', 0),
+    ]
+    
+    assert blocked.run(futures) == ['urgent-1', 'urgent-2', 'normal', 'low']
+
+
+def test_waiting_tasks_age():
+    blocked = BlockedScheduler(aging_interval=0.01)
+    futures = [blocked.submit('old-low', 5)]
+    
+    # 100 ms of waiting is worth 10 priority levels
+    time.sleep(0.1)
+    futures.append(blocked.submit('new-urgent', 0))
+    
+    assert blocked.run(futures) == ['old-low', 'new-urgent']
+
+
+def test_delayed_task_waits_without_holding_the_worker():
+    blocked = BlockedScheduler()
+    futures = [blocked.submit('delayed', 0, delay=0.1), blocked.submit('later', 5)]
+    
+    assert blocked.run(futures) == ['later', 'delayed']
+
+
+def test_stop_fails_waiting_tasks():
+    blocked = BlockedScheduler()
+    waiting = blocked.submit('waiting', 0)
+    
+    blocked.scheduler.stop(timeout=0)
+    blocked.release.set()
+    
+    with pytest.raises(RuntimeError):
+        waiting.result(5)
+    assert blocked.scheduler.submit(blocked.task('late', 0)).exception(5) is not None
+
+
+@pytest.mark.parametrize('aging_interval', [0, -1.0])
+def test_aging_interval_must_be_positive(aging_interval):
+    with pytest.raises(ValueError):
+        TaskScheduler(lambda task: None, aging_interval=aging_interval)
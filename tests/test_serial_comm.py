@@ -0,0 +1,72 @@
+# -*- coding: utf-8 -*-
+"""Tests for SerialCommunicator against the virtual relay board."""
+
+import time
+
+import pytest
+
+from relay.hardware.protocol import Ack, ErrorResponse, PortStates
+from relay.hardware.serial_comm import SerialCommunicator
+
+
+@pytest.fixture
+def serial(board):
+    serial = SerialCommunicator('test', port=board.port, response_timeout=0.5)
+    yield serial
+    serial.close()
+
+
+def test_commands_return_typed_responses(serial, board):
+    assert isinstance(serial.usb_on(2), Ack)
+    assert board.powered[2]
+    assert isinstance(serial.usb_on(9), ErrorResponse)
+    
+    assert isinstance(serial.set_port_state(1, 0x21), Ack)
+    assert serial.get_all_port_states() == ['21', '00', '00', '00', '00']
+
+
+def test_read_response_returns_as_soon_as_a_frame_arrives(serial):
+    started = time.monotonic()
+    for _ in range(20):
+        assert isinstance(serial.usb_off(1), Ack)
+    
+    # Far below one response timeout per command
+    assert time.monotonic() - started < 0.5
+
+
+def test_read_response_ends_at_the_deadline(serial):
+    started = time.monotonic()
+    assert serial.read_response(timeout=0.1) is None
+    assert 0.1 <= time.monotonic() - started < 0.3
+    
+    # The link still works after a missed response
+    assert isinstance(serial.transact(serial.protocol.build_get_port_states()), PortStates)
+
+
+def test_switch_ports_pipelines_one_frame_per_port(serial, board):
+    responses = serial.switch_ports(0b10110, on=True)
+    
+    assert list(responses) == [2, 3, 5]
+    assert all(isinstance(response, Ack) for response in responses.values())
+    assert [port for port, on in board.powered.items() if on] == [2, 3, 5]
+    assert board.commands == 3
+
+
+def test_switch_ports_with_mask_frames_sends_one_frame(board):
+    board.mask_frames = True
+    serial = SerialCommunicator('test', port=board.port, mask_frames=True)
+    try:
+        responses = serial.switch_ports(0b11111, on=True)
+    finally:
+        serial.close()
+    
+    assert all(isinstance(response, Ack) for response in responses.values())
+    assert all(board.powered.values())
+    assert board.commands == 1
+
+
+def test_switch_ports_reports_missing_ports(serial):
+    responses = serial.switch_ports(0b1000001, on=False)
+    
+    assert isinstance(responses[1], Ack)
+    assert isinstance(responses[7], ErrorResponse)
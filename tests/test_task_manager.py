@@ -0,0 +1,166 @@
+# -*- coding: utf-8 -*-
+"""Tests for the RelayTaskManager socket server."""
+
+import logging
+import pickle
+import socket
+import threading
+import time
+
+import pytest
+
+from relay.client import RelayClient
+from relay.hardware.protocol import ProtocolFrameBuilder
+from relay.hardware.serial_comm import SerialCommunicator
+from relay.server.task_manager import RelayTaskManager
+from relay.utils.relay_utils import Device, Task, TaskBatch
+from relay.constants import RELAY_DISCONNECT_MSG, RELAY_CONNECT_MSG, RELAY_GET_STATE_MSG, RELAY_SET_STATE_MSG
+
+from tests.conftest import free_port, wait_for_boards
+
+
+@pytest.fixture
+def switches(board, monkeypatch):
+    """(time, port, on) of every on/off by index the board receives."""
+    switches = []
+    handle_frame = board.handle_frame
+    
+    def record(frame):
+        if len(frame) == ProtocolFrameBuilder.FRAME_LENGTH and frame[3] == ProtocolFrameBuilder.CMD_ALL:
+            switches.append((time.monotonic(), frame[2], frame[4] == ProtocolFrameBuilder.CMD_ON))
+        return handle_frame(frame)
+    
+    monkeypatch.setattr(board, 'handle_frame', record)
+    return switches
+
+
+def test_server_stop_is_idempotent(relay_server, monkeypatch):
+    released = []
+    release = relay_server._release
+    monkeypatch.setattr(relay_server, '_release', lambda: released.append(release()))
+    
+    stoppers = [threading.Thread(target=relay_server.stop) for _ in range(4)]
+    for stopper in stoppers:
+        stopper.start()
+    for stopper in stoppers:
+        stopper.join(5)
+    relay_server.__exit__(None, None, None)
+    
+    assert len(released) == 1
+    assert relay_server.socket is None and relay_server.unix_socket is None
+
+
+
+def test_power_cycle_switches_off_then_on(relay_server, board, switches):
+    client = RelayClient('localhost', relay_server.port)
+    
+    assert client.power_cycle(Device('SN', 3), off_time=0.2) == 'OK'
+    
+    assert [(port, on) for _, port, on in switches] == [(3, False), (3, True)]
+    assert switches[1][0] - switches[0][0] >= 0.2
+    assert board.powered[3]
+
+
+def test_power_cycle_by_value(relay_server, board):
+    client = RelayClient('localhost', relay_server.port)
+    assert client.send_request(Task(Device('SN', 4, 0x21), RELAY_SET_STATE_MSG)) == 'OK'
+    
+    assert client.power_cycle(Device('SN', 4, 0x21), off_time=0.0, by_value=True) == 'OK'
+    assert board.powered[4]
+    assert client.power_cycle(Device('SN', 4, 0x22), off_time=0.0, by_value=True) == 'KO'
+
+
+def test_power_cycle_of_missing_port_fails(relay_server):
+    client = RelayClient('localhost', relay_server.port)
+    assert client.power_cycle(Device('SN', 9), off_time=0.0) == 'KO'
+
+
+def test_batch_runs_every_task(relay_server, board):
+    client = RelayClient('localhost', relay_server.port)
+    tasks = [Task(Device('SN', port), RELAY_CONNECT_MSG) for port in (1, 9, 2)]
+    
+    assert client.send_batch(tasks) == ['OK', 'KO', 'OK']
+    assert board.powered[1] and board.powered[2]
+
+
+def test_batch_stops_on_failure(relay_server, board):
+    client = RelayClient('localhost', relay_server.port)
+    tasks = [Task(Device('SN', port), RELAY_CONNECT_MSG) for port in (1, 9, 2)]
+    
+    assert client.send_batch(tasks, stop_on_failure=True) == ['OK', 'KO', None]
+    assert board.powered[1] and not board.powered[2]
+
+
+def test_atomic_batch_is_not_interleaved(relay_server, board, switches):
+    board.latency = 0.02
+    tasks = [Task(Device('SN', 1), message) for message in (RELAY_CONNECT_MSG, RELAY_DISCONNECT_MSG) * 2]
+    
+    batch = relay_server.submit(TaskBatch(tasks, atomic=True))
+    while not switches:
+        time.sleep(0.001)
+    other = relay_server.submit(Task(Device('SN', 5), RELAY_CONNECT_MSG, priority=-1))
+    
+    assert batch.result(5) == ['OK'] * 4
+    assert other.result(5) == 'OK'
+    assert [port for _, port, _ in switches] == [1, 1, 1, 1, 5]
+
+
+@pytest.fixture
+def async_server(board, relay_config):
+    """Relay server in asyncio mode driving the virtual board."""
+    relay_config.server.allow_pickle = True
+    manager = RelayTaskManager(port=free_port(), serial=SerialCommunicator('test', port=board.port))
+    manager.logger.setLevel(logging.WARNING)
+    
+    thread = threading.Thread(target=manager.start_async, daemon=True)
+    thread.start()
+    wait_for_boards(manager)
+    
+    yield manager
+    
+    manager.stop()
+    thread.join(5)
+
+
+def test_async_server_answers_pipelined_requests(async_server, board):
+    client = RelayClient('localhost', async_server.port, persistent=True)
+    
+    futures = [client.submit(Task(Device('SN', port), RELAY_CONNECT_MSG)) for port in range(1, 6)]
+    
+    assert [future.result(5) for future in futures] == ['OK'] * 5
+    assert all(board.powered.values())
+    client.close()
+
+
+def test_async_server_answers_legacy_clients(async_server, board):
+    with socket.create_connection(('localhost', async_server.port), timeout=5) as connection:
+        connection.sendall(pickle.dumps(Task(Device('SN', 3), RELAY_CONNECT_MSG)))
+        assert pickle.loads(connection.recv(4096)) == 'OK'
+    
+    assert board.powered[3]
+
+
+def test_state_queries_are_served_from_the_cache(relay_server, board):
+    client = RelayClient('localhost', relay_server.port)
+    query = Task(Device('SN', 1), RELAY_GET_STATE_MSG)
+    
+    # Port states are reported as the text of a list, as they always were
+    assert client.send_request(query) == str(['00'] * 5)
+    commands = board.commands
+    
+    # A binding is written through to the cache, no second read needed
+    assert client.send_request(Task(Device('SN', 2, 0x33), RELAY_SET_STATE_MSG)) == 'OK'
+    assert client.send_request(query) == str(['00', '33', '00', '00', '00'])
+    assert board.commands == commands + 1
+
+
+def test_concurrent_state_queries_share_one_read(relay_server, board):
+    relay_server.config.server.state_cache_max_age = 0
+    board.latency = 0.05
+    query = Task(Device('SN', 1), RELAY_GET_STATE_MSG)
+    commands = board.commands
+    
+    futures = [relay_server.submit(query) for _ in range(5)]
+    
+    assert [future.result(5) for future in futures] == [str(['00'] * 5)] * 5
+    assert board.commands - commands <= 2